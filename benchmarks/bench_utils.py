@@ -0,0 +1,87 @@
+"""
+    Common utilities for mtasklite benchmarks: Timing statistics, resource usage,
+    running a benchmark configuration in a separate (fresh) process, and saving results as JSON.
+"""
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import multiprocess as mp
+
+
+def percentile(values, q):
+    """
+        A percentile computed using linear interpolation between the closest ranks.
+
+        :param values: a list of numbers
+        :param q: a percentile in the range [0, 100]
+        :return: the percentile value or None for an empty list
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    pos = (len(values) - 1) * q / 100.0
+    lower = int(pos)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (pos - lower)
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """
+        Peak resident set size in megabytes (for children, this is the peak of the largest child).
+    """
+    max_rss = resource.getrusage(who).ru_maxrss
+    # Linux reports the value in kilobytes, but MacOS reports it in bytes
+    if sys.platform == 'darwin':
+        return max_rss / 1024 / 1024
+    return max_rss / 1024
+
+
+def busy_wait(duration):
+    """
+        Simulates a CPU-bound computation, which takes a given time (in seconds).
+    """
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        pass
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def environment_info():
+    return dict(
+        git_commit=git_commit(),
+        python_version=platform.python_version(),
+        python_implementation=platform.python_implementation(),
+        platform=platform.platform(),
+        cpu_count=mp.cpu_count(),
+        timestamp=time.strftime('%Y-%m-%dT%H:%M:%S'),
+    )
+
+
+def run_in_subprocess(script_path, config):
+    """
+        Run one benchmark configuration in a fresh Python process, so that the peak RSS and CPU usage
+        are not affected by other configurations. The script must support the argument --run_one_config,
+        which accepts a JSON-encoded configuration and prints a JSON-encoded result as the last line.
+    """
+    out = subprocess.check_output([sys.executable, script_path, '--run_one_config', json.dumps(config)])
+    return json.loads(out.decode().strip().split('\n')[-1])
+
+
+def save_results(file_name, benchmark_name, config_results):
+    with open(file_name, 'w') as f:
+        json.dump(dict(benchmark=benchmark_name,
+                       environment=environment_info(),
+                       results=config_results), f, indent=2)
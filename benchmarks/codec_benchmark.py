@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+"""
+    A benchmark of serializers of batches (see the argument serializer of mtasklite.Pool) on typical payloads:
+    dictionaries of primitive values, dataclasses, short tuples, and NumPy arrays (if NumPy is installed).
+
+    For each payload and serializer we report:
+
+    1. the codec cost: the time to encode a batch and to pickle the message the way a multiprocess queue does
+       (using dill) plus the time of the reverse operations, as well as the size of the pickled message;
+    2. the end-to-end throughput of a pool whose workers return their input items back.
+
+    MessagePack does not support dataclasses and NumPy arrays: Such batches fall back to dill.
+
+    Sample usage:
+
+    python benchmarks/codec_benchmark.py --n_jobs 4 --output codecs.json
+"""
+import argparse
+import dataclasses
+import json
+import logging
+import os
+import sys
+import time
+
+import multiprocess as mp
+from multiprocess.reduction import ForkingPickler
+
+from bench_utils import percentile, run_in_subprocess, save_results
+
+from mtasklite import Pool, Serialization
+from mtasklite.serialization import get_serializer
+
+PAYLOADS = ['dict', 'dataclass', 'tuple', 'numpy']
+SERIALIZERS = [Serialization.DILL, Serialization.PICKLE, Serialization.MSGPACK]
+
+
+@dataclasses.dataclass
+class Record:
+    record_id: int
+    name: str
+    score: float
+    tags: list
+
+
+def make_item(payload, item_id, payload_size):
+    if payload == 'dict':
+        return {f'field{k}': (item_id + k if k % 3 == 0 else f'value{k}' if k % 3 == 1 else k / 7)
+                for k in range(payload_size)}
+    if payload == 'dataclass':
+        return Record(item_id, f'record{item_id}', item_id / 7, [f'tag{k}' for k in range(payload_size // 10)])
+    if payload == 'tuple':
+        return item_id, f'item{item_id}'
+    assert payload == 'numpy'
+    import numpy
+    return numpy.full(payload_size * 128, item_id, dtype=numpy.float64)
+
+
+def echo_worker(arg):
+    return arg
+
+
+def measure_codec(serializer, batch, repeat_qty):
+    """
+        :return: a tuple: the median round-trip time (in seconds) and the size of the pickled message
+    """
+    times = []
+    message = None
+    for _ in range(repeat_qty):
+        start_time = time.perf_counter()
+        encoded_batch = serializer.encode(batch) if serializer is not None else batch
+        message = ForkingPickler.dumps(((0, 0), encoded_batch))
+        _, encoded_batch = ForkingPickler.loads(message)
+        if serializer is not None:
+            serializer.decode(encoded_batch)
+        times.append(time.perf_counter() - start_time)
+    return percentile(times, 50), len(message)
+
+
+def run_one_config(config):
+    # MessagePack falls back to dill for unsupported payloads: This is expected
+    logging.getLogger().setLevel(logging.ERROR)
+
+    serializer = get_serializer(config['serializer'])
+    batch = [make_item(config['payload'], item_id, config['payload_size']) for item_id in range(config['batch_size'])]
+    codec_time, message_size = measure_codec(serializer, batch, config['codec_repeat_qty'])
+
+    start_time = time.perf_counter()
+    result_qty = 0
+    with Pool(echo_worker, config['n_jobs'], batch_size=config['batch_size'],
+              serializer=config['serializer'], **config['pool_kwargs']) as pool:
+        # Items are generated on the fly (the generation time is the same for all serializers)
+        for _ in pool(make_item(config['payload'], item_id, config['payload_size'])
+                      for item_id in range(config['n_items'])):
+            result_qty += 1
+    elapsed_time = time.perf_counter() - start_time
+    assert result_qty == config['n_items']
+
+    return dict(codec_us_per_item=codec_time / len(batch) * 1e6, message_bytes_per_item=message_size / len(batch),
+                items_per_sec=config['n_items'] / elapsed_time)
+
+
+def main(args):
+    if args.run_one_config is not None:
+        # Print the result as the last line of the output
+        print(json.dumps(run_one_config(json.loads(args.run_one_config))))
+        return
+
+    payloads = list(args.payloads)
+    if 'numpy' in payloads:
+        try:
+            import numpy
+        except ImportError:
+            print('NumPy is not installed: Skipping NumPy payloads')
+            payloads.remove('numpy')
+    serializers = list(args.serializers)
+    if Serialization.MSGPACK in serializers:
+        try:
+            import msgpack
+        except ImportError:
+            print('msgpack is not installed: Skipping the msgpack serializer')
+            serializers.remove(Serialization.MSGPACK)
+
+    config_results = []
+    for payload in payloads:
+        for serializer in serializers:
+            config = dict(payload=payload, serializer=serializer, payload_size=args.payload_size,
+                          n_items=args.n_items, n_jobs=args.n_jobs, batch_size=args.batch_size,
+                          codec_repeat_qty=args.codec_repeat_qty, pool_kwargs=json.loads(args.pool_kwargs))
+            result = run_in_subprocess(os.path.abspath(__file__), config)
+            print(f'{payload:10} {serializer:8}',
+                  f'codec: {result["codec_us_per_item"]:8.2f}us/item {result["message_bytes_per_item"]:10.0f}B/item',
+                  f'pool: {result["items_per_sec"]:10.0f} items/sec')
+            sys.stdout.flush()
+            config_results.append(dict(config=config, result=result))
+
+    if args.output is not None:
+        save_results(args.output, 'codec_benchmark', config_results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--payloads', nargs='+', choices=PAYLOADS, default=PAYLOADS)
+    parser.add_argument('--serializers', nargs='+', choices=SERIALIZERS, default=SERIALIZERS)
+    parser.add_argument('--payload_size', type=int, default=100,
+                        help='The number of dictionary fields (NumPy arrays have 128 times more elements)')
+    parser.add_argument('--n_jobs', type=int, default=mp.cpu_count())
+    parser.add_argument('--n_items', type=int, default=20000)
+    parser.add_argument('--batch_size', type=int, default=64)
+    parser.add_argument('--codec_repeat_qty', type=int, default=20,
+                        help='The number of times the codec cost is measured (the median is reported)')
+    parser.add_argument('--pool_kwargs', type=str, default='{}',
+                        help='Additional (JSON-encoded) arguments of mtasklite.Pool')
+    parser.add_argument('--output', type=str, default=None, help='A JSON file to save results')
+    parser.add_argument('--run_one_config', type=str, default=None, help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    main(args)
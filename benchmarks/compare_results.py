@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""
+    Compare two JSON files with benchmark results (e.g., produced for two different commits)
+    and highlight regressions in throughput and p99 latency.
+
+    Sample usage:
+
+    python benchmarks/compare_results.py old_results.json new_results.json --threshold 0.1
+"""
+import argparse
+import json
+import sys
+
+
+def config_key(config):
+    return json.dumps(config, sort_keys=True)
+
+
+def main(args):
+    with open(args.old_results) as f:
+        old_data = json.load(f)
+    with open(args.new_results) as f:
+        new_data = json.load(f)
+
+    old_results = {config_key(e['config']): e['result'] for e in old_data['results']}
+
+    print('Old commit:', old_data['environment'].get('git_commit'))
+    print('New commit:', new_data['environment'].get('git_commit'))
+
+    regression_qty = 0
+    for e in new_data['results']:
+        old_result = old_results.get(config_key(e['config']))
+        if old_result is None:
+            continue
+        new_result = e['result']
+
+        throughput_ratio = new_result['items_per_sec'] / max(old_result['items_per_sec'], 1e-9)
+        p99_ratio = new_result['latency_p99_ms'] / max(old_result['latency_p99_ms'], 1e-9)
+        is_regression = throughput_ratio < 1 - args.threshold or p99_ratio > 1 + args.threshold
+        regression_qty += is_regression
+
+        print('REGRESSION' if is_regression else 'ok        ',
+              f'items/sec ratio: {throughput_ratio:.3f} p99 ratio: {p99_ratio:.3f}',
+              config_key(e['config']))
+
+    print('Number of regressions:', regression_qty)
+    if regression_qty > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('old_results', type=str)
+    parser.add_argument('new_results', type=str)
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='A relative change of throughput or p99 latency considered to be a regression')
+
+    main(parser.parse_args())
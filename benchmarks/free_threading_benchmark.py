@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+    A benchmark of mtasklite.Pool with threads vs processes on a CPU-bound worker (sample_expensive_calc_func
+    from examples/mtasklite_pool_demo.py). On a free-threaded (no-GIL) build of CPython 3.13 or later,
+    threads run Python code in parallel without pickling and without the cost of starting processes.
+    With the GIL, threads are expected to be no faster than a single worker.
+
+    For each mode we report items/sec and the speedup with respect to a single worker. The time includes
+    the pool startup.
+
+    Sample usage (e.g., with python3.13t):
+
+    python benchmarks/free_threading_benchmark.py --n_jobs 8 --output free_threading.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import multiprocess as mp
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples'))
+
+from bench_utils import run_in_subprocess, save_results
+from mtasklite_pool_demo import sample_expensive_calc_func
+
+from mtasklite import Pool
+from mtasklite.utils import is_free_threaded
+
+MODES = ['single_worker', 'processes', 'threads']
+
+
+def run_one_config(config):
+    mode = config['mode']
+    n_jobs = 1 if mode == 'single_worker' else config['n_jobs']
+
+    start_time = time.perf_counter()
+    result_qty = 0
+    with Pool(sample_expensive_calc_func, n_jobs, use_threads=mode == 'threads', batch_size=config['batch_size'],
+              **config['pool_kwargs']) as pool:
+        for _ in pool(k * 10 for k in range(config['n_items'])):
+            result_qty += 1
+    elapsed_time = time.perf_counter() - start_time
+    assert result_qty == config['n_items']
+
+    return dict(items_per_sec=config['n_items'] / elapsed_time)
+
+
+def main(args):
+    if args.run_one_config is not None:
+        # Print the result as the last line of the output
+        print(json.dumps(run_one_config(json.loads(args.run_one_config))))
+        return
+
+    print(f'Python {sys.version.split()[0]}, free-threaded: {is_free_threaded()}')
+    config_results = []
+    single_worker_items_per_sec = None
+    for mode in args.modes:
+        config = dict(mode=mode, n_jobs=args.n_jobs, n_items=args.n_items, batch_size=args.batch_size,
+                      pool_kwargs=json.loads(args.pool_kwargs))
+        result = run_in_subprocess(os.path.abspath(__file__), config)
+        if mode == 'single_worker':
+            single_worker_items_per_sec = result['items_per_sec']
+        speedup = result['items_per_sec'] / single_worker_items_per_sec \
+            if single_worker_items_per_sec is not None else float('nan')
+        print(f'{mode:15} {result["items_per_sec"]:10.1f} items/sec speedup: {speedup:.2f}')
+        sys.stdout.flush()
+        config_results.append(dict(config=config, result=result))
+
+    if args.output is not None:
+        save_results(args.output, 'free_threading_benchmark', config_results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    parser.add_argument('--n_jobs', type=int, default=mp.cpu_count())
+    parser.add_argument('--n_items', type=int, default=1000)
+    parser.add_argument('--batch_size', type=int, default=1)
+    parser.add_argument('--pool_kwargs', type=str, default='{}',
+                        help='Additional (JSON-encoded) arguments of mtasklite.Pool')
+    parser.add_argument('--output', type=str, default=None, help='A JSON file to save results')
+    parser.add_argument('--run_one_config', type=str, default=None, help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+"""
+    A streaming benchmark of mtasklite.Pool throughput and latency.
+
+    It runs a grid of configurations (threads vs processes, bounded vs unbounded, ordered vs unordered,
+    chunk sizes, payload sizes, and item costs). Each configuration runs in a fresh process and we report
+    items/sec, p50/p99 per-item latency (from the moment an item is read from the input iterable till
+    the moment its result is returned), the CPU time of the main process, and the peak RSS.
+
+    Sample usage (results can be compared using compare_results.py):
+
+    python benchmarks/pool_benchmark.py --preset quick --output results.json
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+
+import multiprocess as mp
+
+from bench_utils import percentile, peak_rss_mb, busy_wait, run_in_subprocess, save_results
+
+from mtasklite import Pool
+
+COST_TYPE_CPU = 'cpu'
+COST_TYPE_SLEEP = 'sleep'
+
+PRESETS = {
+    'quick': dict(
+        use_threads=[False, True],
+        bounded=[True, False],
+        is_unordered=[False, True],
+        chunk_size=[None],
+        chunk_prefill_ratio=[None],
+        payload_size=[16, 64 * 1024],
+        item_cost=[1e-5, 1e-3],
+        cost_type=[COST_TYPE_CPU],
+    ),
+    'full': dict(
+        use_threads=[False, True],
+        bounded=[True, False],
+        is_unordered=[False, True],
+        chunk_size=[None, 32, 128],
+        chunk_prefill_ratio=[None, 4],
+        payload_size=[16, 1024, 64 * 1024, 1024 * 1024],
+        item_cost=[1e-6, 1e-4, 1e-2, 1.0],
+        cost_type=[COST_TYPE_CPU, COST_TYPE_SLEEP],
+    ),
+}
+
+GRID_KEYS = ['use_threads', 'bounded', 'is_unordered', 'chunk_size', 'chunk_prefill_ratio',
+             'payload_size', 'item_cost', 'cost_type']
+
+
+def bench_worker(arg):
+    """
+        A benchmark worker: It spends a given amount of time and returns the payload back.
+    """
+    item_id, payload, item_cost, cost_type = arg
+    if cost_type == COST_TYPE_SLEEP:
+        time.sleep(item_cost)
+    else:
+        busy_wait(item_cost)
+    return item_id, payload
+
+
+def get_item_qty(config):
+    # Each configuration should take roughly target_time seconds
+    qty = int(config['target_time'] * config['n_jobs'] / max(config['item_cost'], 1e-5))
+    return max(min(qty, config['max_items']), config['min_items'])
+
+
+def run_one_config(config):
+    n_items = get_item_qty(config)
+    payload = b'x' * config['payload_size']
+    submit_times = [None] * n_items
+
+    def input_generator():
+        for item_id in range(n_items):
+            # An item is submitted as soon as the pool reads it from the input iterable
+            submit_times[item_id] = time.perf_counter()
+            yield item_id, payload, config['item_cost'], config['cost_type']
+
+    latencies = []
+
+    start_cpu_time = time.process_time()
+    start_time = time.perf_counter()
+
+    with Pool(bench_worker, config['n_jobs'],
+              use_threads=config['use_threads'],
+              bounded=config['bounded'],
+              is_unordered=config['is_unordered'],
+              chunk_size=config['chunk_size'],
+              chunk_prefill_ratio=config['chunk_prefill_ratio'],
+              **config['pool_kwargs']) as pool:
+        start_proc_time = time.perf_counter()
+        for item_id, _ in pool(input_generator()):
+            latencies.append(time.perf_counter() - submit_times[item_id])
+        end_proc_time = time.perf_counter()
+
+    end_time = time.perf_counter()
+    end_cpu_time = time.process_time()
+
+    assert len(latencies) == n_items
+
+    return dict(
+        n_items=n_items,
+        startup_time=start_proc_time - start_time,
+        processing_time=end_proc_time - start_proc_time,
+        total_time=end_time - start_time,
+        items_per_sec=n_items / max(end_proc_time - start_proc_time, 1e-9),
+        latency_p50_ms=percentile(latencies, 50) * 1000,
+        latency_p99_ms=percentile(latencies, 99) * 1000,
+        main_process_cpu_time=end_cpu_time - start_cpu_time,
+        peak_rss_mb=peak_rss_mb(),
+    )
+
+
+def main(args):
+    if args.run_one_config is not None:
+        # Print the result as the last line of the output
+        print(json.dumps(run_one_config(json.loads(args.run_one_config))))
+        return
+
+    grid = PRESETS[args.preset]
+    pool_kwargs = json.loads(args.pool_kwargs) if args.pool_kwargs is not None else {}
+
+    config_results = []
+    for grid_values in itertools.product(*[grid[k] for k in GRID_KEYS]):
+        config = dict(zip(GRID_KEYS, grid_values))
+        config.update(n_jobs=args.n_jobs, target_time=args.target_time,
+                      min_items=args.min_items, max_items=args.max_items,
+                      pool_kwargs=pool_kwargs)
+        if args.no_subprocess:
+            result = run_one_config(config)
+        else:
+            result = run_in_subprocess(os.path.abspath(__file__), config)
+        print(' '.join([f'{k}={config[k]}' for k in GRID_KEYS]), '->',
+              f'items/sec: {result["items_per_sec"]:.1f}',
+              f'p50: {result["latency_p50_ms"]:.2f}ms p99: {result["latency_p99_ms"]:.2f}ms',
+              f'CPU: {result["main_process_cpu_time"]:.2f}s peak RSS: {result["peak_rss_mb"]:.1f}MB')
+        sys.stdout.flush()
+        config_results.append(dict(config=config, result=result))
+
+    if args.output is not None:
+        save_results(args.output, 'pool_benchmark', config_results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--preset', choices=list(PRESETS.keys()), default='quick')
+    parser.add_argument('--n_jobs', type=int, default=mp.cpu_count())
+    parser.add_argument('--target_time', type=float, default=1.0,
+                        help='Approximate processing time (in seconds) for each configuration')
+    parser.add_argument('--min_items', type=int, default=20)
+    parser.add_argument('--max_items', type=int, default=100_000)
+    parser.add_argument('--pool_kwargs', type=str, default=None,
+                        help='Additional (JSON-encoded) arguments of mtasklite.Pool, e.g., {"batch_size": 8}')
+    parser.add_argument('--output', type=str, default=None, help='A JSON file to save results')
+    parser.add_argument('--no_subprocess', action='store_true',
+                        help='Run all configurations in the same process (peak RSS is not reliable then)')
+    parser.add_argument('--run_one_config', type=str, default=None, help=argparse.SUPPRESS)
+
+    main(parser.parse_args())
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+"""
+    A benchmark of mtasklite.Pool on input items with skewed costs: Most items are cheap, but a small
+    (random) fraction of them is much more expensive. Such items tend to become stragglers, which
+    delay the completion of the whole job.
+
+    We compare the completion time (makespan) of the same job for:
+
+    1. a baseline pool, which treats all items as equally expensive;
+    2. a pool with a cost function (see the argument cost_fn of mtasklite.Pool);
+    3. a pool with a cost function, which submits expensive items first (heavy_first, unordered mode only).
+
+    The lower bound of the makespan is the maximum of the total cost divided by the number of workers
+    and the cost of the most expensive item.
+
+    Sample usage:
+
+    python benchmarks/skew_benchmark.py --n_jobs 4 --heavy_fraction 0.02 --heavy_ratio 1000 --output skew.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import multiprocess as mp
+
+from bench_utils import busy_wait, run_in_subprocess, save_results
+
+from mtasklite import Pool
+
+COST_TYPE_CPU = 'cpu'
+COST_TYPE_SLEEP = 'sleep'
+
+MODES = ['baseline', 'cost_fn', 'cost_fn+heavy_first']
+
+
+def skewed_worker(arg):
+    item_id, item_cost, cost_type = arg
+    if cost_type == COST_TYPE_SLEEP:
+        time.sleep(item_cost)
+    else:
+        busy_wait(item_cost)
+    return item_id
+
+
+def item_cost_fn(arg):
+    return arg[1]
+
+
+def get_item_costs(config):
+    rnd = random.Random(config['seed'])
+    costs = []
+    for _ in range(config['n_items']):
+        cost = config['base_cost']
+        if rnd.random() < config['heavy_fraction']:
+            cost *= config['heavy_ratio']
+        costs.append(cost)
+    if config['heavy_last']:
+        # The worst case for the baseline: Expensive items are read last and they become stragglers
+        costs.sort()
+    return costs
+
+
+def run_one_config(config):
+    mode = config['mode']
+    pool_kwargs = dict(bounded=config['bounded'], is_unordered=config['is_unordered'],
+                       chunk_size=config['chunk_size'], batch_size=config['batch_size'])
+    if mode != 'baseline':
+        pool_kwargs['cost_fn'] = item_cost_fn
+    if mode == 'cost_fn+heavy_first':
+        pool_kwargs['heavy_first'] = True
+    pool_kwargs.update(config['pool_kwargs'])
+
+    costs = get_item_costs(config)
+    start_time = time.perf_counter()
+    with Pool(skewed_worker, config['n_jobs'], use_threads=config['use_threads'], **pool_kwargs) as pool:
+        result_qty = 0
+        for _ in pool([(item_id, cost, config['cost_type']) for item_id, cost in enumerate(costs)]):
+            result_qty += 1
+    makespan = time.perf_counter() - start_time
+    assert result_qty == len(costs)
+
+    return dict(makespan=makespan)
+
+
+def main(args):
+    if args.run_one_config is not None:
+        # Print the result as the last line of the output
+        print(json.dumps(run_one_config(json.loads(args.run_one_config))))
+        return
+
+    base_config = dict(n_jobs=args.n_jobs, use_threads=args.use_threads, bounded=not args.unbounded,
+                       is_unordered=not args.ordered, chunk_size=args.chunk_size, batch_size=args.batch_size,
+                       n_items=args.n_items, base_cost=args.base_cost, heavy_fraction=args.heavy_fraction,
+                       heavy_ratio=args.heavy_ratio, heavy_last=args.heavy_last, cost_type=args.cost_type, seed=args.seed, pool_kwargs=json.loads(args.pool_kwargs))
+
+    costs = get_item_costs(base_config)
+    lower_bound = max(sum(costs) / args.n_jobs, max(costs))
+    print(f'{sum([cost > args.base_cost for cost in costs])} heavy items out of {len(costs)}, '
+          f'total cost: {sum(costs):.2f}s, makespan lower bound: {lower_bound:.2f}s')
+
+    config_results = []
+    for mode in args.modes:
+        if mode == 'cost_fn+heavy_first' and args.ordered:
+            print(f'{mode:20} skipped: supported only in the unordered mode')
+            continue
+        config = dict(base_config, mode=mode)
+        result = run_in_subprocess(os.path.abspath(__file__), config)
+        result['lower_bound'] = lower_bound
+        print(f'{mode:20} makespan: {result["makespan"]:.2f}s ({result["makespan"] / lower_bound:.2f}x lower bound)')
+        sys.stdout.flush()
+        config_results.append(dict(config=config, result=result))
+
+    if args.output is not None:
+        save_results(args.output, 'skew_benchmark', config_results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    parser.add_argument('--n_jobs', type=int, default=mp.cpu_count())
+    parser.add_argument('--use_threads', action='store_true')
+    parser.add_argument('--unbounded', action='store_true')
+    parser.add_argument('--ordered', action='store_true', help='Return results in the input order')
+    parser.add_argument('--chunk_size', type=int, default=64)
+    parser.add_argument('--batch_size', type=int, default=4)
+    parser.add_argument('--n_items', type=int, default=2000)
+    parser.add_argument('--base_cost', type=float, default=1e-3, help='The cost of a cheap item (in seconds)')
+    parser.add_argument('--heavy_fraction', type=float, default=0.02, help='The fraction of expensive items')
+    parser.add_argument('--heavy_ratio', type=float, default=1000,
+                        help='How many times an expensive item is more expensive than a cheap one')
+    parser.add_argument('--heavy_last', action='store_true',
+                        help='Place expensive items at the end of the input (rather than randomly)')
+    parser.add_argument('--cost_type', choices=[COST_TYPE_CPU, COST_TYPE_SLEEP], default=COST_TYPE_SLEEP)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--pool_kwargs', type=str, default='{}',
+                        help='Additional (JSON-encoded) arguments of mtasklite.Pool')
+    parser.add_argument('--output', type=str, default=None, help='A JSON file to save results')
+    parser.add_argument('--run_one_config', type=str, default=None, help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    main(args)
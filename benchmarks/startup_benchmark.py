@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""
+    A benchmark of mtasklite.Pool startup latency for different start methods of worker processes.
+
+    Each worker imports a list of (heavy) modules before it processes the first item, which mimics
+    workers that import, e.g., torch or pandas. With the 'forkserver+preload' method, these modules are
+    imported only once by the fork server (see the argument preload_modules of mtasklite.Pool).
+
+    For each start method, we create several short-lived pools in a row (in a fresh process) and report
+    the time till the first result for the first ("cold") pool and the median time for the remaining ("warm")
+    pools as well as the total time of the tiny job each pool runs.
+
+    Sample usage:
+
+    python benchmarks/startup_benchmark.py --modules numpy pandas --output startup.json
+"""
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+
+import multiprocess as mp
+
+from bench_utils import percentile, run_in_subprocess, save_results
+
+from mtasklite import Pool
+
+START_METHODS = ['fork', 'spawn', 'forkserver', 'forkserver+preload']
+
+DEFAULT_MODULES = ['asyncio', 'decimal', 'email.mime.multipart', 'http.client', 'xml.etree.ElementTree']
+
+
+def import_modules_worker(arg):
+    modules, item_id = arg
+    for module_name in modules:
+        importlib.import_module(module_name)
+    return item_id
+
+
+def run_one_config(config):
+    start_method = config['start_method']
+    pool_kwargs = dict(start_method=start_method)
+    if start_method == 'forkserver+preload':
+        pool_kwargs = dict(preload_modules=config['modules'])
+
+    first_result_times = []
+    total_times = []
+    for _ in range(config['pool_qty']):
+        start_time = time.perf_counter()
+        first_result_time = None
+        with Pool(import_modules_worker, config['n_jobs'], **pool_kwargs) as pool:
+            for _ in pool([(config['modules'], item_id) for item_id in range(config['n_items'])]):
+                if first_result_time is None:
+                    first_result_time = time.perf_counter() - start_time
+        first_result_times.append(first_result_time)
+        total_times.append(time.perf_counter() - start_time)
+
+    return dict(
+        cold_first_result_ms=first_result_times[0] * 1000,
+        cold_total_ms=total_times[0] * 1000,
+        warm_first_result_ms=percentile(first_result_times[1:], 50) * 1000,
+        warm_total_ms=percentile(total_times[1:], 50) * 1000,
+    )
+
+
+def main(args):
+    if args.run_one_config is not None:
+        # Print the result as the last line of the output
+        print(json.dumps(run_one_config(json.loads(args.run_one_config))))
+        return
+
+    config_results = []
+    for start_method in args.start_methods:
+        config = dict(start_method=start_method, n_jobs=args.n_jobs, n_items=args.n_items,
+                      pool_qty=args.pool_qty, modules=args.modules)
+        result = run_in_subprocess(os.path.abspath(__file__), config)
+        print(f'{start_method:20}',
+              f'cold: first result {result["cold_first_result_ms"]:.1f}ms total {result["cold_total_ms"]:.1f}ms',
+              f'warm: first result {result["warm_first_result_ms"]:.1f}ms total {result["warm_total_ms"]:.1f}ms')
+        sys.stdout.flush()
+        config_results.append(dict(config=config, result=result))
+
+    if args.output is not None:
+        save_results(args.output, 'startup_benchmark', config_results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--start_methods', nargs='+', choices=START_METHODS, default=START_METHODS)
+    parser.add_argument('--modules', nargs='+', default=DEFAULT_MODULES,
+                        help='Modules each worker imports (e.g., numpy pandas torch)')
+    parser.add_argument('--n_jobs', type=int, default=mp.cpu_count())
+    parser.add_argument('--n_items', type=int, default=None,
+                        help='The number of items each pool processes (the default is two items per worker)')
+    parser.add_argument('--pool_qty', type=int, default=5,
+                        help='The number of pools created in a row for each start method (at least two)')
+    parser.add_argument('--output', type=str, default=None, help='A JSON file to save results')
+    parser.add_argument('--run_one_config', type=str, default=None, help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+    if args.n_items is None:
+        args.n_items = 2 * args.n_jobs
+    assert args.pool_qty >= 2, 'At least two pools are needed to measure the warm startup!'
+
+    main(args)
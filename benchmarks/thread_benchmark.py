@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+    A benchmark of mtasklite.Pool with threads (use_threads=True): In-process queues, which pass objects
+    by reference, are compared with multiprocess queues, which pickle every batch and send it through an OS pipe
+    via a feeder thread (this is how thread pools worked before).
+
+    Workers either sleep (which mimics I/O-bound workers) or return immediately. For each configuration we report
+    items/sec and the CPU time (of all threads) per item.
+
+    Sample usage:
+
+    python benchmarks/thread_benchmark.py --n_jobs 16 --item_cost 0.001 --output threads.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from bench_utils import run_in_subprocess, save_results
+
+from mtasklite import Pool
+
+QUEUE_TYPES = ['local', 'multiprocess']
+
+
+class MultiprocessQueuePool(Pool):
+    """
+        A thread pool that uses multiprocess queues (the baseline).
+    """
+    def _create_queue(self):
+        return self.mp_context.Queue()
+
+
+def io_worker(arg):
+    item_cost, payload = arg
+    if item_cost > 0:
+        time.sleep(item_cost)
+    return payload
+
+
+def make_payload(payload_size):
+    return {f'field{k}': f'value{k}' for k in range(payload_size)}
+
+
+def run_one_config(config):
+    pool_class = Pool if config['queue_type'] == 'local' else MultiprocessQueuePool
+    payload = make_payload(config['payload_size'])
+
+    start_time = time.perf_counter()
+    start_cpu_time = time.process_time()
+    result_qty = 0
+    with pool_class(io_worker, config['n_jobs'], use_threads=True, batch_size=config['batch_size'],
+                    **config['pool_kwargs']) as pool:
+        for _ in pool((config['item_cost'], payload) for _ in range(config['n_items'])):
+            result_qty += 1
+    elapsed_time = time.perf_counter() - start_time
+    cpu_time = time.process_time() - start_cpu_time
+    assert result_qty == config['n_items']
+
+    return dict(items_per_sec=config['n_items'] / elapsed_time, cpu_us_per_item=cpu_time / config['n_items'] * 1e6)
+
+
+def main(args):
+    if args.run_one_config is not None:
+        # Print the result as the last line of the output
+        print(json.dumps(run_one_config(json.loads(args.run_one_config))))
+        return
+
+    config_results = []
+    for payload_size in args.payload_sizes:
+        for queue_type in args.queue_types:
+            config = dict(queue_type=queue_type, n_jobs=args.n_jobs, n_items=args.n_items,
+                          item_cost=args.item_cost, payload_size=payload_size, batch_size=args.batch_size,
+                          pool_kwargs=json.loads(args.pool_kwargs))
+            result = run_in_subprocess(os.path.abspath(__file__), config)
+            print(f'payload size: {payload_size:6} {queue_type:12}',
+                  f'{result["items_per_sec"]:10.0f} items/sec CPU time: {result["cpu_us_per_item"]:8.1f}us/item')
+            sys.stdout.flush()
+            config_results.append(dict(config=config, result=result))
+
+    if args.output is not None:
+        save_results(args.output, 'thread_benchmark', config_results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--queue_types', nargs='+', choices=QUEUE_TYPES, default=QUEUE_TYPES)
+    parser.add_argument('--n_jobs', type=int, default=16)
+    parser.add_argument('--n_items', type=int, default=20000)
+    parser.add_argument('--item_cost', type=float, default=1e-3,
+                        help='How long a worker sleeps (in seconds), zero means no sleeping')
+    parser.add_argument('--payload_sizes', type=int, nargs='+', default=[1, 100],
+                        help='The number of fields in the dictionary that is sent to a worker and returned back')
+    parser.add_argument('--batch_size', type=int, default=1)
+    parser.add_argument('--pool_kwargs', type=str, default='{}',
+                        help='Additional (JSON-encoded) arguments of mtasklite.Pool')
+    parser.add_argument('--output', type=str, default=None, help='A JSON file to save results')
+    parser.add_argument('--run_one_config', type=str, default=None, help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    main(args)
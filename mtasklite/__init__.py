@@ -1,5 +1,9 @@
 from .pool import Pool
+from .pipeline import Pipeline, Stage
 from .delayed_init import delayed_init
 from .utils import is_exception
-from .constants import ExceptionBehaviour, ArgumentPassing
+from .exceptions import WorkerInitError, WorkerCrashed
+from .metrics import PoolMetrics, TaskMetrics
+from .constants import ExceptionBehaviour, ArgumentPassing, Transport, Scheduler, Serialization
+from .serialization import Serializer
 from .version import __version__
\ No newline at end of file
@@ -9,9 +9,37 @@ class ArgumentPassing(NamedTuple):
     AS_SINGLE_ARG = 'single_arg'
     AS_ARGS = 'args'
     AS_KWARGS = 'kwargs'
+    # A vectorized worker receives a list of items (a batch) and returns a list of results of the same length
+    AS_BATCH = 'batch'
 
 
 class ExceptionBehaviour(NamedTuple):
     IGNORE = 'ignore'
     IMMEDIATE = 'immediate'
     DEFERRED = 'deferred'
+
+
+class Transport(NamedTuple):
+    QUEUE = 'queue'
+    SHARED_MEMORY = 'shared_memory'
+
+
+class Scheduler(NamedTuple):
+    # All workers read from a single shared input queue
+    SHARED_QUEUE = 'shared_queue'
+    # Each worker has its own input queue: Batches are assigned to workers in a round-robin fashion
+    ROUND_ROBIN = 'round_robin'
+    # Each worker has its own input queue: Batches are assigned to a worker with the fewest items in flight
+    LEAST_LOADED = 'least_loaded'
+    # All workers read from a single shared input queue, but batches are kept in the main process till workers
+    # are about to become free: They are dispatched according to priorities and weights of input streams
+    PRIORITY = 'priority'
+
+
+class Serialization(NamedTuple):
+    # Queues pickle batches using dill (the default)
+    DILL = 'dill'
+    # The standard pickle (the highest protocol)
+    PICKLE = 'pickle'
+    # MessagePack (the package msgpack is an optional dependency)
+    MSGPACK = 'msgpack'
@@ -36,16 +36,24 @@ class ShellObject:
         self.kwargs = kwargs
         self._instance = None  # Placeholder for the actual instance
 
-    def __call__(self, *args, **kwargs):
+    def init(self):
         """
-            This function actually creates the target class object.
+            Create the target class object (if it has not been created yet).
 
             :return: a reference to an object of the class specified in the constructor.
         """
         if self._instance is None:
-            # Only create the actual object when called
             self._instance = self.cls(*self.args, **self.kwargs)
-        return self._instance(*args, **kwargs)
+        return self._instance
+
+    def __call__(self, *args, **kwargs):
+        """
+            This function actually creates the target class object (on the first call) and calls it.
+
+            :return: a value returned by the object of the class specified in the constructor.
+        """
+        # Only create the actual object when called
+        return self.init()(*args, **kwargs)
 
 
 def delayed_init(cls):
@@ -0,0 +1,26 @@
+class WorkerInitError(Exception):
+    """
+        Raised when one or more (eagerly initialized) workers fail to initialize.
+        The attribute errors maps worker IDs to respective exceptions.
+    """
+    def __init__(self, errors):
+        super().__init__(f'Failed to initialize worker(s): ' +
+                         ', '.join([f'{worker_id}: {repr(e)}' for worker_id, e in sorted(errors.items())]))
+        self.errors = errors
+
+
+class WorkerCrashed(Exception):
+    """
+        Returned (or raised) instead of a result of a task whose worker process crashed more times
+        than the retry budget allows. The attribute exitcode is the exit code of the last crashed worker
+        (a negative value -N means that the process was killed by the signal N).
+    """
+    def __init__(self, exitcode, crash_qty):
+        super().__init__(f'The worker process crashed (exit code: {exitcode}) {crash_qty} time(s)'
+                         f' while processing the task')
+        self.exitcode = exitcode
+        self.crash_qty = crash_qty
+
+    def __reduce__(self):
+        # The exception is sent to workers, which return it as a result
+        return WorkerCrashed, (self.exitcode, self.crash_qty)
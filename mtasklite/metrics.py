@@ -0,0 +1,241 @@
+"""
+    Opt-in instrumentation of the worker pool: per-task timestamps and pool-level counters.
+
+    All timestamps are wall-clock times (time.time()), because they are obtained in different processes.
+"""
+import json
+import threading
+import time
+
+from typing import NamedTuple
+
+# Phases of the task life cycle: Each phase is a difference between two timestamps of TaskMetrics
+TASK_PHASES = ['queue_wait', 'dispatch', 'compute', 'result_wait', 'reorder_delay', 'latency']
+
+
+class TaskMetrics(NamedTuple):
+    """
+        Timestamps of a single task (i.e., an input item):
+
+        1. submit_time: a batch with the item was put into the input queue;
+        2. dequeue_time: a worker received the batch;
+        3. start_time and end_time: the worker started and finished processing the item;
+        4. receive_time: the main process received the batch of results;
+        5. yield_time: the result was returned to the user.
+
+        The call ID identifies the input iterable (it is None for a pool with a single worker)
+        and the object ID is the position of the item in this input iterable.
+    """
+    call_id: int
+    obj_id: int
+    worker_id: int
+    submit_time: float
+    dequeue_time: float
+    start_time: float
+    end_time: float
+    receive_time: float
+    yield_time: float = None
+
+    @property
+    def queue_wait(self):
+        return self.dequeue_time - self.submit_time
+
+    @property
+    def dispatch(self):
+        # Decoding of arguments and processing of previous items of the same batch
+        return self.start_time - self.dequeue_time
+
+    @property
+    def compute(self):
+        return self.end_time - self.start_time
+
+    @property
+    def result_wait(self):
+        return self.receive_time - self.end_time
+
+    @property
+    def reorder_delay(self):
+        return self.yield_time - self.receive_time
+
+    @property
+    def latency(self):
+        return self.yield_time - self.submit_time
+
+
+class PoolMetrics:
+    """
+        Thread-safe pool-level counters. Counters are updated by result generators of the pool
+        (in the main process) and a snapshot can be obtained at any time, e.g., from another thread.
+    """
+    def __init__(self, num_workers):
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+
+        self.submitted_items = 0
+        self.submitted_batches = 0
+        self.received_items = 0
+        self.discarded_items = 0
+        self.yielded_items = 0
+
+        self.in_flight_items = 0
+        self.max_in_flight_items = 0
+        # The number of received results that were not returned to the user yet
+        self.reorder_buffer_depth = 0
+        self.max_reorder_buffer_depth = 0
+        # Stalls of submission due to a full reorder buffer and results returned out of order (soft-ordered mode)
+        self.reorder_stalls = 0
+        self.reorder_stall_time = 0.0
+        self.out_of_order_items = 0
+        # Results that were spilled to disk (see spill.py)
+        self.spilled_items = 0
+        # Duplicates of straggler batches (speculative execution) and the work spent on results that were discarded
+        self.duplicated_batches = 0
+        self.duplicated_items = 0
+        self.wasted_items = 0
+        self.wasted_time = 0.0
+
+        self.phase_total = {phase: 0.0 for phase in TASK_PHASES}
+        self.phase_max = {phase: 0.0 for phase in TASK_PHASES}
+
+        self.worker_busy_time = [0.0] * num_workers
+        self.worker_processed_items = [0] * num_workers
+
+    def on_submit(self, qty):
+        with self.lock:
+            self.submitted_items += qty
+            self.submitted_batches += 1
+            self.in_flight_items += qty
+            self.max_in_flight_items = max(self.max_in_flight_items, self.in_flight_items)
+
+    def on_receive(self, qty, worker_id, busy_time):
+        with self.lock:
+            self.received_items += qty
+            self.in_flight_items -= qty
+            self.reorder_buffer_depth += qty
+            self.max_reorder_buffer_depth = max(self.max_reorder_buffer_depth, self.reorder_buffer_depth)
+            if worker_id is not None:
+                self.worker_busy_time[worker_id] += busy_time
+                self.worker_processed_items[worker_id] += qty
+
+    def on_discard(self, in_flight_qty, buffered_qty):
+        """
+            Account for results that will never be returned to the user (e.g., the generator was closed).
+
+            :param in_flight_qty: the number of results that will be discarded upon arrival
+            :param buffered_qty: the number of received, but not returned, results
+        """
+        with self.lock:
+            self.discarded_items += in_flight_qty + buffered_qty
+            self.in_flight_items -= in_flight_qty
+            self.reorder_buffer_depth -= buffered_qty
+
+    def on_reorder_stall(self, stall_time):
+        with self.lock:
+            self.reorder_stalls += 1
+            self.reorder_stall_time += stall_time
+
+    def on_out_of_order(self, qty):
+        with self.lock:
+            self.out_of_order_items += qty
+
+    def on_spill(self, qty):
+        with self.lock:
+            self.spilled_items += qty
+
+    def on_duplicate(self, qty):
+        with self.lock:
+            self.duplicated_batches += 1
+            self.duplicated_items += qty
+
+    def on_wasted_work(self, qty, busy_time):
+        with self.lock:
+            self.wasted_items += qty
+            self.wasted_time += busy_time
+
+    def on_yield(self, task_metrics: TaskMetrics):
+        with self.lock:
+            self.yielded_items += 1
+            self.reorder_buffer_depth -= 1
+            for phase in TASK_PHASES:
+                value = getattr(task_metrics, phase)
+                self.phase_total[phase] += value
+                self.phase_max[phase] = max(self.phase_max[phase], value)
+
+    def snapshot(self):
+        """
+            Return a snapshot of all counters as a dictionary.
+        """
+        with self.lock:
+            uptime = time.time() - self.start_time
+            return {
+                'uptime': uptime,
+                'submitted_items': self.submitted_items,
+                'submitted_batches': self.submitted_batches,
+                'received_items': self.received_items,
+                'discarded_items': self.discarded_items,
+                'yielded_items': self.yielded_items,
+                'in_flight_items': self.in_flight_items,
+                'max_in_flight_items': self.max_in_flight_items,
+                'reorder_buffer_depth': self.reorder_buffer_depth,
+                'max_reorder_buffer_depth': self.max_reorder_buffer_depth,
+                'reorder_stalls': self.reorder_stalls,
+                'reorder_stall_time': self.reorder_stall_time,
+                'out_of_order_items': self.out_of_order_items,
+                'spilled_items': self.spilled_items,
+                'duplicated_batches': self.duplicated_batches,
+                'duplicated_items': self.duplicated_items,
+                'wasted_items': self.wasted_items,
+                'wasted_time': self.wasted_time,
+                'phases': {phase: {'total': self.phase_total[phase],
+                                   'mean': self.phase_total[phase] / max(self.yielded_items, 1),
+                                   'max': self.phase_max[phase]} for phase in TASK_PHASES},
+                'workers': [{'worker_id': worker_id,
+                             'processed_items': self.worker_processed_items[worker_id],
+                             'busy_time': busy_time,
+                             'utilization': busy_time / uptime if uptime > 0 else 0.0}
+                            for worker_id, busy_time in enumerate(self.worker_busy_time)]
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot())
+
+    def to_prometheus(self, prefix='mtasklite'):
+        """
+            Return a snapshot of counters in the Prometheus text exposition format.
+
+            :param prefix: a prefix of metric names
+        """
+        snapshot = self.snapshot()
+        lines = []
+
+        def add_metric(name, metric_type, values):
+            lines.append(f'# TYPE {prefix}_{name} {metric_type}')
+            for labels, value in values:
+                label_str = '{' + ','.join([f'{k}="{v}"' for k, v in labels]) + '}' if labels else ''
+                lines.append(f'{prefix}_{name}{label_str} {value}')
+
+        for name in ['submitted_items', 'submitted_batches', 'received_items', 'discarded_items', 'yielded_items',
+                     'reorder_stalls', 'out_of_order_items', 'spilled_items', 'duplicated_batches',
+                     'duplicated_items', 'wasted_items']:
+            add_metric(f'{name}_total', 'counter', [([], snapshot[name])])
+        for name in ['in_flight_items', 'max_in_flight_items', 'reorder_buffer_depth', 'max_reorder_buffer_depth']:
+            add_metric(name, 'gauge', [([], snapshot[name])])
+
+        add_metric('reorder_stall_seconds_total', 'counter', [([], snapshot['reorder_stall_time'])])
+        add_metric('wasted_seconds_total', 'counter', [([], snapshot['wasted_time'])])
+
+        phases = snapshot['phases']
+        add_metric('task_phase_seconds_total', 'counter',
+                   [([('phase', phase)], phases[phase]['total']) for phase in TASK_PHASES])
+        add_metric('task_phase_seconds_max', 'gauge',
+                   [([('phase', phase)], phases[phase]['max']) for phase in TASK_PHASES])
+
+        workers = snapshot['workers']
+        add_metric('worker_processed_items_total', 'counter',
+                   [([('worker', e['worker_id'])], e['processed_items']) for e in workers])
+        add_metric('worker_busy_seconds_total', 'counter',
+                   [([('worker', e['worker_id'])], e['busy_time']) for e in workers])
+        add_metric('worker_utilization', 'gauge',
+                   [([('worker', e['worker_id'])], e['utilization']) for e in workers])
+
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,194 @@
+"""
+    Micro-batching of individually submitted items (see Pool.submit): Concurrent submissions are gathered
+    into micro-batches, each micro-batch is sent to a single worker, and a future of each item is resolved
+    as soon as the results of its micro-batch arrive.
+"""
+import concurrent.futures
+import queue
+import threading
+import time
+
+from .constants import ArgumentPassing
+from .utils import is_exception
+
+# How often (at most) the thread that waits for results checks whether it needs to stop
+MICRO_BATCH_POLL_TIMEOUT = 0.1
+
+
+class MicroBatcher:
+    """
+        A micro-batch has at most max_batch_size items (or as many items as an optional adaptive batch sizer
+        suggests). It is dispatched when it is full or when its first item waits for more items longer than
+        max_wait seconds. If max_wait is None, a micro-batch includes only the items that were already
+        submitted when its first item is taken.
+
+        The micro-batcher uses two threads: One gathers and dispatches micro-batches and another one
+        receives results (a pool with a single worker processes micro-batches in the first thread).
+    """
+    def __init__(self, parent_obj, max_batch_size, batch_sizer=None, max_wait=None):
+        self.parent_obj = parent_obj
+        self.max_batch_size = max_batch_size
+        self.batch_sizer = batch_sizer
+        self.max_wait = max_wait
+        # Tuples (item, future) and None, which is the end-of-work signal
+        self.submit_queue = queue.Queue()
+
+        self.lock = threading.Lock()
+        # Futures of micro-batches in flight: start object ID -> a list of futures
+        self.pending_futures = {}
+        self.next_obj_id = 0
+        self.dispatch_finished = False
+        self.stopping = False
+
+        self.single_worker = parent_obj.single_worker
+        self.call_id = parent_obj._start_call() if self.single_worker is None else None
+
+        self.dispatch_thread = threading.Thread(target=self._dispatch_loop, daemon=True)
+        self.dispatch_thread.start()
+        if self.single_worker is None:
+            self.receive_thread = threading.Thread(target=self._receive_loop, daemon=True)
+            self.receive_thread.start()
+        else:
+            self.receive_thread = None
+
+    def submit(self, item):
+        future = concurrent.futures.Future()
+        with self.lock:
+            assert not self.stopping, 'The pool is closed!'
+            self.submit_queue.put((item, future))
+        return future
+
+    def stop(self, timeout=None):
+        """
+            Dispatch all submitted items and wait till their results are received. Futures that are not
+            resolved within the timeout fail.
+        """
+        with self.lock:
+            self.stopping = True
+            self.submit_queue.put(None)
+        deadline = time.perf_counter() + timeout if timeout is not None else None
+        for thread in [self.dispatch_thread, self.receive_thread]:
+            if thread is not None:
+                thread.join(max(deadline - time.perf_counter(), 0) if deadline is not None else None)
+
+        with self.lock:
+            pending_futures = [future for futures in self.pending_futures.values() for future in futures]
+            self.pending_futures = {}
+        # Items that were not dispatched (if the dispatching thread is stuck)
+        while True:
+            try:
+                entry = self.submit_queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is not None and entry[1].set_running_or_notify_cancel():
+                pending_futures.append(entry[1])
+        for future in pending_futures:
+            future.set_exception(RuntimeError('The pool was closed before the item was processed'))
+        if self.call_id is not None:
+            self.parent_obj._finish_call(self.call_id)
+
+    def _get_batch(self):
+        """
+            :return: a tuple: a list of (item, future) and a flag that the end-of-work signal was received
+        """
+        entry = self.submit_queue.get()
+        if entry is None:
+            return [], True
+
+        batch = [entry]
+        max_batch_size = self.batch_sizer.batch_size() if self.batch_sizer is not None else self.max_batch_size
+        deadline = time.perf_counter() + (self.max_wait or 0)
+        while len(batch) < max_batch_size:
+            timeout = deadline - time.perf_counter()
+            try:
+                entry = self.submit_queue.get(timeout=timeout) if timeout > 0 else self.submit_queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None:
+                return batch, True
+            batch.append(entry)
+
+        return batch, False
+
+    def _dispatch_loop(self):
+        finished = False
+        while not finished:
+            batch, finished = self._get_batch()
+            # Cancelled futures are not processed
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            if self.single_worker is not None:
+                self._process_in_place(batch)
+            else:
+                self._dispatch_batch(batch)
+
+        with self.lock:
+            self.dispatch_finished = True
+
+    def _dispatch_batch(self, batch):
+        worker_arg_batch = [item for item, _ in batch]
+        with self.lock:
+            start_obj_id = self.next_obj_id
+            self.next_obj_id += len(batch)
+            self.pending_futures[start_obj_id] = [future for _, future in batch]
+
+        batch_id = (self.call_id, start_obj_id)
+        shm_transport = self.parent_obj.shm_transport
+        if shm_transport is not None:
+            worker_arg_batch = shm_transport.encode_batch(batch_id, worker_arg_batch)
+        if self.parent_obj.serializer is not None:
+            worker_arg_batch = self.parent_obj.serializer.encode(worker_arg_batch,
+                                                                 check_shm_refs=shm_transport is not None)
+        self.parent_obj._dispatch_batch(batch_id, worker_arg_batch)
+
+    def _process_in_place(self, batch):
+        worker_arg_batch = [item for item, _ in batch]
+        start_time = time.perf_counter()
+        if self.parent_obj.argument_type == ArgumentPassing.AS_BATCH:
+            result_batch = self.single_worker.call_batch(worker_arg_batch)
+        else:
+            result_batch = []
+            for worker_arg in worker_arg_batch:
+                try:
+                    result_batch.append(self.single_worker.call(worker_arg, self.parent_obj.argument_type))
+                except Exception as e:
+                    result_batch.append(e)
+        self._update_batch_sizer(len(result_batch), time.perf_counter() - start_time)
+        self._resolve([future for _, future in batch], result_batch)
+
+    def _receive_loop(self):
+        while True:
+            with self.lock:
+                if self.dispatch_finished and not self.pending_futures:
+                    break
+            try:
+                message = self.parent_obj._get_result_message(self.call_id, MICRO_BATCH_POLL_TIMEOUT)
+            except queue.Empty:
+                continue
+
+            batch_id, result_batch, elapsed_time, _ = message
+            self.parent_obj._on_batch_done(batch_id, len(result_batch))
+            shm_transport = self.parent_obj.shm_transport
+            if shm_transport is not None:
+                shm_transport.release_batch(batch_id)
+                result_batch = shm_transport.decode_results(result_batch)
+            self._update_batch_sizer(len(result_batch), elapsed_time)
+
+            with self.lock:
+                futures = self.pending_futures.pop(batch_id[1], None)
+            if futures is not None:
+                self._resolve(futures, result_batch)
+
+    def _update_batch_sizer(self, batch_qty, elapsed_time):
+        if self.batch_sizer is not None:
+            self.batch_sizer.update(batch_qty, elapsed_time)
+
+    @staticmethod
+    def _resolve(futures, result_batch):
+        # Futures are resolved one by one: Callbacks of a future run before the next future is resolved
+        for future, result in zip(futures, result_batch):
+            if is_exception(result):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
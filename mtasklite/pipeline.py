@@ -0,0 +1,440 @@
+"""
+    A multi-stage pipeline: Each stage has its own workers (processes or threads), and results of a stage flow
+    directly to workers of the next stage through a bounded inter-stage queue, i.e., they do not go back
+    through the main process. When a queue is full, workers of the preceding stage wait, which eventually
+    stalls reading the input iterable (end-to-end backpressure). If needed, the input order is restored
+    only once, after the last stage.
+
+    Sample usage:
+
+    with Pipeline([Stage(decode, 4), Stage(featurize, 8, use_threads=True), Stage(score, 2)]) as pipeline:
+        for res in pipeline(input_iterable):
+            ...
+        print(pipeline.stats())
+"""
+import logging
+import queue
+import threading
+import time
+
+import multiprocess as mp
+
+from .constants import ExceptionBehaviour, ArgumentPassing
+from .delayed_init import ShellObject
+from .exceptions import WorkerCrashed
+from .pool import WorkerWrapper, SortedOutputHelper, is_valid_worker
+from .thread_queue import BoundedThreadQueue
+from .utils import is_exception
+
+# How often (at most) workers and the input-reading thread blocked on a queue check whether the pipeline stops
+PIPELINE_POLL_TIMEOUT = 0.1
+# By default, the input queue of a stage holds up to this number of batches per worker
+DEFAULT_BUFFER_RATIO = 2
+
+# Indices of per-stage counters (see StageWorker)
+STAT_ITEMS = 0
+STAT_BUSY_TIME = 1
+STAT_INPUT_WAIT = 2
+STAT_OUTPUT_WAIT = 3
+STAT_QTY = 4
+
+
+class Stage:
+    """
+        A pipeline stage: worker functions/objects and the settings of its workers.
+    """
+    def __init__(self, worker_or_worker_arr,
+                 n_jobs: int = None,
+                 use_threads: bool = False,
+                 argument_type: ArgumentPassing = ArgumentPassing.AS_SINGLE_ARG,
+                 batch_size: int = 1,
+                 buffer_size: int = None,
+                 name: str = None):
+        """
+        :param worker_or_worker_arr: A single worker function/object or a list of worker functions/objects
+        :param n_jobs: Number of worker processes/threads to create (ignored if worker_or_worker_arr is a list)
+        :param use_threads: Use threads instead of processes
+        :param argument_type: Specifies how arguments are passed to workers (ArgumentPassing.AS_BATCH is not supported)
+        :param batch_size: The number of items sent to a worker of this stage in a single message
+        :param buffer_size: The capacity (in batches) of the input queue of this stage
+                            (the default is DEFAULT_BUFFER_RATIO times the number of workers)
+        :param name: A stage name used in statistics (the default is the name of the worker function/class)
+        """
+        if type(worker_or_worker_arr) == list:
+            assert n_jobs is None or n_jobs == len(worker_or_worker_arr), \
+                'The number of workers does not match the worker array length (you can just set it None)!'
+            self.worker_specs = list(worker_or_worker_arr)
+        else:
+            assert n_jobs is not None, 'Specify the number of jobs or an array of worker objects!'
+            self.worker_specs = [worker_or_worker_arr] * max(int(n_jobs), 1)
+        for worker in self.worker_specs:
+            assert is_valid_worker(worker), \
+                f'A worker must be a function or an instance of a class with a delayed initialization, not {type(worker)}!'
+        assert argument_type != ArgumentPassing.AS_BATCH, 'Vectorized workers are not supported by pipelines!'
+
+        self.num_workers = len(self.worker_specs)
+        self.use_threads = use_threads
+        self.argument_type = argument_type
+        self.batch_size = max(int(batch_size), 1)
+        self.buffer_size = max(int(buffer_size), 1) if buffer_size is not None \
+            else DEFAULT_BUFFER_RATIO * self.num_workers
+        if name is None:
+            worker = self.worker_specs[0]
+            name = getattr(worker, '__name__', None) or getattr(getattr(worker, 'cls', None), '__name__', None) or \
+                type(worker).__name__
+        self.name = name
+
+
+class StageWorker:
+    """
+        The main loop of a stage worker: Messages are batches of pairs (object ID, item) or None, which is
+        the end-of-work signal of a single upstream worker (a worker of the preceding stage or the thread reading
+        the input iterable). Each worker sends its own signal after its last batch: When workers of a stage have
+        received signals of all upstream workers, all upstream batches have been received as well. Items that failed in a preceding stage (i.e., exceptions) are passed along
+        without processing. Results are grouped into batches of the next stage's batch size: A partial batch
+        is sent when the worker has nothing to process.
+    """
+    def __init__(self, worker, argument_type, out_batch_size, stats, upstream_finished_qty, upstream_worker_qty,
+                 input_done, stop_event):
+        self.worker = worker
+        self.argument_type = argument_type
+        self.out_batch_size = out_batch_size
+        # Shared per-stage counters (see STAT_*)
+        self.stats = stats
+        # The number of end-of-work signals received (by all workers of this stage) from upstream workers
+        self.upstream_finished_qty = upstream_finished_qty
+        self.upstream_worker_qty = upstream_worker_qty
+        # Set when all upstream workers finished: Workers of this stage exit once the input queue is empty
+        self.input_done = input_done
+        self.stop_event = stop_event
+
+    def _get(self, in_queue, block):
+        """
+            :return: the next batch, an empty list if block is False and there is no batch,
+                     or None if the input is exhausted or the pipeline stops
+        """
+        while not self.stop_event.is_set() and not self.input_done.is_set():
+            try:
+                message = in_queue.get(timeout=PIPELINE_POLL_TIMEOUT) if block else in_queue.get_nowait()
+            except queue.Empty:
+                if not block:
+                    return []
+                continue
+            if message is not None:
+                return message
+            with self.upstream_finished_qty.get_lock():
+                self.upstream_finished_qty.value += 1
+                if self.upstream_finished_qty.value == self.upstream_worker_qty:
+                    self.input_done.set()
+        return None
+
+    def _put(self, out_queue, message):
+        while not self.stop_event.is_set():
+            try:
+                out_queue.put(message, timeout=PIPELINE_POLL_TIMEOUT)
+                return
+            except queue.Full:
+                pass
+
+    def _update_stats(self, stat_id, value):
+        with self.stats.get_lock():
+            self.stats[stat_id] += value
+
+    def _flush(self, out_queue, out_batch):
+        """
+            :return: the time spent waiting for space in the output queue
+        """
+        if not out_batch:
+            return 0.0
+        start_time = time.perf_counter()
+        self._put(out_queue, out_batch)
+        wait_time = time.perf_counter() - start_time
+        self._update_stats(STAT_OUTPUT_WAIT, wait_time)
+        return wait_time
+
+    def __call__(self, in_queue, out_queue):
+        worker = WorkerWrapper(self.worker, None)
+        out_batch = []
+        while True:
+            batch = self._get(in_queue, block=False)
+            if batch == []:
+                # Partial results are sent before waiting for more input
+                self._flush(out_queue, out_batch)
+                out_batch = []
+                start_time = time.perf_counter()
+                batch = self._get(in_queue, block=True)
+                self._update_stats(STAT_INPUT_WAIT, time.perf_counter() - start_time)
+            if batch is None:
+                break
+
+            start_time = time.perf_counter()
+            processed_qty = 0
+            output_wait_time = 0.0
+            for obj_id, item in batch:
+                if not is_exception(item):
+                    try:
+                        item = worker.call(item, self.argument_type)
+                    except Exception as e:
+                        item = e
+                    processed_qty += 1
+                out_batch.append((obj_id, item))
+                if len(out_batch) >= self.out_batch_size:
+                    output_wait_time += self._flush(out_queue, out_batch)
+                    out_batch = []
+            with self.stats.get_lock():
+                self.stats[STAT_ITEMS] += processed_qty
+                self.stats[STAT_BUSY_TIME] += time.perf_counter() - start_time - output_wait_time
+
+        self._flush(out_queue, out_batch)
+        # This signal follows all batches of this worker
+        self._put(out_queue, None)
+
+        if self.stop_event.is_set():
+            # Nobody reads queues of a stopped pipeline: Buffered messages are not flushed
+            in_queue.cancel_join_thread()
+            out_queue.cancel_join_thread()
+        for event_loop in worker.event_loops.values():
+            event_loop.close()
+
+
+class Pipeline:
+    """
+        A chain of stages. Each call of the pipeline starts workers of all stages, processes a single input
+        iterable, and stops workers when the input is processed (or the result generator is closed).
+    """
+    def __init__(self, stages,
+                 exception_behavior: ExceptionBehaviour = ExceptionBehaviour.IMMEDIATE,
+                 is_unordered: bool = False,
+                 max_in_flight: int = None,
+                 start_method: str = None,
+                 join_timeout: float = None):
+        """
+        :param stages: A list of Stage objects
+        :param exception_behavior: Defines how exceptions (of any stage) are handled
+        :param is_unordered: Whether results can be returned in any order (the order is restored after the last stage)
+        :param max_in_flight: The maximum number of items that were read from the input iterable, but whose
+                              results were not yet returned (the default is the total capacity of stage queues
+                              and workers), which also bounds the number of results waiting to be reordered.
+        :param start_method: A method to start worker processes: 'fork', 'spawn', or 'forkserver'
+        :param join_timeout: Timeout for joining workers
+        """
+        assert stages, 'A pipeline needs at least one stage!'
+        for stage in stages:
+            assert type(stage) == Stage, f'A pipeline stage must be a Stage object, not {type(stage)}!'
+        self.stages = list(stages)
+        self.exception_behavior = exception_behavior
+        self.is_unordered = is_unordered
+        if max_in_flight is None:
+            max_in_flight = sum([(stage.buffer_size + stage.num_workers) * stage.batch_size for stage in stages])
+        assert max_in_flight >= 1
+        self.max_in_flight = max_in_flight
+        self.join_timeout = join_timeout
+        self.mp_context = mp.get_context(start_method)
+
+        self.workers = []
+        self.stop_event = None
+        self.start_time = None
+        self.end_time = None
+        self.stage_stats = [self.mp_context.Array('d', STAT_QTY) for _ in self.stages]
+        self.active = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, tb):
+        self.close()
+
+    def _create_queue(self, maxsize, threads_only):
+        """
+            A queue between threads of the main process does not need pickling.
+        """
+        return BoundedThreadQueue(maxsize) if threads_only else self.mp_context.Queue(maxsize)
+
+    def _start(self):
+        self.stop_event = self.mp_context.Event()
+        for stats in self.stage_stats:
+            with stats.get_lock():
+                for stat_id in range(STAT_QTY):
+                    stats[stat_id] = 0
+
+        # The input queue of each stage and the output queue of the last stage: The main process reads
+        # the input iterable and the results (as "threads").
+        self.queues = []
+        for stage_id, stage in enumerate(self.stages):
+            prev_uses_threads = stage_id == 0 or self.stages[stage_id - 1].use_threads
+            self.queues.append(self._create_queue(stage.buffer_size, prev_uses_threads and stage.use_threads))
+        self.queues.append(self._create_queue(self.stages[-1].buffer_size, self.stages[-1].use_threads))
+
+        self.workers = []
+        # Shared objects must outlive this function: Started processes do not keep references to their targets
+        self.upstream_finished_counters = []
+        self.input_done_events = []
+        for stage_id, stage in enumerate(self.stages):
+            is_last = stage_id + 1 == len(self.stages)
+            out_batch_size = self.stages[stage_id + 1].batch_size if not is_last else stage.batch_size
+            # The first stage receives input from a single thread of the main process
+            upstream_worker_qty = self.stages[stage_id - 1].num_workers if stage_id > 0 else 1
+            upstream_finished_qty = self.mp_context.Value('i', 0)
+            input_done = self.mp_context.Event()
+            self.upstream_finished_counters.append(upstream_finished_qty)
+            self.input_done_events.append(input_done)
+            for worker in stage.worker_specs:
+                if stage.use_threads and type(worker) == ShellObject:
+                    # Each thread gets its own object just like each process does
+                    worker = ShellObject(worker.cls, *worker.args, **worker.kwargs)
+                stage_worker = StageWorker(worker, stage.argument_type, out_batch_size, self.stage_stats[stage_id],
+                                           upstream_finished_qty, upstream_worker_qty, input_done,
+                                           self.stop_event)
+                process_class = threading.Thread if stage.use_threads else self.mp_context.Process
+                proc = process_class(target=stage_worker, args=(self.queues[stage_id], self.queues[stage_id + 1]),
+                                     daemon=True)
+                proc.start()
+                self.workers.append(proc)
+
+    def _feed(self, input_iterable, in_flight_slots):
+        """
+            Read the input iterable and send batches of input items to the first stage.
+        """
+        in_queue = self.queues[0]
+        batch_size = self.stages[0].batch_size
+        batch = []
+        try:
+            for obj_id, item in enumerate(input_iterable):
+                while not in_flight_slots.acquire(timeout=PIPELINE_POLL_TIMEOUT):
+                    if self.stop_event.is_set():
+                        return
+                batch.append((obj_id, item))
+                # A partial batch is not held if the first stage has nothing to do
+                if len(batch) >= batch_size or in_queue.empty():
+                    self._put(in_queue, batch)
+                    batch = []
+        except Exception as e:
+            # The input iterable failed: The exception is raised by the result generator
+            self.feed_error = e
+        if batch:
+            self._put(in_queue, batch)
+        self._put(in_queue, None)
+
+    def _put(self, out_queue, message):
+        while not self.stop_event.is_set():
+            try:
+                out_queue.put(message, timeout=PIPELINE_POLL_TIMEOUT)
+                return
+            except queue.Full:
+                pass
+
+    def __call__(self, input_iterable):
+        """
+            Process the input iterable.
+
+            :return: a generator of results
+        """
+        assert not self.active, 'The pipeline is already processing another input iterable!'
+        self.active = True
+        self._start()
+        self.feed_error = None
+        self.start_time = time.perf_counter()
+        self.end_time = None
+        in_flight_slots = threading.Semaphore(self.max_in_flight)
+        self.feed_thread = threading.Thread(target=self._feed, args=(input_iterable, in_flight_slots), daemon=True)
+        self.feed_thread.start()
+        return self._generator(in_flight_slots)
+
+    def _generator(self, in_flight_slots):
+        out_queue = self.queues[-1]
+        sorted_out_helper = SortedOutputHelper() if not self.is_unordered else None
+        exceptions_arr = []
+        # Each worker of the last stage sends an end-of-work signal after its last batch
+        active_worker_qty = self.stages[-1].num_workers
+        try:
+            while active_worker_qty > 0:
+                try:
+                    batch = out_queue.get(timeout=PIPELINE_POLL_TIMEOUT)
+                except queue.Empty:
+                    self._check_workers()
+                    continue
+                if batch is None:
+                    active_worker_qty -= 1
+                    continue
+                if sorted_out_helper is not None:
+                    for obj_id, result in batch:
+                        sorted_out_helper.add_obj(obj_id, result)
+                    results = sorted_out_helper.yield_results()
+                else:
+                    results = [result for _, result in batch]
+                for result in results:
+                    in_flight_slots.release()
+                    if is_exception(result):
+                        if self.exception_behavior == ExceptionBehaviour.IMMEDIATE:
+                            raise result
+                        elif self.exception_behavior == ExceptionBehaviour.DEFERRED:
+                            exceptions_arr.append(result)
+                            continue
+                        # If exception is ignored it will be returned to the end user
+                        assert self.exception_behavior == ExceptionBehaviour.IGNORE
+                    yield result
+
+            assert sorted_out_helper is None or sorted_out_helper.empty(), 'Logic error: unreturned results'
+            if self.feed_error is not None:
+                raise self.feed_error
+            if exceptions_arr:
+                raise Exception(*exceptions_arr)
+        finally:
+            self.end_time = time.perf_counter()
+            self._stop()
+
+    def _check_workers(self):
+        """
+            A crashed worker process would not send its results and the end-of-work signal: Rather than
+            waiting forever, the pipeline stops.
+        """
+        for proc in self.workers:
+            if not isinstance(proc, threading.Thread) and not proc.is_alive() and proc.exitcode != 0:
+                raise WorkerCrashed(proc.exitcode, 1)
+
+    def _stop(self):
+        if not self.active:
+            return
+        # Workers (and the input-reading thread) that wait on full or empty queues exit
+        self.stop_event.set()
+        self.feed_thread.join(self.join_timeout)
+        for proc in self.workers:
+            proc.join(self.join_timeout)
+            if proc.is_alive() and not isinstance(proc, threading.Thread):
+                logging.warning(f'A pipeline worker did not exit in {self.join_timeout} seconds: Terminating it')
+                proc.terminate()
+        for one_queue in self.queues:
+            one_queue.cancel_join_thread()
+        self.workers = []
+        self.active = False
+
+    def close(self):
+        self._stop()
+
+    def stats(self):
+        """
+            Per-stage statistics of the last (or current) call, which help to find the bottleneck stage:
+            It usually has the highest utilization and its workers rarely wait for input.
+
+            :return: a list of dictionaries (one per stage)
+        """
+        if self.start_time is None:
+            return []
+        elapsed_time = (self.end_time or time.perf_counter()) - self.start_time
+        ret = []
+        for stage, stats in zip(self.stages, self.stage_stats):
+            with stats.get_lock():
+                values = list(stats)
+            ret.append(dict(
+                name=stage.name,
+                n_jobs=stage.num_workers,
+                use_threads=stage.use_threads,
+                processed_items=int(values[STAT_ITEMS]),
+                items_per_sec=values[STAT_ITEMS] / elapsed_time if elapsed_time > 0 else 0.0,
+                busy_time=values[STAT_BUSY_TIME],
+                # The fraction of time workers of the stage were busy
+                utilization=values[STAT_BUSY_TIME] / (stage.num_workers * elapsed_time) if elapsed_time > 0 else 0.0,
+                input_wait_time=values[STAT_INPUT_WAIT],
+                output_wait_time=values[STAT_OUTPUT_WAIT],
+            ))
+        return ret
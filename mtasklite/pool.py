@@ -1,55 +1,280 @@
 import multiprocess as mp
+import asyncio
+import concurrent.futures
 import inspect
+import itertools
 import logging
 import queue
+import random
+import statistics
+import threading
+import time
 
+from collections import deque
 from heapq import heappush, heappop
+from multiprocess.connection import wait as wait_for_sentinels
+from typing import Any, Callable, List, Union
 
-from .constants import ExceptionBehaviour, ArgumentPassing
+from .constants import ExceptionBehaviour, ArgumentPassing, Transport, Scheduler, Serialization
 from .delayed_init import ShellObject
-
-from .utils import is_sized_iterator, is_exception
+from .exceptions import WorkerInitError, WorkerCrashed
+from .metrics import PoolMetrics, TaskMetrics
+from .micro_batching import MicroBatcher
+from .priority import PriorityDispatcher
+from .serialization import Serializer, get_serializer
+from .shm_transport import SharedMemoryTransport, DEFAULT_SHM_MIN_SIZE
+from .spill import SpillStore, SpillRef
+from .supervision import SyncQueue, WorkerStatusBoard, get_supervisor_poll_interval
+from .thread_queue import ThreadQueue
+
+from .utils import is_sized_iterator, is_async_iterable, is_exception, estimate_size, get_rss, is_free_threaded
 
 TINY_QUEUE_TIMEOUT=1e-6
+# How long an idle worker waits for its own queue before trying to steal work from other workers
+WORK_STEALING_POLL_TIMEOUT=0.005
+# While there is nothing to steal, the wait time doubles (up to this limit), so that idle workers rarely wake up
+WORK_STEALING_MAX_POLL_TIMEOUT=0.2
+# How long a thread waiting for results on behalf of the event loop blocks on the output queue
+ASYNC_QUEUE_POLL_TIMEOUT=0.1
+
+# A special value of the batch size that enables adaptive batching
+AUTO_BATCH_SIZE = 'auto'
+# A special value of use_threads: Threads are used only if the interpreter is free-threaded (no GIL)
+AUTO_USE_THREADS = 'auto'
+# Adaptive batching aims to keep the processing time of a single batch close to this value (in seconds)
+ADAPTIVE_BATCH_TARGET_TIME = 0.01
+ADAPTIVE_BATCH_MAX_SIZE = 1024
+# A smoothing factor of the exponential moving average of the per-item processing time
+ADAPTIVE_BATCH_EMA_ALPHA = 0.25
+
+# With the priority scheduler, the number of batches sent to workers (and not yet received) is at most
+# this number times the number of workers
+PRIORITY_DISPATCH_RATIO = 2
+
+# Speculative execution: The median per-item processing time is computed over this many recent batches
+# (and it is not used until at least SPECULATION_MIN_SAMPLES batches are processed). A batch is never
+# duplicated earlier than SPECULATION_MIN_DELAY seconds after it was submitted.
+SPECULATION_WINDOW_SIZE = 100
+SPECULATION_MIN_SAMPLES = 5
+SPECULATION_MIN_DELAY = 0.01
+
+
+def min_deadline(deadline1, deadline2):
+    """
+        The earliest of two deadlines, either of which can be None (i.e., no deadline).
+    """
+    if deadline1 is None:
+        return deadline2
+    if deadline2 is None:
+        return deadline1
+    return min(deadline1, deadline2)
+
 
 def is_valid_worker(worker):
     return inspect.isfunction(worker) or type(worker) == ShellObject
 
 
+def call_worker(worker, worker_arg, argument_type: ArgumentPassing):
+    """
+        Call a worker using a given argument-passing method. Exceptions are not caught here.
+    """
+    if argument_type == ArgumentPassing.AS_KWARGS:
+        return worker(**worker_arg)
+    elif argument_type == ArgumentPassing.AS_ARGS:
+        return worker(*worker_arg)
+    elif argument_type in [ArgumentPassing.AS_SINGLE_ARG, ArgumentPassing.AS_BATCH]:
+        return worker(worker_arg)
+    else:
+        raise Exception(f'Invalid argument passing type: {argument_type}')
+
+
 class WorkerWrapper:
-    def __init__(self, worker, timeout):
+    def __init__(self, worker, timeout, shm_codec=None, worker_id=0, collect_timings=False, status_board=None,
+                 max_tasks=None, max_rss=None, serializer: Serializer = None, threads_per_worker=1):
         self.worker = worker
         self.timeout = timeout
+        self.worker_id = worker_id
+        # A worker exits (and it is replaced by a new one) after processing max_tasks items
+        # or when its RSS exceeds max_rss bytes
+        self.max_tasks = max_tasks
+        self.max_rss = max_rss
+        # An optional status board to publish the current task, which is used to enforce task timeouts
+        # and to re-submit tasks of crashed workers
+        self.status_board = status_board
+        # Whether to send per-item timestamps along with results (see metrics.py)
+        self.collect_timings = collect_timings
+        # An optional shared-memory codec (see shm_transport.py)
+        self.shm_codec = shm_codec
+        # An optional serializer of batches (see serialization.py)
+        self.serializer = serializer
+        # The number of threads that process items in parallel (see ThreadedBatch)
+        self.threads_per_worker = threads_per_worker
+        # Event loops to run asynchronous (async def) workers (one per thread): They are created on the first use
+        self.event_loops = {}
+
+    def call(self, worker_arg, argument_type: ArgumentPassing):
+        """
+            Call the worker. If the worker is asynchronous, the coroutine runs until completion
+            in the worker's own event loop.
+        """
+        ret_val = call_worker(self.worker, worker_arg, argument_type)
+        if inspect.isawaitable(ret_val):
+            thread_id = threading.get_ident()
+            event_loop = self.event_loops.get(thread_id)
+            if event_loop is None:
+                event_loop = self.event_loops[thread_id] = asyncio.new_event_loop()
+            ret_val = event_loop.run_until_complete(ret_val)
+        return ret_val
+
+    def call_batch(self, worker_arg_batch):
+        """
+            Call a vectorized worker (see ArgumentPassing.AS_BATCH) on a list of items. Exceptions are returned
+            as results: A worker can return an exception for a specific item, but if the worker raises
+            an exception, it is returned for every item of the batch.
+        """
+        try:
+            ret_val_batch = list(self.call(list(worker_arg_batch), ArgumentPassing.AS_BATCH))
+            if len(ret_val_batch) != len(worker_arg_batch):
+                raise ValueError(f'The batch worker returned {len(ret_val_batch)} results'
+                                 f' for {len(worker_arg_batch)} items')
+        except Exception as e:
+            ret_val_batch = [e] * len(worker_arg_batch)
+        return ret_val_batch
+
+    def _call_batch_supervised(self, worker_arg_batch, failed_items):
+        """
+            Call a vectorized worker publishing the batch as a single task (with the item index zero)
+            on the status board: If the task times out or crashes the worker, the whole batch fails.
+        """
+        if failed_items:
+            failure = next(iter(failed_items.values()))
+            return [failed_items.get(item_idx, failure) for item_idx in range(len(worker_arg_batch))]
+        self.status_board.set_busy(self.worker_id, 0)
+        try:
+            return self.call_batch(worker_arg_batch)
+        finally:
+            self.status_board.set_idle(self.worker_id)
+
+    def _process_batch(self, worker_arg_batch, argument_type: ArgumentPassing, failed_items):
+        """
+            :return: a tuple: a list of results and a list of per-item (start, end) timestamps (or None)
+        """
+        ret_val_batch = []
+        item_times = [] if self.collect_timings else None
+        if argument_type == ArgumentPassing.AS_BATCH:
+            batch_start_time = time.time()
+            if self.status_board is not None:
+                ret_val_batch = self._call_batch_supervised(worker_arg_batch, failed_items)
+            else:
+                ret_val_batch = self.call_batch(worker_arg_batch)
+            if item_times is not None:
+                # Items are processed together: Each of them is attributed an equal share of the processing time
+                item_time = (time.time() - batch_start_time) / max(len(worker_arg_batch), 1)
+                item_times = [(batch_start_time + k * item_time, batch_start_time + (k + 1) * item_time)
+                              for k in range(len(worker_arg_batch))]
+            return ret_val_batch, item_times
+
+        for item_idx, worker_arg in enumerate(worker_arg_batch):
+            if item_times is not None:
+                item_start_time = time.time()
+            # If a worker is an object with a delayed initialization (inside a shell object),
+            # then it will be created the first time it is used here.
+            if self.status_board is not None:
+                ret_val = self._call_supervised(worker_arg, argument_type, item_idx, failed_items)
+            else:
+                try:
+                    ret_val = self.call(worker_arg, argument_type)
+                except Exception as e:
+                    ret_val = e
+            ret_val_batch.append(ret_val)
+            if item_times is not None:
+                item_times.append((item_start_time, time.time()))
+        return ret_val_batch, item_times
+
+    def init(self):
+        """
+            Create an actual worker object (if the worker is an object with a delayed initialization).
+
+            :return: a tuple: initialization time and an exception (or None)
+        """
+        start_time = time.perf_counter()
+        try:
+            if type(self.worker) == ShellObject:
+                self.worker.init()
+        except Exception as e:
+            return time.perf_counter() - start_time, e
 
-    def __call__(self, in_queue, out_queue, control_queue, argument_type: ArgumentPassing):
+        return time.perf_counter() - start_time, None
 
+    def _call_supervised(self, worker_arg, argument_type: ArgumentPassing, item_idx, failed_items):
+        """
+            Call the worker publishing the current task on the status board. Exceptions are returned as results.
+        """
+        if failed_items is not None and item_idx in failed_items:
+            # A worker that was processing this item was terminated after the timeout or it crashed too many times
+            return failed_items[item_idx]
+        self.status_board.set_busy(self.worker_id, item_idx)
+        try:
+            return self.call(worker_arg, argument_type)
+        except Exception as e:
+            return e
+        finally:
+            self.status_board.set_idle(self.worker_id)
+
+    def _should_exit(self, processed_qty):
+        if self.max_tasks is not None and processed_qty >= self.max_tasks:
+            return True
+        if self.max_rss is not None:
+            rss = get_rss()
+            return rss is not None and rss > self.max_rss
+        return False
+
+    @staticmethod
+    def _get_packed_arg(in_queue, steal_queues):
+        if not steal_queues:
+            return in_queue.get()
+
+        poll_timeout = WORK_STEALING_POLL_TIMEOUT
         while True:
-            packed_arg = in_queue.get()
-            if packed_arg is None:
-                break
             try:
-                control_queue.get_nowait()
-                break
+                return in_queue.get(timeout=poll_timeout)
             except queue.Empty:
                 pass
-
-            obj_id, worker_arg = packed_arg
-
-            # If a worker is an object with a delayed initialization (inside a shell object),
-            # then it will be created the first time it is used here.
+            # Our queue is empty: Let us try to steal a batch from a random worker. Checking all queues would
+            # make the cost of idle polling quadratic in the number of workers.
+            # A stolen end-of-work signal stops this worker too: Returning it to the owner is not reliable,
+            # because the put could be lost when this worker exits. There is one signal per worker and
+            # all queues are reachable via stealing: The owner will get the signal left in our queue.
             try:
-                if argument_type == ArgumentPassing.AS_KWARGS:
-                    ret_val = self.worker(**worker_arg)
-                elif argument_type == ArgumentPassing.AS_ARGS:
-                    ret_val = self.worker(*worker_arg)
-                elif argument_type == ArgumentPassing.AS_SINGLE_ARG:
-                    ret_val = self.worker(worker_arg)
-                else:
-                    raise Exception(f'Invalid argument passing type: {argument_type}')
-            except Exception as e:
-                ret_val = e
+                return random.choice(steal_queues).get_nowait()
+            except queue.Empty:
+                pass
+            poll_timeout = min(2 * poll_timeout, WORK_STEALING_MAX_POLL_TIMEOUT)
 
-            out_queue.put((obj_id, ret_val))
+    def __call__(self, in_queue, out_queue, control_queue, argument_type: ArgumentPassing, steal_queues=None,
+                 ready_queue=None):
+        """
+            The worker main loop.
+
+            :param in_queue: the input queue (it can be shared by all workers)
+            :param out_queue: the output queue shared by all workers
+            :param control_queue: the queue to receive termination signals
+            :param argument_type: Specifies how arguments are passed to workers
+            :param steal_queues: an optional list of input queues of other workers to steal work from
+            :param ready_queue: an optional queue to report the outcome of the eager initialization
+        """
+        if ready_queue is not None:
+            init_time, init_error = self.init()
+            ready_queue.put((self.worker_id, init_time, init_error))
+        elif self.status_board is not None:
+            # The initialization time does not count towards task timeouts. If the initialization fails,
+            # it will be retried (and the exception will be returned) when items are processed.
+            self.init()
+
+        if self.threads_per_worker > 1:
+            self._run_threads(in_queue, out_queue, control_queue, argument_type, steal_queues)
+        else:
+            self._run(in_queue, out_queue, control_queue, argument_type, steal_queues)
 
         #
         # This resource clean-up is key. Quite interesting, we pass test_queue_cleanup_after_exception_worker
@@ -60,6 +285,151 @@ class WorkerWrapper:
         in_queue.cancel_join_thread()
         out_queue.cancel_join_thread()
         control_queue.cancel_join_thread()
+        if ready_queue is not None:
+            ready_queue.cancel_join_thread()
+        for victim_queue in steal_queues or []:
+            victim_queue.cancel_join_thread()
+        for event_loop in self.event_loops.values():
+            event_loop.close()
+
+    def _decode_batch(self, worker_arg_batch):
+        """
+            :return: a tuple: decoded input items and a list of shared-memory segments that hold them
+        """
+        if self.serializer is not None:
+            worker_arg_batch = self.serializer.decode(worker_arg_batch)
+        if self.shm_codec is None:
+            return worker_arg_batch, []
+        # Segments with arguments are owned (and will be unlinked) by the main process
+        return self.shm_codec.decode(worker_arg_batch, unlink=False)
+
+    def _send_results(self, out_queue, batch_id, ret_val_batch, elapsed_time, worker_timings, arg_segments):
+        if self.shm_codec is not None:
+            ret_val_batch, ret_segments = self.shm_codec.encode(ret_val_batch)
+            # Segments with results are unlinked by the main process: We only need to close our handles.
+            for segm in arg_segments + ret_segments:
+                segm.close()
+        if self.serializer is not None:
+            ret_val_batch = self.serializer.encode(ret_val_batch, check_shm_refs=self.shm_codec is not None)
+
+        # The processing time is used by the adaptive batching
+        out_queue.put((batch_id, ret_val_batch, elapsed_time, worker_timings))
+
+    def _run(self, in_queue, out_queue, control_queue, argument_type: ArgumentPassing, steal_queues):
+        processed_qty = 0
+        while True:
+            packed_arg = self._get_packed_arg(in_queue, steal_queues)
+            if packed_arg is None:
+                break
+            if self.status_board is not None:
+                # The batch is re-submitted if this worker crashes before the results are sent
+                self.status_board.set_batch(self.worker_id, packed_arg[0])
+            dequeue_time = time.time() if self.collect_timings else None
+            try:
+                control_queue.get_nowait()
+                break
+            except queue.Empty:
+                pass
+
+            # Input items arrive in batches of consecutive items. The batch is identified by the ID of the call
+            # (i.e., an input iterable) and the ID of its first item. A batch that is re-submitted after
+            # a task timeout or a worker crash also has a dictionary that maps indices of failed items to exceptions.
+            batch_id, worker_arg_batch = packed_arg[0], packed_arg[1]
+            failed_items = packed_arg[2] if len(packed_arg) > 2 else None
+            worker_arg_batch, arg_segments = self._decode_batch(worker_arg_batch)
+
+            start_time = time.perf_counter()
+            ret_val_batch, item_times = self._process_batch(worker_arg_batch, argument_type, failed_items)
+            elapsed_time = time.perf_counter() - start_time
+            worker_timings = (self.worker_id, dequeue_time, item_times) if item_times is not None else None
+
+            self._send_results(out_queue, batch_id, ret_val_batch, elapsed_time, worker_timings, arg_segments)
+            if self.status_board is not None:
+                self.status_board.clear_batch(self.worker_id)
+
+            processed_qty += len(worker_arg_batch)
+            if self._should_exit(processed_qty):
+                # The worker is recycled: The supervisor starts a new one
+                break
+
+    def _run_threads(self, in_queue, out_queue, control_queue, argument_type: ArgumentPassing, steal_queues):
+        """
+            The main loop of a worker process with several threads: The main thread reads batches and puts their
+            items into the (process-local) queue of a thread pool. Items are processed in parallel, but the results
+            of a batch are sent in a single message (by the thread that finishes the last item of the batch).
+        """
+        # The worker object (if it has a delayed initialization) is created once and shared by all threads
+        self.init()
+        # The process holds at most threads_per_worker batches: Other batches remain available to other processes
+        batch_slots = threading.Semaphore(self.threads_per_worker)
+        with concurrent.futures.ThreadPoolExecutor(self.threads_per_worker) as executor:
+            while True:
+                batch_slots.acquire()
+                packed_arg = self._get_packed_arg(in_queue, steal_queues)
+                if packed_arg is None:
+                    break
+                dequeue_time = time.time() if self.collect_timings else None
+                try:
+                    control_queue.get_nowait()
+                    break
+                except queue.Empty:
+                    pass
+
+                worker_arg_batch, arg_segments = self._decode_batch(packed_arg[1])
+                # A vectorized worker processes the whole batch in a single call
+                sub_batches = [worker_arg_batch] if argument_type == ArgumentPassing.AS_BATCH \
+                    else [[worker_arg] for worker_arg in worker_arg_batch]
+                batch = ThreadedBatch(packed_arg[0], len(sub_batches), arg_segments, dequeue_time)
+                for sub_batch_idx, sub_batch in enumerate(sub_batches):
+                    executor.submit(self._process_sub_batch, batch, sub_batch_idx, sub_batch, argument_type,
+                                    out_queue, batch_slots)
+        # Exiting the with-block waits till all submitted items are processed (and their results are sent)
+
+    def _process_sub_batch(self, batch, sub_batch_idx, sub_batch, argument_type: ArgumentPassing, out_queue,
+                           batch_slots):
+        ret_val_batch, item_times = self._process_batch(sub_batch, argument_type, None)
+        if not batch.set_results(sub_batch_idx, ret_val_batch, item_times):
+            return
+        ret_val_batch, item_times = batch.results()
+        worker_timings = (self.worker_id, batch.dequeue_time, item_times) if item_times is not None else None
+        self._send_results(out_queue, batch.batch_id, ret_val_batch, time.perf_counter() - batch.start_time,
+                           worker_timings, batch.arg_segments)
+        batch_slots.release()
+
+
+class ThreadedBatch:
+    """
+        A batch whose items are processed in parallel by threads of a worker process (see threads_per_worker).
+        Items are split into sub-batches: one item per sub-batch (or the whole batch for a vectorized worker).
+    """
+    def __init__(self, batch_id, sub_batch_qty, arg_segments, dequeue_time):
+        self.batch_id = batch_id
+        self.arg_segments = arg_segments
+        self.dequeue_time = dequeue_time
+        self.start_time = time.perf_counter()
+        self.lock = threading.Lock()
+        self.remaining_qty = sub_batch_qty
+        self.sub_batch_results = [None] * sub_batch_qty
+        self.sub_batch_item_times = [None] * sub_batch_qty
+
+    def set_results(self, sub_batch_idx, ret_val_batch, item_times):
+        """
+            :return: True if all sub-batches are processed
+        """
+        with self.lock:
+            self.sub_batch_results[sub_batch_idx] = ret_val_batch
+            self.sub_batch_item_times[sub_batch_idx] = item_times
+            self.remaining_qty -= 1
+            return self.remaining_qty == 0
+
+    def results(self):
+        """
+            :return: a tuple: a list of results and a list of per-item (start, end) timestamps (or None)
+        """
+        ret_val_batch = [ret_val for sub_batch_results in self.sub_batch_results for ret_val in sub_batch_results]
+        if self.sub_batch_item_times[0] is None:
+            return ret_val_batch, None
+        return ret_val_batch, [item_time for item_times in self.sub_batch_item_times for item_time in item_times]
 
 
 
@@ -68,37 +438,159 @@ class SortedOutputHelper:
         The processed results may come in (somewhat) unordered, but we need to output them using the original order.
         This class maintains a priority queue to achieve this. An important assumption: all objects will be
         enumerated from 0 to <number of objects - 1> without gaps and repetitions.
+
+        Results can be added either one by one or as batches of results for consecutive objects.
+        A batch is identified by the ID of its first object.
+
+        In the "soft-ordered" mode (max_lag is not None), a batch that waits for preceding results longer
+        than max_lag seconds is released out of order. Preceding results are released as soon as they arrive.
+
+        If a spill store is given, batches that do not fit into the memory threshold (spill_threshold bytes)
+        are kept in the spill store rather than in memory.
     """
-    def __init__(self):
+    def __init__(self, track_bytes=False, max_lag=None, spill_store: SpillStore = None, spill_threshold=None):
         self.last_obj_out = -1
         self.out_queue = []
+        self.track_bytes = track_bytes or spill_store is not None
+        self.max_lag = max_lag
+        self.spill_store = spill_store
+        self.spill_threshold = spill_threshold
+        # The (estimated) size of spilled results, which are included into buffered_bytes
+        self.spilled_bytes = 0
+        self.spilled_total_qty = 0
+        # The number of buffered results and their (estimated) size in bytes
+        self.buffered_qty = 0
+        self.buffered_bytes = 0
+        # Batches released out of order: The key is the ID of the first object, the value is the batch size
+        self.released_ahead = {}
+        self.out_of_order_qty = 0
+        # The ID of the last returned object
+        self.last_yielded_obj_id = None
 
     def add_obj(self, obj_id, obj_ref):
-        heappush(self.out_queue, (obj_id, obj_ref))
+        self.add_batch(obj_id, [obj_ref])
+
+    def add_batch(self, start_obj_id, obj_ref_batch):
+        if obj_ref_batch:
+            batch_bytes = estimate_size(obj_ref_batch) if self.track_bytes else 0
+            arrival_time = time.perf_counter() if self.max_lag is not None else None
+            self.buffered_qty += len(obj_ref_batch)
+            self.buffered_bytes += batch_bytes
+            # The head-of-line batch is returned right away: It is never spilled
+            if self.spill_store is not None and start_obj_id != self.last_obj_out + 1 and \
+                    self.buffered_bytes - self.spilled_bytes > self.spill_threshold:
+                spill_ref = self.spill_store.put(obj_ref_batch)
+                if spill_ref is not None:
+                    obj_ref_batch = spill_ref
+                    self.spilled_bytes += batch_bytes
+                    self.spilled_total_qty += spill_ref.qty
+            heappush(self.out_queue, (start_obj_id, batch_bytes, arrival_time, obj_ref_batch))
+
+    def release_deadline(self):
+        """
+            :return: the time (perf_counter) when the first buffered batch is released out of order (or None)
+        """
+        if self.max_lag is None or not self.out_queue:
+            return None
+        return self.out_queue[0][2] + self.max_lag
+
+    def _pop_batch(self):
+        start_obj_id, batch_bytes, _, result_batch = heappop(self.out_queue)
+        if type(result_batch) is SpillRef:
+            result_batch = self.spill_store.get(result_batch)
+            self.spilled_bytes -= batch_bytes
+        self.buffered_qty -= len(result_batch)
+        self.buffered_bytes -= batch_bytes
+        return start_obj_id, result_batch
 
     def yield_results(self):
-        while self.out_queue and self.out_queue[0][0] == self.last_obj_out + 1:
-            self.last_obj_out, result = heappop(self.out_queue)
-            yield result
+        while True:
+            if self.out_queue and self.out_queue[0][0] == self.last_obj_out + 1:
+                start_obj_id, result_batch = self._pop_batch()
+                self.last_obj_out += len(result_batch)
+                # Skip batches that were released out of order
+                while self.last_obj_out + 1 in self.released_ahead:
+                    self.last_obj_out += self.released_ahead.pop(self.last_obj_out + 1)
+            elif self.out_queue and self.out_queue[0][2] is not None and \
+                    time.perf_counter() >= self.out_queue[0][2] + self.max_lag:
+                start_obj_id, result_batch = self._pop_batch()
+                self.released_ahead[start_obj_id] = len(result_batch)
+                self.out_of_order_qty += len(result_batch)
+            else:
+                break
+            for k, result in enumerate(result_batch):
+                self.last_yielded_obj_id = start_obj_id + k
+                yield result
 
     def empty(self):
         return not self.out_queue
 
 
+class AdaptiveBatchSizer:
+    """
+        Picks the batch size so that processing a batch takes roughly ADAPTIVE_BATCH_TARGET_TIME seconds.
+        The per-item processing time is estimated using an exponential moving average of processing
+        times reported by workers.
+    """
+    def __init__(self, max_batch_size=ADAPTIVE_BATCH_MAX_SIZE):
+        self.max_batch_size = max(int(max_batch_size), 1)
+        self.per_item_time = None
+
+    def update(self, batch_qty, elapsed_time):
+        if batch_qty <= 0:
+            return
+        curr_per_item_time = elapsed_time / batch_qty
+        if self.per_item_time is None:
+            self.per_item_time = curr_per_item_time
+        else:
+            self.per_item_time += ADAPTIVE_BATCH_EMA_ALPHA * (curr_per_item_time - self.per_item_time)
+
+    def batch_size(self, max_batch_size=None):
+        if max_batch_size is None:
+            max_batch_size = self.max_batch_size
+        max_batch_size = max(min(max_batch_size, self.max_batch_size), 1)
+        # Until we have an estimate, we send items one by one
+        if self.per_item_time is None:
+            return 1
+        if self.per_item_time <= 0:
+            return max_batch_size
+
+        return max(min(int(ADAPTIVE_BATCH_TARGET_TIME / self.per_item_time), max_batch_size), 1)
+
+
 class WorkerPoolResultGenerator:
+    """
+        An iterable over results of the worker pool, which is also a context manager. It supports both
+        regular iteration and asynchronous iteration (async for). The latter accepts asynchronous
+        input iterables and does not block the event loop while waiting for results.
+    """
     def __init__(self, parent_obj, input_iterable,
                  bounded,
                  is_unordered,
-                 chunk_size, chunk_prefill_ratio):
+                 chunk_size, chunk_prefill_ratio,
+                 batch_size=1,
+                 priority=0, weight=1.0):
         self.parent_obj = parent_obj
-        self.input_iter = iter(input_iterable)
+        if is_async_iterable(input_iterable):
+            self.input_iter = None
+            self.input_aiter = input_iterable.__aiter__()
+        else:
+            self.input_iter = iter(input_iterable)
+            self.input_aiter = None
         self.is_unordered = is_unordered
         self.bounded = bounded
         self.chunk_size = chunk_size
         self.chunk_prefill_ratio = chunk_prefill_ratio
+        self.batch_size = batch_size
+        # Optional instrumentation (see metrics.py): None if disabled
+        self.metrics = parent_obj.pool_metrics
+        self.yielded_qty = 0
+        # An optional spill store for the reorder buffer (see spill.py)
+        self.spill_store = None
 
         assert self.chunk_size >= 1
         assert self.chunk_prefill_ratio >= 1
+        assert self.batch_size == AUTO_BATCH_SIZE or self.batch_size >= 1
 
         # If the length is None, then TQDM will not know the total length and will not display the progress bar:
         # See __len__ function https://github.com/tqdm/tqdm/blob/master/tqdm/std.py
@@ -111,8 +603,12 @@ class WorkerPoolResultGenerator:
         # generator that does not use any threads or processes.
         if self.parent_obj.single_worker is not None:
             self._iterator = self._generator_single_worker_no_threads()
+            self._aiterator = self._agenerator_single_worker_no_threads()
         else:
-            self._iterator = self._generator()  
+            # Each call gets its own ID space: Results of different calls are not mixed up
+            self.call_id = self.parent_obj._start_call(priority, weight)
+            self._iterator = self._generator()
+            self._aiterator = self._agenerator()
 
     def __len__(self):
         return self._length
@@ -120,117 +616,681 @@ class WorkerPoolResultGenerator:
     def __iter__(self):
         return self
 
+    def __aiter__(self):
+        return self
+
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.parent_obj.__exit__(exc_type, exc_val, exc_tb)
 
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.parent_obj.__aexit__(exc_type, exc_val, exc_tb)
+
     def __next__(self):
+        assert self.input_iter is not None, 'Use async for to iterate over results for an asynchronous iterable!'
         return next(self._iterator)
-    
+
+    async def __anext__(self):
+        return await self._aiterator.__anext__()
+
+    async def _anext_input(self):
+        if self.input_aiter is not None:
+            return await self.input_aiter.__anext__()
+        try:
+            return next(self.input_iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+    def _process_exception(self, result, exceptions_arr):
+        """
+            Process a result according to the exception behavior.
+
+            :return: True if the result is an exception that needs to be raised immediately.
+        """
+        if is_exception(result):
+            if self.parent_obj.exception_behavior == ExceptionBehaviour.IMMEDIATE:
+                return True
+            elif self.parent_obj.exception_behavior == ExceptionBehaviour.DEFERRED:
+                exceptions_arr.append(result)
+            else:
+                # If exception is ignored it will be returned to the end user
+                assert self.parent_obj.exception_behavior == ExceptionBehaviour.IGNORE
+
+        return False
+
+    def _record_task(self, task_metrics: TaskMetrics):
+        self.metrics.on_yield(task_metrics)
+        self.yielded_qty += 1
+        if self.parent_obj.metrics_callback is not None:
+            self.parent_obj.metrics_callback(task_metrics)
+
+    def _record_single_worker_task(self, start_time, end_time=None):
+        # Items are processed in the main thread: They are submitted and dequeued right before processing
+        if end_time is None:
+            end_time = time.time()
+        self.metrics.on_submit(1)
+        self.metrics.on_receive(1, 0, end_time - start_time)
+        self._record_task(TaskMetrics(call_id=None, obj_id=self.yielded_qty, worker_id=0,
+                                      submit_time=start_time, dequeue_time=start_time,
+                                      start_time=start_time, end_time=end_time,
+                                      receive_time=end_time, yield_time=time.time()))
+
+    def _record_single_worker_batch(self, start_time, batch_qty):
+        # Items of a batch are processed together: Each of them is attributed an equal share of the processing time
+        item_time = (time.time() - start_time) / batch_qty
+        for k in range(batch_qty):
+            self._record_single_worker_task(start_time + k * item_time, start_time + (k + 1) * item_time)
+
+    def _is_batch_wait_over(self, batch_start_time):
+        max_wait = self.parent_obj.batch_max_wait
+        return max_wait is not None and time.perf_counter() - batch_start_time >= max_wait
+
+    def _generator_single_worker_vectorized(self):
+        exceptions_arr = []
+        batch_sizer = AdaptiveBatchSizer() if self.batch_size == AUTO_BATCH_SIZE else None
+
+        while True:
+            batch_size = batch_sizer.batch_size() if batch_sizer is not None else self.batch_size
+            worker_arg_batch = []
+            batch_start_time = time.perf_counter()
+            for worker_arg in self.input_iter:
+                worker_arg_batch.append(worker_arg)
+                if len(worker_arg_batch) >= batch_size or self._is_batch_wait_over(batch_start_time):
+                    break
+            if not worker_arg_batch:
+                break
+
+            start_time = time.time()
+            result_batch = self.parent_obj.single_worker.call_batch(worker_arg_batch)
+            if batch_sizer is not None:
+                batch_sizer.update(len(result_batch), time.time() - start_time)
+            if self.metrics is not None:
+                self._record_single_worker_batch(start_time, len(result_batch))
+            for result in result_batch:
+                if self._process_exception(result, exceptions_arr):
+                    raise result
+                yield result
+
+        if exceptions_arr:
+            raise Exception(*exceptions_arr)
+
+    async def _agenerator_single_worker_vectorized(self):
+        exceptions_arr = []
+        batch_sizer = AdaptiveBatchSizer() if self.batch_size == AUTO_BATCH_SIZE else None
+        loop = asyncio.get_running_loop()
+        finished_input = False
+
+        while not finished_input:
+            batch_size = batch_sizer.batch_size() if batch_sizer is not None else self.batch_size
+            worker_arg_batch = []
+            batch_start_time = time.perf_counter()
+            while len(worker_arg_batch) < batch_size and \
+                    not (worker_arg_batch and self._is_batch_wait_over(batch_start_time)):
+                try:
+                    worker_arg_batch.append(await self._anext_input())
+                except StopAsyncIteration:
+                    finished_input = True
+                    break
+            if not worker_arg_batch:
+                break
+
+            start_time = time.time()
+            # The worker is executed in a separate thread to not block the event loop
+            result_batch = await loop.run_in_executor(None, self.parent_obj.single_worker.call_batch,
+                                                      worker_arg_batch)
+            if batch_sizer is not None:
+                batch_sizer.update(len(result_batch), time.time() - start_time)
+            if self.metrics is not None:
+                self._record_single_worker_batch(start_time, len(result_batch))
+            for result in result_batch:
+                if self._process_exception(result, exceptions_arr):
+                    raise result
+                yield result
+
+        if exceptions_arr:
+            raise Exception(*exceptions_arr)
+
     def _generator_single_worker_no_threads(self):
+        if self.parent_obj.argument_type == ArgumentPassing.AS_BATCH:
+            yield from self._generator_single_worker_vectorized()
+            return
+
         exceptions_arr = []
         argument_type = self.parent_obj.argument_type
 
         for worker_arg in self.input_iter:
+            if self.metrics is not None:
+                start_time = time.time()
             try:
-                if argument_type == ArgumentPassing.AS_KWARGS:
-                    result = self.parent_obj.single_worker.worker(**worker_arg)
-                elif argument_type == ArgumentPassing.AS_ARGS:
-                    result = self.parent_obj.single_worker.worker(*worker_arg)
-                elif argument_type == ArgumentPassing.AS_SINGLE_ARG:
-                    result = self.parent_obj.single_worker.worker(worker_arg)
-                else:
-                    raise Exception(f'Invalid argument passing type: {argument_type}')
+                result = self.parent_obj.single_worker.call(worker_arg, argument_type)
             except Exception as e:
                 result = e
-            if is_exception(result):
-                if self.parent_obj.exception_behavior == ExceptionBehaviour.IMMEDIATE:
-                    raise result
-                elif self.parent_obj.exception_behavior == ExceptionBehaviour.DEFERRED:
-                    exceptions_arr.append(result)
-                else:
-                    # If exception is ignored it will be returned to the end user
-                    assert self.parent_obj.exception_behavior == ExceptionBehaviour.IGNORE
-            
+            if self._process_exception(result, exceptions_arr):
+                raise result
+
+            if self.metrics is not None:
+                self._record_single_worker_task(start_time)
             yield result
 
         if exceptions_arr:
             raise Exception(*exceptions_arr)
 
-    def _generator(self):
-        submitted_qty = 0
-        received_qty = 0
+    async def _agenerator_single_worker_no_threads(self):
+        if self.parent_obj.argument_type == ArgumentPassing.AS_BATCH:
+            async for result in self._agenerator_single_worker_vectorized():
+                yield result
+            return
 
-        assert type(self.chunk_size) == int
+        exceptions_arr = []
+        argument_type = self.parent_obj.argument_type
+        loop = asyncio.get_running_loop()
+
+        while True:
+            try:
+                worker_arg = await self._anext_input()
+            except StopAsyncIteration:
+                break
+            if self.metrics is not None:
+                start_time = time.time()
+            try:
+                # A regular worker is executed in a separate thread to not block the event loop,
+                # but coroutines of asynchronous workers are awaited in the event loop.
+                result = await loop.run_in_executor(None, call_worker,
+                                                    self.parent_obj.single_worker.worker, worker_arg, argument_type)
+                if inspect.isawaitable(result):
+                    result = await result
+            except Exception as e:
+                result = e
+            if self._process_exception(result, exceptions_arr):
+                raise result
+
+            if self.metrics is not None:
+                self._record_single_worker_task(start_time)
+            yield result
+
+        if exceptions_arr:
+            raise Exception(*exceptions_arr)
+
+    def _submit_batch(self, start_obj_id, worker_arg_batch, cost=None):
+        if worker_arg_batch:
+            batch_id = (self.call_id, start_obj_id)
+            shm_transport = self.parent_obj.shm_transport
+            if shm_transport is not None:
+                worker_arg_batch = shm_transport.encode_batch(batch_id, worker_arg_batch)
+            if self.parent_obj.serializer is not None:
+                # An encoded batch has the same length as the original one
+                worker_arg_batch = self.parent_obj.serializer.encode(worker_arg_batch,
+                                                                     check_shm_refs=shm_transport is not None)
+            if self.metrics is not None:
+                self.batch_submit_times[start_obj_id] = time.time()
+                self.metrics_submitted_qty += len(worker_arg_batch)
+                self.metrics.on_submit(len(worker_arg_batch))
+            if self.speculation_batches is not None:
+                self.speculation_batches[start_obj_id] = (time.perf_counter(), worker_arg_batch, False)
+            self.parent_obj._dispatch_batch(batch_id, worker_arg_batch, cost)
+
+    def _speculate(self):
+        """
+            Send duplicates of straggler batches to idle workers: A batch is a straggler if it is in flight
+            speculation_multiplier times longer than the median processing time of a batch of the same size.
+
+            :return: the time when the next batch becomes a straggler or None
+        """
+        if self.speculation_batches is None or len(self.item_time_window) < SPECULATION_MIN_SAMPLES:
+            return None
+        item_time = self.parent_obj.speculation_multiplier * statistics.median(self.item_time_window)
+        now = time.perf_counter()
+        next_check_time = None
+        idle_qty = None
+        for start_obj_id, (submit_time, worker_arg_batch, duplicated) in self.speculation_batches.items():
+            if duplicated:
+                continue
+            straggler_time = submit_time + max(item_time * len(worker_arg_batch), SPECULATION_MIN_DELAY)
+            if straggler_time > now:
+                if next_check_time is None or straggler_time < next_check_time:
+                    next_check_time = straggler_time
+                if submit_time + max(item_time, SPECULATION_MIN_DELAY) > now:
+                    # Batches are ordered by the submission time: Later batches are not stragglers either
+                    break
+                continue
+            if idle_qty is None:
+                idle_qty = self.parent_obj._idle_worker_qty()
+            if idle_qty <= 0:
+                # We check again when some results arrive
+                continue
+            idle_qty -= 1
+            self.speculation_batches[start_obj_id] = (submit_time, worker_arg_batch, True)
+            self.parent_obj._dispatch_duplicate((self.call_id, start_obj_id), worker_arg_batch)
+
+        return next_check_time
+
+    def _on_batch_received(self, start_obj_id, worker_timings):
+        worker_id, dequeue_time, item_times = worker_timings
+        receive_time = time.time()
+        submit_time = self.batch_submit_times.pop(start_obj_id)
+        self.metrics_received_qty += len(item_times)
+        self.metrics.on_receive(len(item_times), worker_id, sum([end - start for start, end in item_times]))
+
+        for k, (start_time, end_time) in enumerate(item_times):
+            task_metrics = TaskMetrics(call_id=self.call_id, obj_id=start_obj_id + k, worker_id=worker_id,
+                                       submit_time=submit_time, dequeue_time=dequeue_time,
+                                       start_time=start_time, end_time=end_time, receive_time=receive_time)
+            if self.is_unordered:
+                # Results of a batch are returned right after the batch is received
+                self.pending_task_metrics.append(task_metrics)
+            else:
+                self.pending_task_metrics[task_metrics.obj_id] = task_metrics
+
+    def _on_result_yield(self):
         if self.is_unordered:
+            task_metrics = self.pending_task_metrics.popleft()
+        else:
+            task_metrics = self.pending_task_metrics.pop(self.sorted_out_helper.last_yielded_obj_id)
+        self._record_task(task_metrics._replace(yield_time=time.time()))
+
+    def _on_finish_metrics(self):
+        # Results of an abandoned (or failed) generator are never returned to the user
+        self.metrics.on_discard(in_flight_qty=self.metrics_submitted_qty - self.metrics_received_qty,
+                                buffered_qty=self.metrics_received_qty - self.yielded_qty)
+        self.metrics.on_out_of_order(self.sorted_out_helper.out_of_order_qty)
+        self.metrics.on_spill(self.sorted_out_helper.spilled_total_qty)
+
+    def _init_generator_state(self):
+        assert type(self.chunk_size) == int
+        parent = self.parent_obj
+        # In the ordered mode, chunks are processed in a lock-step fashion: All results of a chunk are received
+        # before the next chunk is submitted. If the reorder buffer is limited (or results can be released
+        # out of order), we use a sliding window instead (as in the unordered mode), so that a single slow
+        # item does not stall submission until the reorder buffer is full.
+        sliding_window = parent.reorder_buffer_max_items is not None or \
+            parent.reorder_buffer_max_bytes is not None or parent.reorder_max_lag is not None
+        if self.is_unordered or sliding_window:
             assert type(self.chunk_prefill_ratio) == int and self.chunk_prefill_ratio >= 1
-            curr_batch_size = self.chunk_size * self.chunk_prefill_ratio
+            self.curr_chunk_size = self.chunk_size * self.chunk_prefill_ratio
         else:
-            curr_batch_size = self.chunk_size
+            self.curr_chunk_size = self.chunk_size
 
-        finished_input = False
+        if self.batch_size == AUTO_BATCH_SIZE:
+            self.batch_sizer = AdaptiveBatchSizer()
+        else:
+            assert type(self.batch_size) == int
+            self.batch_sizer = None
+        # Result messages received while input items are submitted (see _poll_result_messages): They are
+        # processed before other messages and their processing times are already used by the batch sizer
+        self.early_result_messages = deque()
+        self.early_unprocessed_qty = 0
+
+        self.submitted_qty = 0
+        self.received_qty = 0
+        # The number of items that were packed into batches: It lags behind the number of submitted items
+        # if items of a chunk are reordered before they are packed (see heavy_first)
+        self.batched_qty = 0
+        self.finished_input = False
+        # The total and the number of item costs (see cost_fn) as well as the cost of the current batch
+        self.cost_total = 0.0
+        self.cost_qty = 0
+        self.batch_cost = 0.0
+        # Items (with their costs) of the current chunk that are packed into batches at the end of the chunk
+        self.chunk_items = []
+        self.exceptions_arr = []
+        if parent.spill_threshold_bytes is not None and not self.is_unordered:
+            self.spill_store = SpillStore(parent.spill_dir)
+        self.sorted_out_helper = SortedOutputHelper(track_bytes=parent.reorder_buffer_max_bytes is not None,
+                                                    max_lag=parent.reorder_max_lag,
+                                                    spill_store=self.spill_store,
+                                                    spill_threshold=parent.spill_threshold_bytes)
+
+        if parent.speculative_execution:
+            # Batches in flight (in the submission order): start object ID -> (submit time, batch, duplicated)
+            self.speculation_batches = {}
+            self.item_time_window = deque(maxlen=SPECULATION_WINDOW_SIZE)
+        else:
+            self.speculation_batches = None
+
+        if self.metrics is not None:
+            self.batch_submit_times = {}
+            self.pending_task_metrics = deque() if self.is_unordered else {}
+            self.metrics_submitted_qty = 0
+            self.metrics_received_qty = 0
+
+    def _update_batch_size(self):
+        if self.batch_sizer is not None:
+            # In the bounded mode, we make sure that each worker gets at least one batch
+            if self.bounded:
+                self.curr_batch_size = self.batch_sizer.batch_size(self.curr_chunk_size // self.parent_obj.num_workers)
+            else:
+                self.curr_batch_size = self.batch_sizer.batch_size()
+        else:
+            self.curr_batch_size = self.batch_size
 
-        exceptions_arr = []
+    def _poll_result_messages(self):
+        """
+            Receive (without waiting) result messages that are already available: Their processing times let
+            the adaptive batch size grow while the current chunk is submitted (in the unbounded mode, the whole
+            input is a single chunk). Messages are processed later, in the order of arrival.
+        """
+        while True:
+            try:
+                message = self.parent_obj._get_result_message(self.call_id, 0)
+            except queue.Empty:
+                return
+            _, result_batch, elapsed_time, _ = message
+            self.batch_sizer.update(len(result_batch), elapsed_time)
+            self.early_result_messages.append(message)
+            self.early_unprocessed_qty += 1
+
+    def _start_chunk(self):
+        self._update_batch_size()
+
+        # Consecutive input items are packed into batches, which are sent to workers as single messages.
+        # A batch is identified by the ID of its first item.
+        self.batch_start_obj_id = self.batched_qty
+        self.worker_arg_batch = []
+        self.curr_submit_qty = 0
+
+    def _mean_cost(self):
+        return self.cost_total / self.cost_qty
+
+    def _add_input_item(self, worker_arg):
+        """
+            Add an input item to the current batch and submit the batch when it is full.
+
+            :return: True if the current chunk is complete
+        """
+        assert self._length is None or self.submitted_qty < self._length
+        self.submitted_qty += 1
+        self.curr_submit_qty += 1
+
+        cost_fn = self.parent_obj.cost_fn
+        if cost_fn is None:
+            self._add_to_batch(worker_arg, None)
+        else:
+            cost = float(cost_fn(worker_arg))
+            self.cost_total += cost
+            self.cost_qty += 1
+            if self.parent_obj.heavy_first and self.is_unordered:
+                self.chunk_items.append((cost, worker_arg))
+            else:
+                self._add_to_batch(worker_arg, cost)
+
+        # Chunks are limited by the number of items (even if items have costs), which bounds memory usage
+        return self.bounded and self.curr_submit_qty >= self.curr_chunk_size
+
+    def _add_to_batch(self, worker_arg, cost):
+        if cost is not None and self.worker_arg_batch and \
+                self.batch_cost + cost > self.curr_batch_size * self._mean_cost():
+            # The batch has the same cost as curr_batch_size items of the average cost: An expensive item
+            # goes to the next batch
+            self._flush_batch()
+
+        if not self.worker_arg_batch:
+            self.batch_start_time = time.perf_counter()
+        self.worker_arg_batch.append(worker_arg)
+        self.batched_qty += 1
+        if cost is not None:
+            self.batch_cost += cost
+        if len(self.worker_arg_batch) >= self.curr_batch_size or self._is_batch_wait_over(self.batch_start_time):
+            self._flush_batch()
+
+    def _flush_batch(self):
+        self._submit_batch(self.batch_start_obj_id, self.worker_arg_batch,
+                           self.batch_cost if self.parent_obj.cost_fn is not None else None)
+        self.batch_start_obj_id = self.batched_qty
+        self.worker_arg_batch = []
+        self.batch_cost = 0.0
+        if self.batch_sizer is not None:
+            self._poll_result_messages()
+            self._update_batch_size()
+
+    def _end_chunk(self):
+        """
+            Submit a partially filled batch (it is always submitted at the end of a chunk).
+
+            :return: the number of results to receive before the next chunk starts
+        """
+        if self.chunk_items:
+            # Expensive items are submitted first, so that they do not become stragglers at the end
+            self.chunk_items.sort(key=lambda e: -e[0])
+            for cost, worker_arg in self.chunk_items:
+                self._add_to_batch(worker_arg, cost)
+            self.chunk_items = []
+        self._flush_batch()
+
+        self.curr_chunk_size = self.chunk_size
+
+        return min(self.chunk_size, self.submitted_qty - self.received_qty)
+
+    def _process_result_message(self, message):
+        """
+            Process a batch of results received from a worker.
 
-        sorted_out_helper = SortedOutputHelper()
+            :param message: a result message or None if waiting for the message timed out
+            :return: a tuple: an iterable over results ready to be returned and an exception
+                     that needs to be raised immediately (or None)
+        """
+        if message is None:
+            # Buffered results can be released out of order (in the soft-ordered mode)
+            return self.sorted_out_helper.yield_results(), None
+        batch_id, result_batch, elapsed_time, worker_timings = message
+        call_id, start_obj_id = batch_id
+        assert call_id == self.call_id, f'Logic error, unexpected call ID {call_id} instead of {self.call_id}'
+        self.parent_obj._on_batch_done(batch_id, len(result_batch))
+        if self.metrics is not None:
+            self._on_batch_received(start_obj_id, worker_timings)
+        if self.parent_obj.shm_transport is not None:
+            self.parent_obj.shm_transport.release_batch(batch_id)
+            result_batch = self.parent_obj.shm_transport.decode_results(result_batch)
+        if self.early_unprocessed_qty > 0:
+            self.early_unprocessed_qty -= 1
+        elif self.batch_sizer is not None:
+            self.batch_sizer.update(len(result_batch), elapsed_time)
+        if self.speculation_batches is not None:
+            self.speculation_batches.pop(start_obj_id, None)
+            self.item_time_window.append(elapsed_time / len(result_batch))
+
+        for result in result_batch:
+            if self._process_exception(result, self.exceptions_arr):
+                return [], result
+
+        assert self.received_qty + len(result_batch) <= self.submitted_qty
+        assert self._length is None or self.received_qty + len(result_batch) <= self._length
+        # We update this counter after receiving elements from the queue rather than after
+        # returning/yielding them. If the priority queue is not empty after all elements are processed
+        # and received, we will still empty it afer exiting the outer loop.
+        self.received_qty += len(result_batch)
 
-        while not finished_input or received_qty < submitted_qty:
+        if self.is_unordered:
+            return result_batch, None
+        else:
+            self.sorted_out_helper.add_batch(start_obj_id, result_batch)
+            return self.sorted_out_helper.yield_results(), None
+
+    def _is_reorder_buffer_full(self):
+        """
+            Check if the reorder buffer exceeds its limit: In this case, no new input is submitted until
+            the head-of-line results arrive.
+        """
+        if self.is_unordered or self.received_qty >= self.submitted_qty:
+            return False
+        max_items = self.parent_obj.reorder_buffer_max_items
+        max_bytes = self.parent_obj.reorder_buffer_max_bytes
+        return (max_items is not None and self.sorted_out_helper.buffered_qty >= max_items) or \
+            (max_bytes is not None and self.sorted_out_helper.buffered_bytes >= max_bytes)
+
+    def _on_reorder_stall(self, stall_start_time):
+        if stall_start_time is not None and self.metrics is not None:
+            self.metrics.on_reorder_stall(time.perf_counter() - stall_start_time)
+
+    def _get_result_message(self, target_received_qty):
+        """
+            Wait for the next result message.
+
+            :param target_received_qty: waiting for results beyond this number means that submission is stalled
+            :return: a result message or None if buffered results need to be released out of order
+        """
+        if self.early_result_messages:
+            return self.early_result_messages.popleft()
+        stall_start_time = time.perf_counter() if self.received_qty >= target_received_qty else None
+        deadline = self.sorted_out_helper.release_deadline()
+        try:
+            while True:
+                wait_deadline = min_deadline(deadline, self._speculate())
+                if wait_deadline is None:
+                    return self.parent_obj._get_result_message(self.call_id)
+                try:
+                    return self.parent_obj._get_result_message(self.call_id,
+                                                               max(wait_deadline - time.perf_counter(), 0))
+                except queue.Empty:
+                    if deadline is not None and time.perf_counter() >= deadline:
+                        return None
+        finally:
+            self._on_reorder_stall(stall_start_time)
+
+    def _has_pending_work(self):
+        return not self.finished_input or self.received_qty < self.submitted_qty
+
+    def _check_finished(self):
+        assert self.sorted_out_helper.empty(), \
+            f'Logic error, the output queue should be empty at this point, ' + \
+            f'but it has {len(self.sorted_out_helper.out_queue)} batches'
+
+    def _generator(self):
+        try:
+            for result in self._generator_impl():
+                if self.metrics is not None:
+                    self._on_result_yield()
+                yield result
+        finally:
+            # Results that arrive after the generator is closed (or abandoned) will be discarded
+            self.parent_obj._finish_call(self.call_id)
+            if self.metrics is not None:
+                self._on_finish_metrics()
+            if self.spill_store is not None:
+                self.spill_store.close()
+
+    def _generator_impl(self):
+        self._init_generator_state()
+
+        while self._has_pending_work():
+            self._start_chunk()
             try:
-                curr_submit_qty = 0
-                while True:
-                    self.parent_obj.in_queue.put((submitted_qty, next(self.input_iter)))
-                    assert self._length is None or submitted_qty < self._length
-                    submitted_qty += 1
-                    curr_submit_qty += 1
-                    if self.bounded and curr_submit_qty >= curr_batch_size:
-                        break
+                while not self._add_input_item(next(self.input_iter)):
+                    pass
             except StopIteration:
-                finished_input = True
+                self.finished_input = True
 
-            curr_batch_size = self.chunk_size
-            left_qty = submitted_qty - received_qty
+            expected_qty = self._end_chunk()
+            target_received_qty = self.received_qty + expected_qty
 
-            for k in range(min(self.chunk_size, left_qty)):
-                obj_id, result = self.parent_obj.out_queue.get()
-                if is_exception(result):
-                    if self.parent_obj.exception_behavior == ExceptionBehaviour.IMMEDIATE:
+            # If the reorder buffer is full, we keep receiving results without submitting new input
+            while self.received_qty < target_received_qty or self._is_reorder_buffer_full():
+                results, exception = self._process_result_message(self._get_result_message(target_received_qty))
+                if exception is not None:
+                    # A persistent pool can be used by other calls: We do not terminate its workers
+                    if not self.parent_obj.persistent:
                         self.parent_obj._close()
 
-                        raise result
-                    elif self.parent_obj.exception_behavior == ExceptionBehaviour.DEFERRED:
-                        exceptions_arr.append(result)
-                    else:
-                        # If exception is ignored it will be returned to the end user
-                        assert self.parent_obj.exception_behavior == ExceptionBehaviour.IGNORE
+                    raise exception
+                for result in results:
+                    yield result
+
+            for result in self.sorted_out_helper.yield_results():
+                yield result
 
-                if self.is_unordered:
+        for result in self.sorted_out_helper.yield_results():
+            yield result
+
+        self._check_finished()
+
+        if not self.parent_obj.persistent:
+            self.parent_obj._close()
+        if self.exceptions_arr:
+            raise Exception(*self.exceptions_arr)
+
+    async def _aget_result_message(self, loop, target_received_qty):
+        # Waiting for results in a separate thread does not block the event loop. The timeout ensures that
+        # the thread does not get stuck if the generator is abandoned.
+        if self.early_result_messages:
+            return self.early_result_messages.popleft()
+        stall_start_time = time.perf_counter() if self.received_qty >= target_received_qty else None
+        deadline = self.sorted_out_helper.release_deadline()
+        try:
+            while True:
+                timeout = ASYNC_QUEUE_POLL_TIMEOUT
+                wait_deadline = min_deadline(deadline, self._speculate())
+                if wait_deadline is not None:
+                    timeout = max(min(timeout, wait_deadline - time.perf_counter()), 0)
+                try:
+                    return await loop.run_in_executor(None, self.parent_obj._get_result_message,
+                                                      self.call_id, timeout)
+                except queue.Empty:
+                    if deadline is not None and time.perf_counter() >= deadline:
+                        return None
+        finally:
+            self._on_reorder_stall(stall_start_time)
+
+    async def _agenerator(self):
+        try:
+            async for result in self._agenerator_impl():
+                if self.metrics is not None:
+                    self._on_result_yield()
+                yield result
+        finally:
+            # Results that arrive after the generator is closed (or abandoned) will be discarded
+            self.parent_obj._finish_call(self.call_id)
+            if self.metrics is not None:
+                self._on_finish_metrics()
+            if self.spill_store is not None:
+                self.spill_store.close()
+
+    async def _agenerator_impl(self):
+        loop = asyncio.get_running_loop()
+        self._init_generator_state()
+
+        while self._has_pending_work():
+            self._start_chunk()
+            while True:
+                try:
+                    worker_arg = await self._anext_input()
+                except StopAsyncIteration:
+                    self.finished_input = True
+                    break
+                if self._add_input_item(worker_arg):
+                    break
+
+            expected_qty = self._end_chunk()
+            target_received_qty = self.received_qty + expected_qty
+
+            # If the reorder buffer is full, we keep receiving results without submitting new input
+            while self.received_qty < target_received_qty or self._is_reorder_buffer_full():
+                results, exception = self._process_result_message(
+                    await self._aget_result_message(loop, target_received_qty))
+                if exception is not None:
+                    # A persistent pool can be used by other calls: We do not terminate its workers
+                    if not self.parent_obj.persistent:
+                        await loop.run_in_executor(None, self.parent_obj._close)
+
+                    raise exception
+                for result in results:
                     yield result
-                else:
-                    sorted_out_helper.add_obj(obj_id, result)
-                    for result in sorted_out_helper.yield_results():
-                        yield result
-
-                assert received_qty < submitted_qty
-                assert self._length is None or received_qty < self._length
-                # We update this counter after receiving an element from the queue rather than after
-                # returning/yielding it. If the priority queue is not empty after all elements are processed
-                # and received, we will still empty it afer exiting the outer loop.
-                received_qty += 1
-
-            for result in sorted_out_helper.yield_results():
+
+            for result in self.sorted_out_helper.yield_results():
                 yield result
 
-        for result in sorted_out_helper.yield_results():
+        for result in self.sorted_out_helper.yield_results():
             yield result
 
-        assert sorted_out_helper.empty(), \
-            f'Logic error, the output queue should be empty at this point, but it has {len(out_queue)} elements'
+        self._check_finished()
 
-        self.parent_obj._close()
-        if exceptions_arr:
-            raise Exception(*exceptions_arr)
+        if not self.parent_obj.persistent:
+            await loop.run_in_executor(None, self.parent_obj._close)
+        if self.exceptions_arr:
+            raise Exception(*self.exceptions_arr)
 
 
 class Pool:
@@ -244,21 +1304,54 @@ class Pool:
     def __enter__(self):
         return self
 
-    def __call__(self, input_iterable):
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, type, value, tb):
+        # Joining workers can take a while: It is done in a separate thread to not block the event loop
+        await asyncio.get_running_loop().run_in_executor(None, self.__exit__, type, value, tb)
+
+    def amap(self, input_iterable, priority: int = 0, weight: float = 1.0):
+        """
+        Process a regular or an asynchronous input iterable. Results should be read using async for
+        (without blocking the event loop), e.g.:
+
+            async with Pool(worker, n_jobs) as pool:
+                async for result in pool.amap(async_input_iterable):
+                    ...
+
+        :param input_iterable: A regular or an asynchronous iterable containing inputs to be processed
+        :param priority: The priority of this input stream (see __call__)
+        :param weight: The weight of this input stream (see __call__)
+        :return: An asynchronous generator yielding results from the worker pool.
+                 This generator is also an asynchronous context manager.
+        :rtype: :class:`WorkerPoolResultGenerator`
+        """
+        return self(input_iterable, priority=priority, weight=weight)
+
+    def __call__(self, input_iterable, priority: int = 0, weight: float = 1.0):
         """
         Call the Pool object as a function to process the input iterable.
 
         :param input_iterable: An iterable containing inputs to be processed
+        :param priority: The priority of this input stream (only for the scheduler Scheduler.PRIORITY):
+                         Batches of streams with higher priorities are sent to workers first.
+        :param weight: The weight of this input stream (only for the scheduler Scheduler.PRIORITY):
+                       Streams with the same priority share workers in proportion to their weights.
         :return: A generator yielding results from the worker pool. This generator is also a context manager.
         :rtype: :class:`WorkerPoolResultGenerator`
         """
         assert self.chunk_size >= 1
         assert self.chunk_prefill_ratio >= 1
+        assert not self.term_signal_sent, \
+            'The pool is closed: Use a persistent pool (persistent=True) to process several input iterables!'
 
         return WorkerPoolResultGenerator(parent_obj=self, input_iterable=input_iterable,
                                          is_unordered=self.is_unordered, bounded=self.bounded,
                                          chunk_size=self.chunk_size,
-                                         chunk_prefill_ratio=self.chunk_prefill_ratio)
+                                         chunk_prefill_ratio=self.chunk_prefill_ratio,
+                                         batch_size=self.batch_size,
+                                         priority=priority, weight=weight)
 
     def __init__(self, worker_or_worker_arr,
                  n_jobs: int = None,
@@ -267,30 +1360,147 @@ class Pool:
                  bounded: bool = True,
                  chunk_size: int = None, chunk_prefill_ratio: int = None,
                  is_unordered: bool = False,
-                 use_threads: bool = False,
+                 use_threads: Union[bool, str] = False,
                  task_timeout: float = None,
-                 join_timeout: float = None):
+                 join_timeout: float = None,
+                 batch_size: Union[int, str] = 1,
+                 transport: Transport = Transport.QUEUE,
+                 shm_min_size: int = DEFAULT_SHM_MIN_SIZE,
+                 scheduler: Scheduler = None,
+                 work_stealing: bool = True,
+                 persistent: bool = False,
+                 eager_init: bool = False,
+                 wait_ready: bool = True,
+                 collect_metrics: bool = False,
+                 metrics_callback: Callable[[TaskMetrics], None] = None,
+                 reorder_buffer_max_items: int = None,
+                 reorder_buffer_max_bytes: int = None,
+                 reorder_max_lag: float = None,
+                 spill_threshold_bytes: int = None,
+                 spill_dir: str = None,
+                 restart_crashed_workers: bool = False,
+                 max_task_retries: int = 2,
+                 max_tasks_per_worker: int = None,
+                 max_worker_rss: int = None,
+                 start_method: str = None,
+                 preload_modules: List[str] = None,
+                 min_workers: int = None,
+                 scale_up_delay: float = 0.5,
+                 scale_down_delay: float = 10.0,
+                 priority_aging_time: float = 1.0,
+                 cost_fn: Callable[[Any], float] = None,
+                 heavy_first: bool = False,
+                 speculative_execution: bool = False,
+                 speculation_multiplier: float = 4.0,
+                 batch_max_wait: float = None,
+                 serializer: Union[Serialization, Serializer, tuple] = Serialization.DILL,
+                 threads_per_worker: int = 1):
         """
         Initialize the Pool object with the given parameters.
 
         :param worker_or_worker_arr: A single worker function/object or a list of worker functions/objects
         :param n_jobs: Number of worker processes/threads to create (ignored if worker_or_worker_arr is a list)
-        :param argument_type: Specifies how arguments are passed to workers
+        :param argument_type: Specifies how arguments are passed to workers. With ArgumentPassing.AS_BATCH,
+                              a vectorized worker receives a list of (up to batch_size) items and returns a list
+                              of results of the same length.
         :param exception_behavior: Defines how exceptions are handled
         :param bounded: Whether to use bounded execution mode: The bounded execution mode is memory efficient.
                         In the unbounded execution mode, all input items are loaded into memory.
-        :param chunk_size: Size of chunk
+        :param chunk_size: Size of chunk (the default is the number of workers multiplied by batch_size
+                           or by the maximum adaptive batch size if batch_size is 'auto')
         :param chunk_prefill_ratio: Prefill ratio for chunks
         :param is_unordered: Whether results can be returned in any order
-        :param use_threads: Use threads instead of processes
-        :param task_timeout: Timeout for individual tasks (currently discouraged)
+        :param use_threads: Use threads instead of processes: Threads receive input items (and return results)
+                            by reference through in-process queues. Set it to 'auto' to use threads only if
+                            the interpreter is free-threaded (no GIL), i.e., threads can run Python code in parallel.
+        :param task_timeout: Timeout (in seconds) for individual tasks (only for pools of two or more processes).
+                             A worker that exceeds the timeout is terminated and restarted, and the task
+                             result is TimeoutError.
         :param join_timeout: Timeout for joining workers
+        :param batch_size: The number of consecutive input items sent to a worker in a single message,
+                           which reduces the per-item queue overhead for cheap items. Set it to 'auto'
+                           to pick the batch size adaptively using the measured per-item processing time.
+        :param transport: Specifies how large buffers (NumPy arrays and bytes-like objects) are passed
+                          between the main process and workers: Transport.SHARED_MEMORY places them into
+                          shared-memory segments and returns results as zero-copy views.
+        :param shm_min_size: The minimum size (in bytes) of a buffer sent via shared memory
+        :param scheduler: Specifies how input batches are assigned to workers: Scheduler.SHARED_QUEUE uses a single
+                          input queue shared by all workers, Scheduler.ROUND_ROBIN and Scheduler.LEAST_LOADED
+                          give each worker its own input queue. Scheduler.PRIORITY uses a shared input queue,
+                          but it dispatches batches according to priorities and weights of input streams.
+                          The default is Scheduler.SHARED_QUEUE (Scheduler.ROUND_ROBIN for threads
+                          on a free-threaded interpreter without autoscaling).
+        :param work_stealing: Whether idle workers can steal batches from input queues of other workers
+                              (only for schedulers with per-worker input queues)
+        :param persistent: Whether workers (and their state) survive the end of input: A persistent pool can
+                           process many input iterables (including concurrently). It is stopped by
+                           the function close() or at the end of the with-block.
+        :param eager_init: Whether all workers with a delayed initialization create their objects (in parallel)
+                           right after they start rather than when they receive the first item.
+        :param wait_ready: If eager_init is True, the constructor waits till all workers are initialized.
+                           It raises WorkerInitError if the initialization of any worker fails. Otherwise,
+                           one can wait for workers using the future returned by the function ready().
+        :param collect_metrics: Whether to collect per-task timestamps and pool-level counters,
+                                which are available via the function metrics().
+        :param metrics_callback: An optional function called with a TaskMetrics object for each
+                                 returned result (it implies collect_metrics=True).
+        :param reorder_buffer_max_items: The maximum number of results buffered to restore the input order.
+                                         If the buffer is full, no new input is submitted till the head-of-line
+                                         results arrive (only in the bounded and ordered mode).
+        :param reorder_buffer_max_bytes: The maximum (estimated) size of buffered results in bytes.
+        :param reorder_max_lag: Enables the "soft-ordered" mode: Results that wait for preceding results
+                                longer than this number of seconds are returned out of order.
+        :param spill_threshold_bytes: If the (estimated) size of results in the reorder buffer exceeds this
+                                      threshold, further results are spilled to a temporary file
+                                      (only in the ordered mode).
+        :param spill_dir: A directory for spill files (the default temporary directory is used if it is None).
+        :param restart_crashed_workers: Whether to restart worker processes that die (e.g., due to a segfault or
+                                        an OOM kill) and re-submit their tasks (only for pools of two or more
+                                        processes).
+        :param max_task_retries: The number of times a task is re-submitted after a worker crash. If the worker
+                                 crashes once again, the task result is WorkerCrashed.
+        :param max_tasks_per_worker: A worker process exits after processing this number of items and it is
+                                     replaced by a new process (only for pools of two or more processes).
+        :param max_worker_rss: A worker process exits (and it is replaced by a new process) when its resident
+                               set size exceeds this number of bytes.
+        :param start_method: A method to start worker processes: 'fork', 'spawn', or 'forkserver'
+                             (the default start method of the platform is used if it is None).
+        :param preload_modules: A list of modules that the fork server imports once: Worker processes
+                                are forked from the fork server with these modules already imported.
+                                It implies start_method='forkserver'.
+        :param min_workers: Enables autoscaling: The pool starts with min_workers workers and it grows up to
+                            n_jobs workers when submitted items wait for a worker. Idle workers are retired
+                            (but at least min_workers workers are kept). Only the shared-queue scheduler is supported.
+        :param scale_up_delay: Autoscaling adds workers only if items have been waiting for a worker
+                               for at least this number of seconds.
+        :param scale_down_delay: Autoscaling retires a worker only if some workers have been idle
+                                 for at least this number of seconds.
+        :param priority_aging_time: With the scheduler Scheduler.PRIORITY, the priority of a waiting batch grows
+                                    by one every priority_aging_time seconds, so that low-priority input streams
+                                    do not starve (None disables aging).
+        :param cost_fn: An optional function that estimates the cost (e.g., the processing time) of an input item.
+                        Batches are then formed based on the total cost rather than the number of items (but they
+                        never have more than batch_size items) and the scheduler Scheduler.LEAST_LOADED balances
+                        the total cost of items in flight across workers. Chunks are still limited by the number
+                        of items, so the memory usage is bounded as usual.
+        :param heavy_first: Whether to submit expensive items (according to cost_fn) of each chunk first
+                            (only in the unordered mode). In the unbounded mode, the chunk is the whole input.
+        :param speculative_execution: Whether to send a duplicate of a straggler batch to an idle worker
+                                      (the first of the two results is used). Workers must be idempotent.
+        :param speculation_multiplier: A batch is a straggler if it is in flight speculation_multiplier times
+                                       longer than the median processing time (of a batch of the same size).
+        :param batch_max_wait: If input items arrive slowly, a partially filled batch is sent to a worker
+                               when its first item waits for more items longer than batch_max_wait seconds.
+        :param serializer: Specifies how batches of input items and results are serialized: Serialization.DILL
+                           lets queues pickle them using dill, Serialization.PICKLE and Serialization.MSGPACK
+                           encode each batch once using the standard pickle or MessagePack. It can also be
+                           an instance of Serializer or a pair of functions (dumps, loads). Batches that
+                           a serializer cannot encode (e.g., with lambdas) are pickled using dill.
+        :param threads_per_worker: The number of threads in each worker process: Items of a batch are processed
+                                   by these threads in parallel, e.g., to overlap I/O of mixed CPU/IO-bound workers
+                                   (only for unsupervised pools of two or more processes).
         """
 
-        if task_timeout is not None:
-            logging.warning("The task timeout features is deprecated."
-                            " We currently cannot support task timeouts in the safe and cross-platform fashion")
-
         if type(worker_or_worker_arr) == list:
             assert n_jobs is None or n_jobs == len(worker_or_worker_arr), \
                 'The number of workers does not match the worker array length (you can just set it None)!'
@@ -306,29 +1516,192 @@ class Pool:
                 ' not {type(function_or_worker_arr)}!'
             self.num_workers = max(int(n_jobs), 1)
 
+        if use_threads == AUTO_USE_THREADS:
+            use_threads = is_free_threaded()
+        # Threads run in parallel: The pool avoids sharing worker objects and contended queues among them
+        self.free_threaded = bool(use_threads) and is_free_threaded()
+        # Whether all workers are created from the same worker function/object
+        self.shared_worker_spec = type(worker_or_worker_arr) != list
+
         self.bounded = bounded
         self.chunk_prefill_ratio = max(int(chunk_prefill_ratio), 1) if chunk_prefill_ratio is not None else 2
-        self.chunk_size = max(int(chunk_size), 1) if chunk_size is not None else self.num_workers
+        if batch_size is None:
+            batch_size = 1
+        self.batch_size = batch_size if batch_size == AUTO_BATCH_SIZE else max(int(batch_size), 1)
+        default_chunk_size = chunk_size is None
+        if chunk_size is None:
+            # A batch never includes items from different chunks: Each worker gets a full batch
+            # (an adaptive batch can grow up to ADAPTIVE_BATCH_MAX_SIZE items)
+            chunk_size = self.num_workers * (self.batch_size if self.batch_size != AUTO_BATCH_SIZE
+                                             else ADAPTIVE_BATCH_MAX_SIZE)
+        self.chunk_size = max(int(chunk_size), 1)
+        assert batch_max_wait is None or batch_max_wait >= 0
+        self.batch_max_wait = batch_max_wait
 
         self.exception_behavior = exception_behavior
         self.argument_type = argument_type
         self.is_unordered = is_unordered
 
-        self.in_queue = mp.Queue()
-        self.out_queue = mp.Queue()
-        self.control_queue = mp.Queue()
+        assert reorder_buffer_max_items is None or reorder_buffer_max_items >= 1
+        assert reorder_buffer_max_bytes is None or reorder_buffer_max_bytes >= 1
+        assert reorder_max_lag is None or reorder_max_lag >= 0
+        if not bounded and (reorder_buffer_max_items is not None or reorder_buffer_max_bytes is not None):
+            logging.warning('The size of the reorder buffer cannot be limited in the unbounded mode,'
+                            ' where all input items are submitted at once')
+        self.reorder_buffer_max_items = reorder_buffer_max_items
+        self.reorder_buffer_max_bytes = reorder_buffer_max_bytes
+        self.reorder_max_lag = reorder_max_lag
+        assert spill_threshold_bytes is None or spill_threshold_bytes >= 0
+        self.spill_threshold_bytes = spill_threshold_bytes
+        self.spill_dir = spill_dir
+
+        if heavy_first and (cost_fn is None or not is_unordered):
+            logging.warning('Expensive items can be submitted first only in the unordered mode with a cost function')
+        self.cost_fn = cost_fn
+        self.heavy_first = heavy_first
+
+        if scheduler is None:
+            # Per-worker input queues (with work stealing) reduce contention among threads running in parallel
+            scheduler = Scheduler.ROUND_ROBIN if self.free_threaded and min_workers is None \
+                else Scheduler.SHARED_QUEUE
+        assert scheduler in [Scheduler.SHARED_QUEUE, Scheduler.ROUND_ROBIN, Scheduler.LEAST_LOADED,
+                             Scheduler.PRIORITY], f'Invalid scheduler: {scheduler}'
+        self.scheduler = scheduler
+        self.work_stealing = work_stealing
+        # Batches that wait for dispatching (only for the priority scheduler) and the number of batches
+        # that were sent to workers, but not yet received
+        self.priority_dispatcher = PriorityDispatcher(priority_aging_time) \
+            if scheduler == Scheduler.PRIORITY else None
+        self.dispatched_qty = 0
+
+        self.autoscaling = min_workers is not None and self.num_workers > 1
+        if self.autoscaling:
+            assert 1 <= min_workers <= self.num_workers, 'min_workers must be in the range [1, n_jobs]!'
+            assert scheduler in [Scheduler.SHARED_QUEUE, Scheduler.PRIORITY], \
+                'Autoscaling requires a scheduler with a shared input queue!'
+        self.min_workers = min_workers if self.autoscaling else self.num_workers
+        self.scale_up_delay = scale_up_delay
+        self.scale_down_delay = scale_down_delay
+        # The number of batches that were submitted, but not yet received (it is tracked only for autoscaling
+        # and speculative execution), the number of workers that were asked to exit, and the start times of pressure and idle periods
+        self.in_flight_batch_qty = 0
+        self.retiring_qty = 0
+        self.pressure_start_time = None
+        self.idle_start_time = None
+
+        # Task timeouts are enforced by terminating worker processes, whereas crashed, recycled, and retired
+        # (due to autoscaling) workers exit: All of this requires a supervisor. Supervised processes send results
+        # synchronously, so that no results are lost when a process exits before all pending results are written.
+        recycle_workers = max_tasks_per_worker is not None or max_worker_rss is not None
+        self.supervised = (task_timeout is not None or restart_crashed_workers or recycle_workers or
+                           self.autoscaling) and not use_threads and self.num_workers > 1
+        if task_timeout is not None and not self.supervised:
+            logging.warning('Task timeouts are supported only by pools of two or more processes:'
+                            ' The timeout is ignored')
+        if restart_crashed_workers and not self.supervised:
+            logging.warning('Crashed workers can be restarted only in pools of two or more processes')
+        if recycle_workers and not self.supervised:
+            logging.warning('Workers can be recycled only in pools of two or more processes:'
+                            ' max_tasks_per_worker and max_worker_rss are ignored')
+        assert max_task_retries >= 0
+        assert max_tasks_per_worker is None or max_tasks_per_worker >= 1
+        assert max_worker_rss is None or max_worker_rss >= 1
+        self.restart_crashed_workers = restart_crashed_workers and self.supervised
+
+        assert threads_per_worker >= 1
+        if threads_per_worker > 1 and (use_threads or self.num_workers == 1 or self.supervised):
+            # Supervision (task timeouts, crash recovery, recycling, and autoscaling) tracks a single task per worker
+            logging.warning('Worker threads are supported only by unsupervised pools of two or more processes:'
+                            ' threads_per_worker is ignored')
+            threads_per_worker = 1
+        self.threads_per_worker = threads_per_worker
+        if default_chunk_size:
+            # Each thread of a worker process can work on its own batch
+            self.chunk_size *= threads_per_worker
+        self.max_task_retries = max_task_retries
+        self.max_tasks_per_worker = max_tasks_per_worker if self.supervised else None
+        self.max_worker_rss = max_worker_rss if self.supervised else None
+        # Whether the supervisor watches for workers that exit
+        self.watch_workers = self.restart_crashed_workers or (recycle_workers and self.supervised) or \
+            self.autoscaling
+        # IDs of crashed workers that are not restarted (because restart_crashed_workers is False)
+        self.dead_worker_ids = set()
+
+        if preload_modules is not None:
+            if start_method is None:
+                start_method = 'forkserver'
+            assert start_method == 'forkserver', 'Modules can be preloaded only with the forkserver start method!'
+        if use_threads and start_method is not None:
+            logging.warning('The start method is ignored by thread pools')
+        # All queues and locks are created using the same context as worker processes
+        self.mp_context = mp.get_context(start_method)
+        self.use_threads = use_threads
+        if preload_modules is not None:
+            # The list is used only when the fork server starts (i.e., when the first pool uses it).
+            # Workers also need this module to unpickle the worker wrapper.
+            self.mp_context.set_forkserver_preload(list(preload_modules) + [__name__])
+
+        # A supervised worker writes results to the output queue synchronously, so that it can be terminated safely
+        self.out_queue = SyncQueue(self.mp_context) if self.supervised else self._create_queue()
+        self.control_queue = self._create_queue()
+        if self.scheduler in [Scheduler.SHARED_QUEUE, Scheduler.PRIORITY]:
+            self.in_queue = self._create_queue()
+            self.in_queues = [self.in_queue] * self.num_workers
+        else:
+            # Per-worker input queues reduce contention on the input queue lock
+            self.in_queue = None
+            self.in_queues = [self._create_queue() for _ in range(self.num_workers)]
+
+        # The number of items in flight for each worker input queue and the queue ID for each batch in flight
+        self.worker_in_flight_qty = [0] * self.num_workers
+        self.batch_queue_ids = {}
+        self.next_queue_id = 0
+        self.scheduler_lock = threading.Lock()
+
+        self.persistent = persistent
+        # Results are routed to "mailboxes" of respective calls. Only one thread reads
+        # from the output queue at any given time.
+        self.call_id_counter = itertools.count()
+        self.result_mailboxes = {}
+        self.result_cond = threading.Condition()
+        self.result_reader_active = False
 
         self.term_signal_sent = False
         self.exited = False
 
-        self.use_threads = use_threads
+        self.metrics_callback = metrics_callback
+        self.pool_metrics = PoolMetrics(self.num_workers) if collect_metrics or metrics_callback is not None else None
+
+        assert transport in [Transport.QUEUE, Transport.SHARED_MEMORY], f'Invalid transport: {transport}'
+        self.transport = transport
+        # The shared-memory transport is not needed when a single worker runs in the main thread or when workers
+        # are threads, which receive objects by reference: Copying them into shared memory (and back) would not help
+        if self.transport == Transport.SHARED_MEMORY and self.num_workers > 1 and not use_threads:
+            self.shm_transport = SharedMemoryTransport(min_size=shm_min_size)
+        else:
+            self.shm_transport = None
+        shm_codec = self.shm_transport.codec if self.shm_transport is not None else None
+        # Serializers are not needed when a single worker runs in the main thread or when workers are threads,
+        # which receive objects by reference
+        self.serializer = get_serializer(serializer) if self.num_workers > 1 and not use_threads else None
+
+        if speculative_execution and self.shm_transport is not None:
+            # Shared-memory segments of a batch are released when the first result arrives
+            logging.warning('Speculative execution is not supported with the shared-memory transport')
+            speculative_execution = False
+        assert speculation_multiplier > 1, 'The speculation multiplier must be greater than one!'
+        self.speculative_execution = speculative_execution and self.num_workers > 1
+        self.speculation_multiplier = speculation_multiplier
+        # Batches that were duplicated: batch ID -> whether the first of the two results arrived.
+        # The number of duplicates that occupy a worker, but are not accounted in in_flight_batch_qty.
+        self.duplicated_batches = {}
+        self.duplicate_qty = 0
 
         if self.use_threads:
-            import threading
             process_class = threading.Thread
             daemon = None
         else:
-            process_class = mp.Process
+            process_class = self.mp_context.Process
             daemon = True
 
         self.join_timeout = join_timeout
@@ -338,21 +1711,294 @@ class Pool:
 
         self.single_worker = None
 
-        # Start worker processes if we have more than one job
+        self.process_class = process_class
+        self.daemon = daemon
+        self.shm_codec = shm_codec
+
+        # A worker function/object for each worker ID, which is used to (re)start workers
+        self.worker_specs = [worker_or_worker_arr[proc_id] if type(worker_or_worker_arr) == list
+                             else worker_or_worker_arr for proc_id in range(self.num_workers)]
+
+        # Supervision: batches in flight (to re-submit them after a task timeout or a worker crash),
+        # exceptions for items that failed (per batch and item index), and crash counts of items
+        self.status_board = WorkerStatusBoard(self.num_workers, self.mp_context) if self.supervised else None
+        self.in_flight_batches = {}
+        self.failed_items = {}
+        self.item_crash_qty = {}
+        self.supervisor_lock = threading.Lock()
+        self.supervisor_stop = threading.Event()
+        self.closing = False
+        # Gathers items submitted one by one (see submit) into micro-batches: It is created on the first use
+        self.micro_batcher = None
+
+        self.eager_init = eager_init
+        self.ready_queue = self._create_queue() if eager_init and self.num_workers > 1 else None
+        self.ready_future = concurrent.futures.Future()
+        # Initialization times of eagerly initialized workers
+        self.worker_init_times = [None] * self.num_workers
+
+        # Start worker processes if we have more than one job. With autoscaling, the list of workers has
+        # one slot per each potential worker: Slots of workers that are not running are None.
         if self.num_workers > 1:
             for proc_id in range(self.num_workers):
-                one_worker = worker_or_worker_arr[proc_id] \
-                    if type(worker_or_worker_arr) == list else worker_or_worker_arr
-                one_proc = process_class(target=WorkerWrapper(one_worker, self.task_timeout),
-                                        args=(self.in_queue, self.out_queue, self.control_queue, self.argument_type),
-                                        daemon=daemon)
-                self.workers.append(one_proc)
-                one_proc.start()
+                self.workers.append(self._start_worker(proc_id) if proc_id < self.min_workers else None)
+            if self.supervised or self.autoscaling:
+                threading.Thread(target=self._supervise, daemon=True).start()
+        else:
+            self.single_worker = WorkerWrapper(self.worker_specs[0], self.task_timeout)
+            if eager_init:
+                self.ready_queue = queue.SimpleQueue()
+                self.ready_queue.put((0,) + self.single_worker.init())
+
+        if not eager_init:
+            self.ready_future.set_result(self.worker_init_times)
+        elif wait_ready:
+            self._collect_ready_reports()
+            # Initialization errors are reported before any data is submitted
+            self.ready_future.result()
         else:
-            one_worker = worker_or_worker_arr[0] \
-                if type(worker_or_worker_arr) == list else worker_or_worker_arr
+            threading.Thread(target=self._collect_ready_reports, daemon=True).start()
 
-            self.single_worker = WorkerWrapper(one_worker, self.task_timeout)
+    def _create_queue(self):
+        """
+            Threads share the address space: Their queues pass objects by reference (without pickling).
+        """
+        return ThreadQueue() if self.use_threads else self.mp_context.Queue()
+
+    def _start_worker(self, proc_id, report_ready=True):
+        if self.in_queue is None and self.work_stealing:
+            # Victim queues are rotated so that idle workers do not all start from the same victim
+            steal_queues = self.in_queues[proc_id + 1:] + self.in_queues[:proc_id]
+        else:
+            steal_queues = None
+        worker = self.worker_specs[proc_id]
+        if self.free_threaded and self.shared_worker_spec and type(worker) == ShellObject:
+            # Threads running in parallel would race to create (and then share) the same object:
+            # Each thread gets its own object, just like each worker process does
+            worker = ShellObject(worker.cls, *worker.args, **worker.kwargs)
+        one_proc = self.process_class(target=WorkerWrapper(worker, self.task_timeout,
+                                                           self.shm_codec, worker_id=proc_id,
+                                                           collect_timings=self.pool_metrics is not None,
+                                                           status_board=self.status_board,
+                                                           max_tasks=self.max_tasks_per_worker,
+                                                           max_rss=self.max_worker_rss,
+                                                           serializer=self.serializer,
+                                                           threads_per_worker=self.threads_per_worker),
+                                      args=(self.in_queues[proc_id], self.out_queue, self.control_queue,
+                                            self.argument_type, steal_queues,
+                                            self.ready_queue if report_ready else None),
+                                      daemon=self.daemon)
+        one_proc.start()
+        return one_proc
+
+    def _supervise(self):
+        poll_interval = get_supervisor_poll_interval(self.task_timeout)
+        while not self.supervisor_stop.is_set():
+            if self.watch_workers and not self.use_threads and not self.closing:
+                # Wake up as soon as any worker exits
+                wait_for_sentinels([p.sentinel for worker_id, p in enumerate(self.workers)
+                                    if p is not None and worker_id not in self.dead_worker_ids], poll_interval)
+            else:
+                self.supervisor_stop.wait(poll_interval)
+
+            for worker_id in range(self.num_workers):
+                proc = self.workers[worker_id]
+                if proc is None:
+                    continue
+                if self.watch_workers and worker_id not in self.dead_worker_ids and not self.closing and \
+                        not proc.is_alive():
+                    self._on_worker_exit(worker_id)
+                    continue
+                if self.task_timeout is None:
+                    continue
+                status = self.status_board.get(worker_id)
+                if status is not None and time.time() - status[2] >= self.task_timeout:
+                    self._recycle_worker(worker_id, status)
+
+            if self.autoscaling and not self.closing:
+                self._autoscale()
+
+    def _autoscale(self):
+        """
+            Add workers if submitted batches wait for a worker longer than scale_up_delay and retire
+            one worker if some workers are idle longer than scale_down_delay. After each change,
+            the respective delay starts anew, which prevents the pool from scaling up and down too often.
+        """
+        now = time.perf_counter()
+        active_qty = self.active_workers()
+        with self.scheduler_lock:
+            # A positive value is the number of batches waiting for a worker and a negative value is
+            # the number of idle workers
+            pressure = self.in_flight_batch_qty - active_qty
+
+        free_worker_ids = [worker_id for worker_id, p in enumerate(self.workers) if p is None]
+        if pressure > 0 and free_worker_ids:
+            self.idle_start_time = None
+            if self.pressure_start_time is None:
+                self.pressure_start_time = now
+            elif now - self.pressure_start_time >= self.scale_up_delay:
+                self.pressure_start_time = None
+                with self.supervisor_lock:
+                    if self.closing:
+                        return
+                    for worker_id in free_worker_ids[:pressure]:
+                        self.workers[worker_id] = self._start_worker(worker_id, report_ready=False)
+        elif pressure < 0 and active_qty > self.min_workers:
+            self.pressure_start_time = None
+            if self.idle_start_time is None:
+                self.idle_start_time = now
+            elif now - self.idle_start_time >= self.scale_down_delay:
+                self.idle_start_time = None
+                # Some worker takes the end-of-work signal and exits
+                self.retiring_qty += 1
+                self.in_queue.put(None)
+        else:
+            self.pressure_start_time = None
+            self.idle_start_time = None
+
+    def active_workers(self):
+        """
+            Return the number of running workers (excluding workers that are being retired by autoscaling).
+        """
+        return sum([p is not None and worker_id not in self.dead_worker_ids
+                    for worker_id, p in enumerate(self.workers)]) - self.retiring_qty
+
+    def _recycle_worker(self, worker_id, status):
+        """
+            Terminate a worker that exceeded the task timeout, start a new one (with a newly initialized
+            worker object), and re-submit the batch: The timed-out item is returned as TimeoutError.
+        """
+        with self.status_board.locks[worker_id]:
+            # The worker cannot finish the task while we hold the lock, but it could have finished it earlier
+            if self.status_board.get(worker_id) != status:
+                return
+            proc = self.workers[worker_id]
+            proc.terminate()
+            proc.join()
+            self.status_board.reset(worker_id)
+
+        batch_id, item_idx, _ = status
+        with self.supervisor_lock:
+            if self.closing:
+                return
+            self.workers[worker_id] = self._start_worker(worker_id, report_ready=False)
+            worker_arg_batch = self.in_flight_batches.get(batch_id)
+            if worker_arg_batch is None:
+                # Results of this batch are not needed anymore
+                return
+            failed_items = self.failed_items.setdefault(batch_id, {})
+            failed_items[item_idx] = TimeoutError(f'The task timed out after {self.task_timeout} seconds')
+            failed_items = dict(failed_items)
+
+        logging.warning(f'Worker {worker_id} was restarted after the task timeout')
+        # Items of the batch that were processed before the timed-out item are processed again
+        self.in_queues[worker_id].put((batch_id, worker_arg_batch, failed_items))
+
+    def _on_worker_exit(self, worker_id):
+        """
+            Start a new worker instead of a worker that exited (unless the worker was retired by autoscaling).
+            A recycled worker (see max_tasks_per_worker) exits cleanly. If the worker crashed, the batch the worker was processing is re-submitted.
+            If the same item crashes workers more than max_task_retries times, it is returned as WorkerCrashed.
+        """
+        proc = self.workers[worker_id]
+        proc.join()
+        # Threads do not crash: They exit only when they receive the end-of-work signal
+        exitcode = getattr(proc, 'exitcode', 0)
+        if exitcode == 0 and self.retiring_qty > 0:
+            # The worker was retired by autoscaling
+            with self.supervisor_lock:
+                self.retiring_qty -= 1
+                self.workers[worker_id] = None
+            if self.status_board is not None:
+                self.status_board.reset(worker_id)
+            return
+        if exitcode != 0 and not self.restart_crashed_workers:
+            logging.warning(f'Worker {worker_id} crashed (exit code: {exitcode}): To restart crashed workers,'
+                            f' create the pool with restart_crashed_workers=True')
+            self.dead_worker_ids.add(worker_id)
+            return
+        batch_status = self.status_board.get_batch(worker_id)
+        self.status_board.reset(worker_id)
+
+        with self.supervisor_lock:
+            if self.closing:
+                return
+            self.workers[worker_id] = self._start_worker(worker_id, report_ready=False)
+            if exitcode == 0:
+                # The worker was recycled after it sent all results
+                return
+            batch_id, item_idx = batch_status if batch_status is not None else (None, None)
+            worker_arg_batch = self.in_flight_batches.get(batch_id)
+            if worker_arg_batch is None:
+                # The worker crashed between batches or results of the batch are not needed anymore
+                logging.warning(f'Worker {worker_id} was restarted after a crash (exit code: {exitcode})')
+                return
+            crash_qty = self.item_crash_qty.setdefault(batch_id, {})
+            crash_qty[item_idx] = crash_qty.get(item_idx, 0) + 1
+            failed_items = self.failed_items.setdefault(batch_id, {})
+            if crash_qty[item_idx] > self.max_task_retries:
+                failed_items[item_idx] = WorkerCrashed(exitcode, crash_qty[item_idx])
+            failed_items = dict(failed_items)
+
+        logging.warning(f'Worker {worker_id} was restarted after a crash (exit code: {exitcode}):'
+                        f' The task is re-submitted')
+        # Items of the batch that were processed before the crash are processed again
+        self.in_queues[worker_id].put((batch_id, worker_arg_batch, failed_items))
+
+    def _collect_ready_reports(self):
+        init_errors = {}
+        for _ in range(self.min_workers):
+            worker_id, init_time, init_error = self.ready_queue.get()
+            self.worker_init_times[worker_id] = init_time
+            if init_error is not None:
+                init_errors[worker_id] = init_error
+
+        if init_errors:
+            # Workers that failed to initialize are not usable: The pool is stopped
+            self.__exit__(None, None, None)
+            self.ready_future.set_exception(WorkerInitError(init_errors))
+        else:
+            self.ready_future.set_result(self.worker_init_times)
+
+    def ready(self):
+        """
+            Return a future that is resolved when all workers are initialized (see the argument eager_init).
+            The result of the future is a list of per-worker initialization times (in seconds).
+            If the initialization of any worker fails, the future raises WorkerInitError.
+
+            :rtype: :class:`concurrent.futures.Future`
+        """
+        return self.ready_future
+
+    def submit(self, item):
+        """
+            Submit a single input item, e.g., from a request handler. Concurrently submitted items are gathered
+            into micro-batches of up to batch_size items: A micro-batch is dispatched when it is full or when
+            its first item waited for more items longer than batch_max_wait seconds (if batch_max_wait is None,
+            a micro-batch includes only the items that were already submitted). Each micro-batch is processed
+            by a single worker.
+
+            :return: a future, which is resolved with the result (or the exception) as soon as the micro-batch
+                     of the item is processed
+            :rtype: :class:`concurrent.futures.Future`
+        """
+        with self.supervisor_lock:
+            assert not self.closing and not self.term_signal_sent, 'The pool is closed!'
+            if self.micro_batcher is None:
+                max_batch_size = ADAPTIVE_BATCH_MAX_SIZE if self.batch_size == AUTO_BATCH_SIZE else self.batch_size
+                batch_sizer = AdaptiveBatchSizer() if self.batch_size == AUTO_BATCH_SIZE else None
+                self.micro_batcher = MicroBatcher(self, max_batch_size, batch_sizer, self.batch_max_wait)
+        return self.micro_batcher.submit(item)
+
+    def metrics(self):
+        """
+            Return pool-level counters (see the argument collect_metrics). A snapshot of counters can be
+            obtained as a dictionary, a JSON string, or in the Prometheus text format.
+
+            :rtype: :class:`mtasklite.metrics.PoolMetrics`
+        """
+        assert self.pool_metrics is not None, 'Metrics are not collected: Create the pool with collect_metrics=True!'
+        return self.pool_metrics
 
     def __exit__(self, type, value, tb):
         # Close will not do anything if the close function was called already
@@ -362,22 +2008,280 @@ class Pool:
         # but they will die when the main process terminates.
         if not self.use_threads:
             for p in self.workers:
-                p.terminate()
+                if p is not None:
+                    p.terminate()
+        self._release_transport()
         self.exited = True
 
+    def close(self):
+        """
+            Stop workers after they process all submitted items. This is mostly useful for persistent pools
+            that are used without the with-statement.
+        """
+        self._close()
+
+    def _dispatch_batch(self, batch_id, worker_arg_batch, cost=None):
+        if self.supervised:
+            with self.supervisor_lock:
+                self.in_flight_batches[batch_id] = worker_arg_batch
+
+        if self.autoscaling or self.speculative_execution:
+            with self.scheduler_lock:
+                self.in_flight_batch_qty += 1
+
+        if self.scheduler == Scheduler.SHARED_QUEUE:
+            self.in_queue.put((batch_id, worker_arg_batch))
+            return
+
+        if self.scheduler == Scheduler.PRIORITY:
+            with self.scheduler_lock:
+                self.priority_dispatcher.push(batch_id[0], batch_id, worker_arg_batch, cost)
+                self._dispatch_pending_batches()
+            return
+
+        with self.scheduler_lock:
+            if self.scheduler == Scheduler.ROUND_ROBIN:
+                queue_id = self.next_queue_id
+                self.next_queue_id = (self.next_queue_id + 1) % self.num_workers
+            else:
+                assert self.scheduler == Scheduler.LEAST_LOADED
+                queue_id = min(range(self.num_workers), key=lambda k: self.worker_in_flight_qty[k])
+
+            # The load is the number of items or their total cost (if the pool has a cost function)
+            load = cost if cost is not None else len(worker_arg_batch)
+            self.batch_queue_ids[batch_id] = (queue_id, load)
+            self.worker_in_flight_qty[queue_id] += load
+        self.in_queues[queue_id].put((batch_id, worker_arg_batch))
+
+    def _on_batch_done(self, batch_id, batch_qty):
+        if self.autoscaling or self.speculative_execution:
+            with self.scheduler_lock:
+                self.in_flight_batch_qty -= 1
+        if self.supervised:
+            with self.supervisor_lock:
+                self.in_flight_batches.pop(batch_id, None)
+                self.failed_items.pop(batch_id, None)
+                self.item_crash_qty.pop(batch_id, None)
+
+        if self.scheduler in [Scheduler.SHARED_QUEUE, Scheduler.PRIORITY]:
+            return
+        # A batch might have been stolen by another worker, but we account for it in the queue it was assigned to
+        with self.scheduler_lock:
+            queue_load = self.batch_queue_ids.pop(batch_id, None)
+            if queue_load is not None:
+                queue_id, load = queue_load
+                self.worker_in_flight_qty[queue_id] -= load
+
+    def _idle_worker_qty(self):
+        active_qty = self.active_workers()
+        with self.scheduler_lock:
+            return active_qty - self.in_flight_batch_qty - self.duplicate_qty
+
+    def _dispatch_duplicate(self, batch_id, worker_arg_batch):
+        """
+            Send a duplicate of a straggler batch to workers: It bypasses the scheduler (and its accounting).
+        """
+        with self.scheduler_lock:
+            self.duplicated_batches[batch_id] = False
+            self.duplicate_qty += 1
+            if self.in_queue is not None:
+                in_queue = self.in_queue
+            else:
+                in_queue = self.in_queues[min(range(self.num_workers), key=lambda k: self.worker_in_flight_qty[k])]
+        if self.pool_metrics is not None:
+            self.pool_metrics.on_duplicate(len(worker_arg_batch))
+        in_queue.put((batch_id, worker_arg_batch))
+
+    def _accept_duplicate_result_message(self, message):
+        """
+            Only the first of the two results of a duplicated batch is used.
+
+            :return: False if the message needs to be discarded
+        """
+        batch_id, result_batch, elapsed_time, _ = message
+        with self.scheduler_lock:
+            result_received = self.duplicated_batches.get(batch_id)
+            if result_received is None:
+                return True
+            if not result_received:
+                self.duplicated_batches[batch_id] = True
+                return True
+            del self.duplicated_batches[batch_id]
+            self.duplicate_qty -= 1
+        if self.pool_metrics is not None:
+            self.pool_metrics.on_wasted_work(len(result_batch), elapsed_time)
+        return False
+
+    def _dispatch_pending_batches(self):
+        # The scheduler lock must be held
+        while self.dispatched_qty < PRIORITY_DISPATCH_RATIO * self.num_workers:
+            entry = self.priority_dispatcher.pop()
+            if entry is None:
+                break
+            self.dispatched_qty += 1
+            self.in_queue.put(entry)
+
+    def _on_result_message_received(self):
+        if self.priority_dispatcher is None:
+            return
+        # A worker is about to become free: Some pending batch can be sent to workers
+        with self.scheduler_lock:
+            self.dispatched_qty -= 1
+            self._dispatch_pending_batches()
+
+    def _start_call(self, priority=0, weight=1.0):
+        with self.result_cond:
+            # Without the GIL, the counter is not guaranteed to be thread-safe
+            call_id = next(self.call_id_counter)
+            self.result_mailboxes[call_id] = deque()
+        if self.priority_dispatcher is not None:
+            with self.scheduler_lock:
+                self.priority_dispatcher.add_stream(call_id, priority, weight)
+        return call_id
+
+    def _finish_call(self, call_id):
+        with self.result_cond:
+            mailbox = self.result_mailboxes.pop(call_id, [])
+        for message in mailbox:
+            self._discard_result_message(message)
+        if self.priority_dispatcher is not None:
+            with self.scheduler_lock:
+                pending_batches = self.priority_dispatcher.remove_stream(call_id)
+            # Batches that were never sent to workers are discarded
+            for batch_id, worker_arg_batch in pending_batches:
+                self._on_batch_done(batch_id, len(worker_arg_batch))
+                if self.shm_transport is not None:
+                    self.shm_transport.release_batch(batch_id)
+
+    def _discard_result_message(self, message):
+        batch_id, result_batch, _, _ = message
+        self._on_batch_done(batch_id, len(result_batch))
+        if self.shm_transport is not None:
+            self.shm_transport.release_batch(batch_id)
+            self.shm_transport.discard_results(result_batch)
+
+    def _get_result_message(self, call_id, timeout=None):
+        """
+            Get the next result message for a given call. Messages for other calls are routed to
+            their mailboxes and messages for finished calls are discarded.
+
+            :raises queue.Empty: if no message arrives within the timeout
+        """
+        while True:
+            with self.result_cond:
+                while True:
+                    mailbox = self.result_mailboxes[call_id]
+                    if mailbox:
+                        return mailbox.popleft()
+                    if not self.result_reader_active:
+                        self.result_reader_active = True
+                        break
+                    if not self.result_cond.wait(timeout):
+                        raise queue.Empty
+
+            try:
+                message = self._read_result_message(timeout)
+            finally:
+                with self.result_cond:
+                    self.result_reader_active = False
+                    self.result_cond.notify_all()
+
+            if self.speculative_execution and not self._accept_duplicate_result_message(message):
+                continue
+            if self.restart_crashed_workers and not self._accept_result_message(message):
+                continue
+            self._on_result_message_received()
+
+            msg_call_id = message[0][0]
+            if msg_call_id == call_id:
+                return message
+            with self.result_cond:
+                other_mailbox = self.result_mailboxes.get(msg_call_id)
+                if other_mailbox is not None:
+                    other_mailbox.append(message)
+                    self.result_cond.notify_all()
+                    continue
+            self._discard_result_message(message)
+
+    def _read_result_message(self, timeout):
+        """
+            Read the next result message from the output queue and decode its results (if the pool has a serializer).
+
+            :raises queue.Empty: if no message arrives within the timeout
+        """
+        message = self.out_queue.get(timeout=timeout)
+        if self.serializer is None:
+            return message
+        batch_id, result_batch, elapsed_time, worker_timings = message
+        return batch_id, self.serializer.decode(result_batch), elapsed_time, worker_timings
+
+    def _accept_result_message(self, message):
+        """
+            A worker can crash after it sent results, but before it reported that the batch is done. Then,
+            the batch is processed twice: The duplicate results are discarded.
+        """
+        batch_id = message[0]
+        with self.supervisor_lock:
+            if self.in_flight_batches.pop(batch_id, None) is not None:
+                return True
+        if self.shm_transport is not None:
+            self.shm_transport.discard_results(message[1])
+        return False
+
     def _join_workers(self):
-        for p in self.workers:
-            p.join(self.join_timeout)
+        workers = [p for p in self.workers if p is not None]
+        if not self.supervised:
+            for p in workers:
+                p.join(self.join_timeout)
+            return
+
+        # Supervised workers write results synchronously: Unless somebody reads results, they can block forever
+        poll_interval = get_supervisor_poll_interval(self.task_timeout)
+        for p in workers:
+            deadline = time.perf_counter() + self.join_timeout if self.join_timeout is not None else None
+            while p.is_alive() and (deadline is None or time.perf_counter() < deadline):
+                p.join(poll_interval)
+                self._drain_out_queue()
+
+    def _drain_out_queue(self):
+        while True:
+            try:
+                message = self._read_result_message(TINY_QUEUE_TIMEOUT)
+            except queue.Empty:
+                break
+            if self.speculative_execution and not self._accept_duplicate_result_message(message):
+                continue
+            self._discard_result_message(message)
 
     def _close(self):
         if not self.term_signal_sent:
-            for _ in range(self.num_workers):
+            if self.micro_batcher is not None:
+                # Submitted items are processed before workers stop
+                self.micro_batcher.stop(self.join_timeout)
+            with self.supervisor_lock:
+                # Workers are not restarted anymore
+                self.closing = True
+            for worker_in_queue in self.in_queues:
                 # Primariy end-of-work signal: one per worker
                 # It may take some time before a worker sees this
-                self.in_queue.put(None)  
+                worker_in_queue.put(None)
                 # An additional end-of-work signal: one per worker
                 # These ones will be seen very soon, before processing the next item in a queue
                 self.control_queue.put(None)
 
             self._join_workers()
+            self.supervisor_stop.set()
+            self._release_transport()
         self.term_signal_sent = True
+
+    def _release_transport(self):
+        if self.shm_transport is None:
+            return
+        # Results that were never received (e.g., due to an exception) can reference shared-memory segments
+        while True:
+            try:
+                _, result_batch, _, _ = self._read_result_message(TINY_QUEUE_TIMEOUT)
+            except queue.Empty:
+                break
+            self.shm_transport.discard_results(result_batch)
+        self.shm_transport.cleanup()
@@ -0,0 +1,95 @@
+"""
+    A priority-aware dispatcher for the scheduler Scheduler.PRIORITY: Batches of input items are kept
+    in the main process and they are sent to workers (via a shared input queue) only when workers are about
+    to become free. Thus, a high-priority batch does not wait behind a long backlog of low-priority batches.
+"""
+import math
+import time
+
+from collections import deque
+
+
+class DispatchStream:
+    """
+        Pending batches of a single input stream (i.e., a call of the pool).
+    """
+    def __init__(self, priority, weight):
+        self.priority = priority
+        self.weight = weight
+        # The virtual finish time of the last pending batch (see PriorityDispatcher.push)
+        self.finish_tag = 0.0
+        # Tuples (finish tag, push time, batch ID, batch)
+        self.pending = deque()
+
+
+class PriorityDispatcher:
+    """
+        Batches of the same stream are dispatched in order. Among streams, the head batch with the highest priority
+        is dispatched first. To prevent starvation, the priority of a waiting batch grows by one every aging_time
+        seconds. Streams with the same (effective) priority share workers in proportion to their weights:
+        This is the self-clocked weighted fair queuing, where the cost of a batch is the number of items
+        (or the total cost of items if the pool has a cost function).
+
+        The dispatcher is not thread-safe: The pool protects it with a lock.
+    """
+    def __init__(self, aging_time=None):
+        self.aging_time = aging_time
+        self.streams = {}
+        self.virtual_time = 0.0
+        self.pending_qty = 0
+
+    def add_stream(self, stream_id, priority=0, weight=1.0):
+        assert weight > 0, 'The weight must be positive!'
+        self.streams[stream_id] = DispatchStream(priority, weight)
+
+    def remove_stream(self, stream_id):
+        """
+            Remove a stream.
+
+            :return: a list of tuples (batch ID, batch) that were not dispatched
+        """
+        stream = self.streams.pop(stream_id, None)
+        if stream is None:
+            return []
+        self.pending_qty -= len(stream.pending)
+        return [(batch_id, batch) for _, _, batch_id, batch in stream.pending]
+
+    def push(self, stream_id, batch_id, batch, cost=None):
+        stream = self.streams[stream_id]
+        if cost is None:
+            cost = len(batch)
+        # A stream that was idle does not accumulate credit: It starts at the current virtual time
+        stream.finish_tag = max(stream.finish_tag, self.virtual_time) + cost / stream.weight
+        stream.pending.append((stream.finish_tag, time.perf_counter(), batch_id, batch))
+        self.pending_qty += 1
+
+    def _effective_priority(self, stream, push_time, now):
+        if self.aging_time is None:
+            return stream.priority
+        return stream.priority + math.floor((now - push_time) / self.aging_time)
+
+    def pop(self):
+        """
+            :return: a tuple (batch ID, batch) to dispatch next or None if there are no pending batches
+        """
+        now = time.perf_counter()
+        best_stream = None
+        best_key = None
+        for stream in self.streams.values():
+            if not stream.pending:
+                continue
+            finish_tag, push_time, _, _ = stream.pending[0]
+            key = (-self._effective_priority(stream, push_time, now), finish_tag)
+            if best_key is None or key < best_key:
+                best_stream, best_key = stream, key
+
+        if best_stream is None:
+            return None
+
+        finish_tag, _, batch_id, batch = best_stream.pending.popleft()
+        self.pending_qty -= 1
+        self.virtual_time = finish_tag
+        return batch_id, batch
+
+    def __len__(self):
+        return self.pending_qty
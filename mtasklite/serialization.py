@@ -0,0 +1,140 @@
+"""
+    Pluggable serializers of batches sent through queues: By default, multiprocess queues pickle messages using
+    dill, which is implemented in pure Python and can be slow for large containers of primitive objects.
+    A serializer encodes a whole batch (of input items or results) into a few bytes-like objects once, so that
+    the queue has little left to pickle. If a serializer cannot encode the batch (e.g., it has lambdas
+    or closures), the batch is pickled using dill as usual.
+"""
+import logging
+import pickle
+
+from .constants import Serialization
+from .shm_transport import SharedMemoryCodec
+
+
+class EncodedBatch:
+    """
+        A batch encoded by a serializer. Its length is the number of items in the original batch.
+        If the serializer failed, the payload is the original batch (which the queue pickles using dill).
+    """
+    def __init__(self, payload, qty, encoded=True):
+        self.payload = payload
+        self.qty = qty
+        self.encoded = encoded
+
+    def __len__(self):
+        return self.qty
+
+
+class Serializer:
+    """
+        A base class of serializers: A subclass implements the functions dumps and loads. The function
+        dumps returns a picklable payload (usually, a bytes-like object) and it can raise an exception
+        if the object is not supported (then, dill is used instead).
+    """
+    # Whether the fallback to dill was reported (it is reported only once)
+    fallback_reported = False
+    # Whether decoded objects keep their types: Otherwise, shared-memory descriptors (see shm_transport.py)
+    # would be decoded as, e.g., lists and workers would receive descriptors instead of buffers
+    preserves_types = False
+
+    def dumps(self, obj):
+        raise NotImplementedError
+
+    def loads(self, payload):
+        raise NotImplementedError
+
+    def encode(self, batch, check_shm_refs=False):
+        """
+            :param batch: a list of input items or results
+            :param check_shm_refs: whether the batch can have shared-memory descriptors: Unless the serializer
+                                   preserves types, such batches are pickled using dill
+        """
+        if check_shm_refs and not self.preserves_types and \
+                next(SharedMemoryCodec.iter_refs(batch), None) is not None:
+            return EncodedBatch(batch, len(batch), encoded=False)
+        try:
+            return EncodedBatch(self.dumps(batch), len(batch))
+        except Exception as e:
+            if not self.fallback_reported:
+                self.fallback_reported = True
+                logging.warning(f'Serializer {type(self).__name__} cannot encode a batch, dill is used instead: {e}')
+            return EncodedBatch(batch, len(batch), encoded=False)
+
+    def decode(self, encoded_batch: EncodedBatch):
+        if not encoded_batch.encoded:
+            return encoded_batch.payload
+        return self.loads(encoded_batch.payload)
+
+
+class PickleSerializer(Serializer):
+    """
+        The standard (C) pickle. The encoded batch is pickled again by the queue (as a single bytes object),
+        so large buffers (e.g., of NumPy arrays) are copied as usual: To avoid copying them,
+        use the shared-memory transport.
+    """
+    preserves_types = True
+
+    def __init__(self, protocol=pickle.HIGHEST_PROTOCOL):
+        self.protocol = protocol
+
+    def dumps(self, obj):
+        return pickle.dumps(obj, protocol=self.protocol)
+
+    def loads(self, payload):
+        return pickle.loads(payload)
+
+
+class MsgpackSerializer(Serializer):
+    """
+        MessagePack: It supports only None, booleans, numbers, strings, bytes, lists, and dictionaries.
+        Tuples are decoded as lists. The package msgpack is an optional dependency.
+    """
+    def __init__(self):
+        try:
+            import msgpack
+        except ImportError:
+            raise ImportError('The msgpack serializer requires the package msgpack: pip install msgpack')
+
+    def dumps(self, obj):
+        import msgpack
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def loads(self, payload):
+        import msgpack
+        return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+
+
+class CustomSerializer(Serializer):
+    """
+        A user-provided pair of functions: dumps(obj) returns a picklable payload and loads(payload) restores
+        the object. Both functions are sent to worker processes, so they can be lambdas or closures.
+    """
+    def __init__(self, dumps, loads):
+        self.dumps_fn = dumps
+        self.loads_fn = loads
+
+    def dumps(self, obj):
+        return self.dumps_fn(obj)
+
+    def loads(self, payload):
+        return self.loads_fn(payload)
+
+
+def get_serializer(serializer):
+    """
+        Create a serializer.
+
+        :param serializer: a value of Serialization, an instance of Serializer, or a tuple (dumps, loads)
+        :return: a serializer or None if messages are pickled by queues using dill
+    """
+    if serializer is None or serializer == Serialization.DILL:
+        return None
+    if isinstance(serializer, Serializer):
+        return serializer
+    if type(serializer) == tuple:
+        assert len(serializer) == 2 and all(callable(fn) for fn in serializer), \
+            'A custom serializer must be a pair of functions (dumps, loads)!'
+        return CustomSerializer(*serializer)
+    assert serializer in [Serialization.PICKLE, Serialization.MSGPACK], f'Invalid serializer: {serializer}'
+    return PickleSerializer() if serializer == Serialization.PICKLE else MsgpackSerializer()
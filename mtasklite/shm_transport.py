@@ -0,0 +1,244 @@
+"""
+    An optional shared-memory transport for large NumPy arrays and bytes-like payloads.
+
+    Large buffers found in worker arguments and results (including buffers inside lists, tuples,
+    and dictionaries) are copied into shared-memory segments and only small descriptors (SharedMemoryRef)
+    travel through the input and output queues. Results are returned as zero-copy views
+    (NumPy arrays or memoryview objects) of the respective segments.
+
+    Segment ownership:
+
+    1. Segments with worker arguments are created by the main process and released (closed and unlinked)
+       when the results for the respective batch are received (or when the pool is closed).
+    2. Segments with results are created by workers. The main process unlinks such a segment right after
+       attaching to it: The memory is freed when the last view of the segment is garbage collected.
+    3. All segment names share a pool-specific prefix, so that segments "orphaned" by terminated
+       workers can be found and removed when the pool is closed.
+"""
+import glob
+import logging
+import os
+import sys
+import uuid
+
+from multiprocess import resource_tracker, shared_memory
+from typing import NamedTuple
+
+# A default minimum size (in bytes) of a buffer to be sent via shared memory.
+# Smaller buffers are cheaper to pickle.
+DEFAULT_SHM_MIN_SIZE = 64 * 1024
+
+# A directory where POSIX shared memory segments live (on Linux)
+SHM_DIR = '/dev/shm'
+
+SHM_KIND_BYTES = 'bytes'
+SHM_KIND_NDARRAY = 'ndarray'
+
+
+class SharedMemoryRef(NamedTuple):
+    """
+        A small descriptor of a shared-memory segment, which is sent through a queue instead of a buffer.
+    """
+    name: str
+    kind: str
+    nbytes: int
+    shape: tuple = None
+    dtype: str = None
+
+
+class SharedMemorySegment(shared_memory.SharedMemory):
+    """
+        A shared-memory segment that can be closed while zero-copy views of it are still alive.
+        In this case, the memory remains mapped until all views are garbage collected.
+    """
+    def close(self):
+        try:
+            super().close()
+        except BufferError:
+            # Views of the segment keep the mapping alive, but we do not need our own references anymore
+            self._buf = None
+            self._mmap = None
+            if self._fd >= 0:
+                os.close(self._fd)
+                self._fd = -1
+
+
+def _get_numpy_ndarray_type():
+    # NumPy is an optional dependency: If it was not imported by the user code, there can be no NumPy arrays.
+    numpy = sys.modules.get('numpy')
+    return numpy.ndarray if numpy is not None else None
+
+
+def unlink_segment(name):
+    """
+        Unlink a segment by its name ignoring segments that do not exist anymore.
+    """
+    try:
+        segm = SharedMemorySegment(name=name)
+    except FileNotFoundError:
+        return
+    segm.close()
+    segm.unlink()
+
+
+class SharedMemoryCodec:
+    """
+        Replaces large buffers with shared-memory descriptors (and back). This object is
+        passed to workers, so it keeps only the configuration.
+    """
+    def __init__(self, min_size, name_prefix):
+        self.min_size = max(int(min_size), 1)
+        self.name_prefix = name_prefix
+
+    def _new_segment(self, nbytes):
+        name = f'{self.name_prefix}_{os.getpid():x}_{uuid.uuid4().hex[:12]}'
+        return SharedMemorySegment(name=name, create=True, size=nbytes)
+
+    def _encode_leaf(self, obj, segments):
+        ndarray_type = _get_numpy_ndarray_type()
+        if ndarray_type is not None and isinstance(obj, ndarray_type):
+            if obj.dtype.hasobject or obj.nbytes < self.min_size:
+                return obj
+            segm = self._new_segment(obj.nbytes)
+            segments.append(segm)
+            segm_view = segm.buf[:obj.nbytes]
+            # Unlike numpy.frombuffer, the ndarray constructor does not keep the buffer "exported"
+            numpy = sys.modules['numpy']
+            numpy.frombuffer(segm_view, dtype=obj.dtype).reshape(obj.shape)[...] = obj
+            segm_view.release()
+            return SharedMemoryRef(name=segm.name, kind=SHM_KIND_NDARRAY, nbytes=obj.nbytes,
+                                   shape=obj.shape, dtype=obj.dtype.str)
+
+        if isinstance(obj, (bytes, bytearray, memoryview)):
+            with memoryview(obj) as view:
+                if view.nbytes < self.min_size or not view.c_contiguous:
+                    return obj
+                segm = self._new_segment(view.nbytes)
+                segments.append(segm)
+                segm.buf[:view.nbytes] = view.cast('B')
+                return SharedMemoryRef(name=segm.name, kind=SHM_KIND_BYTES, nbytes=view.nbytes)
+
+        return obj
+
+    def _encode(self, obj, segments):
+        obj_type = type(obj)
+        if obj_type is list or obj_type is tuple:
+            return obj_type(self._encode(e, segments) for e in obj)
+        if obj_type is dict:
+            return {k: self._encode(v, segments) for k, v in obj.items()}
+
+        try:
+            return self._encode_leaf(obj, segments)
+        except OSError as e:
+            # E.g., the shared memory is exhausted: Such a buffer is just going to be pickled
+            logging.warning(f'Cannot place an object into the shared memory: {e}')
+            return obj
+
+    def encode(self, obj):
+        """
+            Replace large buffers with shared-memory descriptors.
+
+            :param obj: an object to encode
+            :return: a tuple: an encoded object and a list of created segments
+        """
+        segments = []
+        return self._encode(obj, segments), segments
+
+    def _decode_leaf(self, ref: SharedMemoryRef, unlink, segments):
+        segm = SharedMemorySegment(name=ref.name)
+        segments.append(segm)
+        if unlink:
+            # The memory will be freed when the last view is garbage collected
+            segm.unlink()
+        view = segm.buf[:ref.nbytes]
+        if ref.kind == SHM_KIND_NDARRAY:
+            import numpy
+            # An array created by frombuffer keeps the segment mapped as long as the array is alive
+            return numpy.frombuffer(view, dtype=numpy.dtype(ref.dtype)).reshape(ref.shape)
+
+        assert ref.kind == SHM_KIND_BYTES, f'Unexpected shared memory object kind: {ref.kind}'
+        return view
+
+    def _decode(self, obj, unlink, segments):
+        obj_type = type(obj)
+        if obj_type is SharedMemoryRef:
+            return self._decode_leaf(obj, unlink, segments)
+        if obj_type is list or obj_type is tuple:
+            return obj_type(self._decode(e, unlink, segments) for e in obj)
+        if obj_type is dict:
+            return {k: self._decode(v, unlink, segments) for k, v in obj.items()}
+
+        return obj
+
+    def decode(self, obj, unlink):
+        """
+            Replace shared-memory descriptors with zero-copy views.
+
+            :param obj: an object to decode
+            :param unlink: unlink segments right after attaching to them
+            :return: a tuple: a decoded object and a list of attached segments
+        """
+        segments = []
+        return self._decode(obj, unlink, segments), segments
+
+    @staticmethod
+    def iter_refs(obj):
+        """
+            Iterate over all shared-memory descriptors in an (encoded) object.
+        """
+        obj_type = type(obj)
+        if obj_type is SharedMemoryRef:
+            yield obj
+        elif obj_type is list or obj_type is tuple:
+            for e in obj:
+                yield from SharedMemoryCodec.iter_refs(e)
+        elif obj_type is dict:
+            for v in obj.values():
+                yield from SharedMemoryCodec.iter_refs(v)
+
+
+class SharedMemoryTransport:
+    """
+        The main-process part of the shared-memory transport: It keeps track of segments
+        with worker arguments and frees segments when the pool is closed.
+    """
+    def __init__(self, min_size=DEFAULT_SHM_MIN_SIZE):
+        # The resource tracker must be started before workers: Otherwise, each worker process starts its own
+        # tracker, which does not "see" that segments created by this worker are unlinked by the main process.
+        resource_tracker.ensure_running()
+        self.codec = SharedMemoryCodec(min_size=min_size, name_prefix=f'mtl{uuid.uuid4().hex[:8]}')
+        # Segments with arguments for batches that are being processed (the key is the ID of the first batch item)
+        self.in_flight_segments = {}
+
+    def encode_batch(self, start_obj_id, worker_arg_batch):
+        encoded_batch, segments = self.codec.encode(worker_arg_batch)
+        if segments:
+            self.in_flight_segments[start_obj_id] = segments
+        return encoded_batch
+
+    def release_batch(self, start_obj_id):
+        for segm in self.in_flight_segments.pop(start_obj_id, []):
+            segm.close()
+            segm.unlink()
+
+    def decode_results(self, result_batch):
+        decoded_batch, segments = self.codec.decode(result_batch, unlink=True)
+        # Views keep the memory mapped, but handles are not needed anymore
+        for segm in segments:
+            segm.close()
+        return decoded_batch
+
+    def discard_results(self, result_batch):
+        """
+            Free segments referenced by results that will never be decoded.
+        """
+        for ref in SharedMemoryCodec.iter_refs(result_batch):
+            unlink_segment(ref.name)
+
+    def cleanup(self):
+        for start_obj_id in list(self.in_flight_segments):
+            self.release_batch(start_obj_id)
+        # Segments that were created by workers, but never received (e.g., a worker was terminated)
+        if os.path.isdir(SHM_DIR):
+            for file_name in glob.glob(os.path.join(SHM_DIR, self.codec.name_prefix + '_*')):
+                unlink_segment(os.path.basename(file_name))
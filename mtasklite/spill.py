@@ -0,0 +1,78 @@
+"""
+    An optional spill store for the reorder buffer: When buffered results exceed a memory threshold,
+    new batches of results are serialized into a temporary file and read back when they are returned.
+"""
+import logging
+import os
+import tempfile
+
+from multiprocess.reduction import ForkingPickler
+from typing import NamedTuple
+
+
+class SpillRef(NamedTuple):
+    """
+        A location of a spilled batch of results in the spill file.
+    """
+    offset: int
+    nbytes: int
+    qty: int
+
+
+class SpillStore:
+    """
+        An append-only temporary file with spilled batches. The file is created on the first use and
+        it is truncated whenever all spilled batches are read back. The file is deleted when the store is closed.
+    """
+    def __init__(self, spill_dir=None):
+        self.spill_dir = spill_dir
+        self.spill_file = None
+        # The number of batches and the number of bytes that are spilled, but not yet read back
+        self.live_qty = 0
+        self.live_bytes = 0
+        self.warned = False
+
+    def put(self, batch):
+        """
+            Serialize a batch into the spill file.
+
+            :return: a reference to the spilled batch or None if the batch cannot be serialized
+        """
+        try:
+            data = ForkingPickler.dumps(batch)
+        except Exception as e:
+            # E.g., zero-copy views of shared memory cannot be pickled: Such batches remain in memory
+            if not self.warned:
+                logging.warning(f'Cannot spill results to disk: {e}')
+                self.warned = True
+            return None
+
+        if self.spill_file is None:
+            self.spill_file = tempfile.TemporaryFile(prefix='mtasklite_spill_', dir=self.spill_dir)
+        self.spill_file.seek(0, os.SEEK_END)
+        offset = self.spill_file.tell()
+        self.spill_file.write(data)
+        self.live_qty += 1
+        self.live_bytes += len(data)
+
+        return SpillRef(offset=offset, nbytes=len(data), qty=len(batch))
+
+    def get(self, ref: SpillRef):
+        """
+            Read a spilled batch back (each batch can be read only once).
+        """
+        self.spill_file.seek(ref.offset)
+        batch = ForkingPickler.loads(self.spill_file.read(ref.nbytes))
+        self.live_qty -= 1
+        self.live_bytes -= ref.nbytes
+        if self.live_qty == 0:
+            # Disk space is reclaimed as soon as the consumer catches up
+            self.spill_file.truncate(0)
+        return batch
+
+    def close(self):
+        if self.spill_file is not None:
+            self.spill_file.close()
+            self.spill_file = None
+        self.live_qty = 0
+        self.live_bytes = 0
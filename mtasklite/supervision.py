@@ -0,0 +1,121 @@
+"""
+    Building blocks for supervising worker processes, i.e., recycling workers that hang on a task
+    and restarting workers that crash.
+
+    Killing a process is safe only if the process does not hold any inter-process lock at that moment.
+    Thus, a supervised worker:
+
+    1. sends results through a queue without a feeder thread (SyncQueue), so that no data
+       is written to the pipe in the background while the worker runs the user code;
+    2. publishes the task it is working on via a status board. The supervisor kills a worker only
+       while holding the status lock of this worker, which the worker needs to finish the task.
+
+    The status board also tells which batch a worker holds, so that the batch can be re-submitted
+    if the worker dies.
+"""
+import queue
+import time
+
+import multiprocess as mp
+
+# The number of status-board values per worker: call ID, start object ID, item index in the batch, start time,
+# and the flag that the worker holds a batch
+STATUS_FIELD_QTY = 5
+# The start time of an idle worker
+STATUS_IDLE = 0.0
+
+# How often (at most) the supervisor checks workers
+SUPERVISOR_MAX_POLL_INTERVAL = 0.1
+SUPERVISOR_MIN_POLL_INTERVAL = 0.001
+
+
+class SyncQueue:
+    """
+        A queue that has no feeder thread: put() writes data to the pipe synchronously.
+        It implements a subset of the multiprocess.Queue API used by the pool. Only one process
+        (and only one thread at a time) can read from the queue.
+    """
+    def __init__(self, mp_context=mp):
+        self.reader, self.writer = mp_context.Pipe(duplex=False)
+        self.write_lock = mp_context.Lock()
+
+    def put(self, obj):
+        with self.write_lock:
+            self.writer.send(obj)
+
+    def get(self, block=True, timeout=None):
+        if not block:
+            timeout = 0
+        if not self.reader.poll(timeout):
+            raise queue.Empty
+        return self.reader.recv()
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def cancel_join_thread(self):
+        # There is no feeder thread to join
+        pass
+
+
+class WorkerStatusBoard:
+    """
+        A shared-memory table, where each worker publishes the batch (call ID and start object ID) it holds,
+        the index of the item it is working on, and the start time of this item.
+    """
+    def __init__(self, num_workers, mp_context=mp):
+        self.values = mp_context.Array('d', num_workers * STATUS_FIELD_QTY, lock=False)
+        self.locks = [mp_context.Lock() for _ in range(num_workers)]
+
+    def set_batch(self, worker_id, batch_id):
+        call_id, start_obj_id = batch_id
+        offset = worker_id * STATUS_FIELD_QTY
+        # The flag is written last: A batch is published only with valid IDs
+        self.values[offset] = call_id
+        self.values[offset + 1] = start_obj_id
+        self.values[offset + 2] = 0
+        self.values[offset + 4] = 1
+
+    def clear_batch(self, worker_id):
+        self.values[worker_id * STATUS_FIELD_QTY + 4] = 0
+
+    def set_busy(self, worker_id, item_idx):
+        offset = worker_id * STATUS_FIELD_QTY
+        self.values[offset + 2] = item_idx
+        self.values[offset + 3] = time.time()
+
+    def set_idle(self, worker_id):
+        # A supervisor cannot kill the worker while the worker holds the lock
+        with self.locks[worker_id]:
+            self.values[worker_id * STATUS_FIELD_QTY + 3] = STATUS_IDLE
+
+    def reset(self, worker_id):
+        self.values[worker_id * STATUS_FIELD_QTY + 3] = STATUS_IDLE
+        self.clear_batch(worker_id)
+
+    def get_batch(self, worker_id):
+        """
+            :return: a tuple (batch ID, item index) or None if the worker does not hold a batch
+        """
+        offset = worker_id * STATUS_FIELD_QTY
+        if self.values[offset + 4] == 0:
+            return None
+        batch_id = (int(self.values[offset]), int(self.values[offset + 1]))
+        return batch_id, int(self.values[offset + 2])
+
+    def get(self, worker_id):
+        """
+            :return: a tuple (batch ID, item index, start time) or None if the worker is idle
+        """
+        offset = worker_id * STATUS_FIELD_QTY
+        start_time = self.values[offset + 3]
+        if start_time == STATUS_IDLE:
+            return None
+        batch_id = (int(self.values[offset]), int(self.values[offset + 1]))
+        return batch_id, int(self.values[offset + 2]), start_time
+
+
+def get_supervisor_poll_interval(task_timeout):
+    if task_timeout is None:
+        return SUPERVISOR_MAX_POLL_INTERVAL
+    return max(min(task_timeout / 4, SUPERVISOR_MAX_POLL_INTERVAL), SUPERVISOR_MIN_POLL_INTERVAL)
@@ -3,9 +3,12 @@ import argparse
 import sys
 
 from mtasklite.tests.test_stateless import test_stateless_1
+from mtasklite.tests.test_stateless import test_stateless_2
 from mtasklite.tests.test_stateful import test_stateful_1
+from mtasklite.tests.test_stateful import test_stateful_2
 from mtasklite.tests.test_misc import test_misc_1
 from mtasklite.tests.test_misc import test_misc_2
+from mtasklite.tests.test_misc import test_misc_3
 
 
 def main(args):
@@ -14,8 +17,11 @@ def main(args):
 
     n_fail += not test_misc_1() ; n_qty += 1
     n_fail += not test_misc_2() ; n_qty += 2
+    n_fail += not test_misc_3() ; n_qty += 1
     n_fail += not test_stateful_1(args.n_elem) ; n_qty += 1
+    n_fail += not test_stateful_2(args.n_elem) ; n_qty += 1
     n_fail += not test_stateless_1(args.n_elem) ; n_qty += 1
+    n_fail += not test_stateless_2(args.n_elem) ; n_qty += 1
 
     print(f'Number of tests: {n_qty} failed: {n_fail}')
     if n_fail > 0:
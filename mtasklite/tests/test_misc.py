@@ -1,13 +1,25 @@
+import asyncio
 import concurrent.futures
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
 from time import sleep
 
 
+import mtasklite.pool
 import mtasklite.threads
-from mtasklite.constants import ArgumentPassing, ExceptionBehaviour
+from mtasklite.constants import ArgumentPassing, ExceptionBehaviour, Transport, Scheduler, Serialization
+from mtasklite.priority import PriorityDispatcher
+from mtasklite.shm_transport import SHM_DIR
 from mtasklite.processes import pqdm
 from mtasklite.utils import current_function_name, is_exception
-from mtasklite import Pool
+from mtasklite import Pool, Pipeline, Stage
 from mtasklite import delayed_init
+from mtasklite import WorkerInitError, WorkerCrashed
+from mtasklite import TaskMetrics
 from tqdm import tqdm
 
 @delayed_init
@@ -207,6 +219,978 @@ def test_exited_2():
             pass
 
 
+def reverse_buffer(arg):
+    if arg is None:
+        raise DummyException
+    # Bytes-like arguments arrive as memoryview objects (unless workers are threads)
+    return bytes(arg)[::-1], len(arg)
+
+
+def double_array(arr):
+    return arr * 2
+
+
+def test_shm_transport():
+    N = 12
+    N_JOBS = 3
+    BUF_SIZE = 1024
+
+    input_arr = [bytes([k]) * BUF_SIZE + b'end' for k in range(N)]
+
+    for use_threads in tqdm([False, True], desc=f'Testing {current_function_name()}'):
+        with Pool(reverse_buffer, N_JOBS,
+                  use_threads=use_threads,
+                  transport=Transport.SHARED_MEMORY, shm_min_size=BUF_SIZE,
+                  batch_size=2) as pool:
+            result = list(pool(input_arr))
+            shm_transport = pool.shm_transport
+        assert result == [(e[::-1], len(e)) for e in input_arr], 'Unexpected result'
+        if use_threads:
+            # Threads pass objects by reference: The shared memory is not used
+            assert shm_transport is None
+            continue
+
+        # Segments must be freed after an IMMEDIATE exception too
+        try:
+            with Pool(reverse_buffer, N_JOBS,
+                      use_threads=use_threads,
+                      bounded=False,
+                      exception_behavior=ExceptionBehaviour.IMMEDIATE,
+                      transport=Transport.SHARED_MEMORY, shm_min_size=BUF_SIZE) as pool:
+                name_prefix = pool.shm_transport.codec.name_prefix
+                list(pool(input_arr + [None] + input_arr))
+        except DummyException:
+            pass
+        else:
+            assert False, 'An exception was not thrown!'
+
+        if os.path.isdir(SHM_DIR):
+            left_segments = glob.glob(os.path.join(SHM_DIR, name_prefix + '*'))
+            assert not left_segments, f'Shared memory segments were not freed: {left_segments}'
+
+        try:
+            import numpy as np
+        except ImportError:
+            # NumPy is optional
+            continue
+
+        input_np_arr = [np.full((16, 16), k) for k in range(N)]
+        with Pool(double_array, N_JOBS,
+                  use_threads=use_threads,
+                  transport=Transport.SHARED_MEMORY, shm_min_size=BUF_SIZE) as pool:
+            for arr, res in zip(input_np_arr, pool(input_np_arr)):
+                assert type(res) == np.ndarray and res.shape == arr.shape and (res == arr * 2).all(), \
+                    f'Unexpected result: {res}'
+
+
+async def async_square(a):
+    await asyncio.sleep(0)
+    return a * a
+
+
+async def async_input_generator(n_items):
+    for k in range(n_items):
+        await asyncio.sleep(0)
+        yield k
+
+
+async def run_amap(worker, n_jobs, use_threads, is_unordered, n_items):
+    async with Pool(worker, n_jobs, use_threads=use_threads, is_unordered=is_unordered) as pool:
+        return [result async for result in pool.amap(async_input_generator(n_items))]
+
+
+async def run_amap_exceptions(exception_behavior, use_threads):
+    async with Pool([AlwaysThrows()] * 4, use_threads=use_threads, exception_behavior=exception_behavior) as pool:
+        return [result async for result in pool.amap(async_input_generator(8))]
+
+
+def test_amap():
+    N = 20
+    expected_result = [k * k for k in range(N)]
+
+    for use_threads in tqdm([False, True], desc=f'Testing {current_function_name()}'):
+        for is_unordered in [False, True]:
+            for n_jobs in [1, 3]:
+                # Both regular and asynchronous workers are supported
+                for worker in [ret_single_arg, async_square]:
+                    result = asyncio.run(run_amap(worker, n_jobs, use_threads, is_unordered, N))
+                    if worker == ret_single_arg:
+                        curr_expected_result = list(range(N))
+                    else:
+                        curr_expected_result = expected_result
+                    if is_unordered:
+                        assert sorted(result) == curr_expected_result, f'Unexpected result: {result}'
+                    else:
+                        assert result == curr_expected_result, f'Unexpected result: {result}'
+
+        result = asyncio.run(run_amap_exceptions(ExceptionBehaviour.IGNORE, use_threads))
+        assert len(result) == 8 and all([is_exception(e) for e in result]), f'Unexpected result: {result}'
+
+        for exception_behavior in [ExceptionBehaviour.IMMEDIATE, ExceptionBehaviour.DEFERRED]:
+            try:
+                asyncio.run(run_amap_exceptions(exception_behavior, use_threads))
+            except Exception as e:
+                if exception_behavior == ExceptionBehaviour.IMMEDIATE:
+                    assert str(e) == 'AlwaysThrows', f'Unexpected exception: {e}'
+                else:
+                    assert len(e.args) == 8, f'Unexpected exception: {e}'
+            else:
+                assert False, 'An exception was not thrown!'
+
+
+@delayed_init
+class CountingSquare:
+    def __init__(self):
+        self.pid = os.getpid()
+        self.qty = 0
+
+    def __call__(self, a):
+        if a is None:
+            raise DummyException
+        self.qty += 1
+        return self.pid, a * a
+
+
+def test_persistent_pool():
+    N = 50
+    N_JOBS = 3
+
+    for use_threads in tqdm([False, True], desc=f'Testing {current_function_name()}'):
+        with Pool([CountingSquare() for _ in range(N_JOBS)],
+                  use_threads=use_threads,
+                  persistent=True) as pool:
+            # Sequential calls: In the process mode, the same processes are reused
+            result1 = list(pool(range(N)))
+            result2 = list(pool(range(N, 2 * N)))
+            assert [e for _, e in result1] == [k * k for k in range(N)], f'Unexpected result: {result1}'
+            assert [e for _, e in result2] == [k * k for k in range(N, 2 * N)], f'Unexpected result: {result2}'
+            if not use_threads:
+                assert set([pid for pid, _ in result2]).issubset(set([pid for pid, _ in result1] + [os.getpid()]))
+
+            # Interleaved result generators
+            result1 = []
+            result2 = []
+            for e1, e2 in zip(pool(range(N)), pool(range(N, 2 * N))):
+                result1.append(e1[1])
+                result2.append(e2[1])
+            assert result1 == [k * k for k in range(N)], f'Unexpected result: {result1}'
+            assert result2 == [k * k for k in range(N, 2 * N)], f'Unexpected result: {result2}'
+
+            # An exception in one call does not stop the pool
+            try:
+                list(pool([1, 2, None, 3]))
+            except DummyException:
+                pass
+            else:
+                assert False, 'An exception was not thrown!'
+
+            # Concurrent calls from different threads
+            result_dict = {}
+
+            def run_one_call(call_id):
+                result_dict[call_id] = [e for _, e in pool(range(call_id * N, (call_id + 1) * N))]
+
+            thread_arr = [threading.Thread(target=run_one_call, args=(call_id,)) for call_id in range(4)]
+            for t in thread_arr:
+                t.start()
+            for t in thread_arr:
+                t.join()
+            for call_id in range(4):
+                assert result_dict[call_id] == [k * k for k in range(call_id * N, (call_id + 1) * N)], \
+                    f'Unexpected result for call {call_id}: {result_dict[call_id]}'
+
+        assert pool.exited, 'The pool was not closed'
+
+
+@delayed_init
+class SlowInit:
+    def __init__(self, sleep_time, fail=False):
+        sleep(sleep_time)
+        if fail:
+            raise DummyException
+        self.initialized = True
+
+    def __call__(self, a):
+        return a
+
+
+def test_eager_init():
+    N_JOBS = 3
+    SLEEP_TIME = 0.2
+
+    for use_threads in tqdm([False, True], desc=f'Testing {current_function_name()}'):
+        for n_jobs in [1, N_JOBS]:
+            with Pool([SlowInit(SLEEP_TIME) for _ in range(n_jobs)],
+                      use_threads=use_threads,
+                      eager_init=True) as pool:
+                # The constructor waits for workers to initialize
+                assert pool.ready().done(), 'Workers are not ready'
+                init_times = pool.ready().result()
+                assert len(init_times) == n_jobs and min(init_times) >= SLEEP_TIME, \
+                    f'Unexpected initialization times: {init_times}'
+                assert list(pool([1, 2, 3])) == [1, 2, 3]
+
+            try:
+                Pool([SlowInit(0, fail=(worker_id == n_jobs - 1)) for worker_id in range(n_jobs)],
+                     use_threads=use_threads,
+                     eager_init=True)
+            except WorkerInitError as e:
+                assert list(e.errors.keys()) == [n_jobs - 1] and type(e.errors[n_jobs - 1]) == DummyException, \
+                    f'Unexpected errors: {e.errors}'
+            else:
+                assert False, 'An exception was not thrown!'
+
+        # Not waiting in the constructor
+        with Pool([SlowInit(SLEEP_TIME) for _ in range(N_JOBS)],
+                  use_threads=use_threads,
+                  eager_init=True, wait_ready=False) as pool:
+            assert len(pool.ready().result()) == N_JOBS
+            assert list(pool([1, 2, 3])) == [1, 2, 3]
+
+
+def square(a):
+    return a * a
+
+
+def test_metrics():
+    N = 30
+    N_JOBS = 3
+
+    for use_threads in tqdm([False, True], desc=f'Testing {current_function_name()}'):
+        for n_jobs in [1, N_JOBS]:
+            for is_unordered in [False, True]:
+                task_metrics_arr = []
+                with Pool(square, n_jobs,
+                          use_threads=use_threads, is_unordered=is_unordered,
+                          batch_size=2, metrics_callback=task_metrics_arr.append) as pool:
+                    result = list(pool(range(N)))
+                    snapshot = pool.metrics().snapshot()
+
+                assert sorted(result) == [k * k for k in range(N)], f'Unexpected result: {result}'
+                assert sorted([e.obj_id for e in task_metrics_arr]) == list(range(N)), \
+                    f'Unexpected object IDs: {task_metrics_arr}'
+                for e in task_metrics_arr:
+                    assert type(e) == TaskMetrics and 0 <= e.worker_id < n_jobs
+                    assert e.submit_time <= e.dequeue_time <= e.start_time <= e.end_time <= e.receive_time \
+                           <= e.yield_time, f'Unexpected timestamps: {e}'
+
+                assert snapshot['yielded_items'] == N and snapshot['in_flight_items'] == 0 and \
+                       snapshot['reorder_buffer_depth'] == 0, f'Unexpected snapshot: {snapshot}'
+                assert sum([e['processed_items'] for e in snapshot['workers']]) == N
+
+    # Results of a generator that raised an exception are accounted as discarded ones
+    with Pool(square, N_JOBS, persistent=True, collect_metrics=True) as pool:
+        try:
+            list(pool([1, 2, None, 3, 4, 5]))
+        except TypeError:
+            pass
+        else:
+            assert False, 'An exception was not thrown!'
+        assert list(pool(range(N))) == [k * k for k in range(N)]
+        snapshot = pool.metrics().snapshot()
+        assert snapshot['in_flight_items'] == 0 and snapshot['reorder_buffer_depth'] == 0 and \
+               snapshot['yielded_items'] + snapshot['discarded_items'] == snapshot['submitted_items'], \
+               f'Unexpected snapshot: {snapshot}'
+        assert f'mtasklite_yielded_items_total {snapshot["yielded_items"]}' in pool.metrics().to_prometheus()
+
+
+def slow_head_of_line(a):
+    sleep(0.5 if a == 0 else 0.001)
+    return a
+
+
+def test_reorder_buffer():
+    N = 100
+    N_JOBS = 4
+    MAX_ITEMS = 8
+
+    for use_threads in tqdm([False, True], desc=f'Testing {current_function_name()}'):
+        with Pool(slow_head_of_line, N_JOBS, use_threads=use_threads,
+                  reorder_buffer_max_items=MAX_ITEMS, collect_metrics=True) as pool:
+            result = list(pool(range(N)))
+            snapshot = pool.metrics().snapshot()
+        assert result == list(range(N)), f'Unexpected result: {result}'
+        # The buffer can exceed the limit by at most the number of items in flight
+        assert snapshot['max_reorder_buffer_depth'] <= MAX_ITEMS + pool.chunk_size * pool.chunk_prefill_ratio, \
+            f'Unexpected snapshot: {snapshot}'
+        assert snapshot['reorder_stalls'] > 0 and snapshot['reorder_stall_time'] > 0, \
+            f'Unexpected snapshot: {snapshot}'
+
+        # Soft-ordered mode: Results that wait too long for the slow item are returned out of order
+        with Pool(slow_head_of_line, N_JOBS, use_threads=use_threads,
+                  reorder_max_lag=0.05, collect_metrics=True) as pool:
+            result = list(pool(range(N)))
+            snapshot = pool.metrics().snapshot()
+        assert sorted(result) == list(range(N)) and result[0] != 0, f'Unexpected result: {result}'
+        assert snapshot['out_of_order_items'] > 0, f'Unexpected snapshot: {snapshot}'
+
+
+def slow_head_of_line_buffer(a):
+    sleep(0.5 if a == 0 else 0.001)
+    return bytes([a % 256]) * 1024
+
+
+def test_spill():
+    N = 100
+
+    for use_threads in tqdm([False, True], desc=f'Testing {current_function_name()}'):
+        for bounded in [False, True]:
+            # In the bounded mode, limiting the reorder buffer enables the sliding window (otherwise,
+            # the reorder buffer never grows beyond the chunk size)
+            with Pool(slow_head_of_line_buffer, 4, use_threads=use_threads, bounded=bounded,
+                      reorder_buffer_max_items=N if bounded else None,
+                      spill_threshold_bytes=8 * 1024, collect_metrics=True) as pool:
+                result = list(pool(range(N)))
+                snapshot = pool.metrics().snapshot()
+            assert result == [bytes([k % 256]) * 1024 for k in range(N)], 'Unexpected result'
+            assert snapshot['spilled_items'] > 0, f'Unexpected snapshot: {snapshot}'
+
+
+@delayed_init
+class HangsOnSomeItems:
+    def __init__(self, hang_mod):
+        self.hang_mod = hang_mod
+
+    def __call__(self, a):
+        if a % self.hang_mod == 3:
+            sleep(3600)
+        return a
+
+
+def test_task_timeout():
+    N = 20
+    N_JOBS = 3
+    HANG_MOD = 10
+
+    for batch_size in tqdm([1, 3], desc=f'Testing {current_function_name()}'):
+        for is_unordered in [False, True]:
+            with Pool([HangsOnSomeItems(HANG_MOD) for _ in range(N_JOBS)],
+                      task_timeout=0.2, batch_size=batch_size, is_unordered=is_unordered,
+                      exception_behavior=ExceptionBehaviour.IGNORE) as pool:
+                result = list(pool(range(N)))
+            assert len(result) == N, f'Unexpected result: {result}'
+            timed_out = [e for e in result if type(e) == TimeoutError]
+            assert len(timed_out) == N // HANG_MOD, f'Unexpected result: {result}'
+            assert sorted([e for e in result if type(e) != TimeoutError]) == \
+                   [k for k in range(N) if k % HANG_MOD != 3], f'Unexpected result: {result}'
+
+    # The timeout is raised immediately (by default) and the pool is stopped
+    try:
+        with Pool([HangsOnSomeItems(HANG_MOD) for _ in range(N_JOBS)], task_timeout=0.2) as pool:
+            list(pool(range(N)))
+    except TimeoutError:
+        pass
+    else:
+        assert False, 'An exception was not thrown!'
+    assert pool.exited, 'The pool was not closed'
+    for p in pool.workers:
+        assert not p.is_alive(), 'A worker is still alive'
+
+
+def crashes_on_some_items(arg):
+    a, flag_dir = arg
+    if a % 10 == 3:
+        # A crash that happens every time
+        os._exit(1)
+    flag_file = os.path.join(flag_dir, str(a))
+    if a % 10 == 5 and not os.path.exists(flag_file):
+        # A crash that happens only the first time
+        open(flag_file, 'w').close()
+        os._exit(1)
+    return a
+
+
+def test_crash_recovery():
+    N = 20
+    N_JOBS = 3
+    MAX_TASK_RETRIES = 1
+
+    for batch_size in tqdm([1, 3], desc=f'Testing {current_function_name()}'):
+        for is_unordered in [False, True]:
+            with tempfile.TemporaryDirectory() as flag_dir:
+                with Pool(crashes_on_some_items, N_JOBS, restart_crashed_workers=True,
+                          max_task_retries=MAX_TASK_RETRIES, batch_size=batch_size, is_unordered=is_unordered,
+                          exception_behavior=ExceptionBehaviour.IGNORE) as pool:
+                    result = list(pool([(k, flag_dir) for k in range(N)]))
+            assert len(result) == N, f'Unexpected result: {result}'
+            crashed = [e for e in result if type(e) == WorkerCrashed]
+            assert len(crashed) == N // 10, f'Unexpected result: {result}'
+            assert all([e.crash_qty == MAX_TASK_RETRIES + 1 for e in crashed]), f'Unexpected result: {result}'
+            assert sorted([e for e in result if type(e) != WorkerCrashed]) == \
+                   [k for k in range(N) if k % 10 != 3], f'Unexpected result: {result}'
+
+
+@delayed_init
+class CountsProcessedItems:
+    def __init__(self):
+        self.processed_qty = 0
+
+    def __call__(self, a):
+        self.processed_qty += 1
+        return a, os.getpid(), self.processed_qty
+
+
+def test_worker_recycling():
+    N = 60
+    N_JOBS = 3
+    MAX_TASKS = 4
+
+    for batch_size in tqdm([1, 2], desc=f'Testing {current_function_name()}'):
+        for is_unordered in [False, True]:
+            with Pool([CountsProcessedItems() for _ in range(N_JOBS)], max_tasks_per_worker=MAX_TASKS,
+                      batch_size=batch_size, is_unordered=is_unordered) as pool:
+                result = list(pool(range(N)))
+            assert pool.exited, 'The pool was not closed'
+            for p in pool.workers:
+                assert not p.is_alive(), 'A worker is still alive'
+
+            items = [e[0] for e in result]
+            assert (sorted(items) if is_unordered else items) == list(range(N)), f'Unexpected result: {result}'
+            # Each worker object is created anew in the new process. A worker exits only after the whole batch
+            assert max([e[2] for e in result]) <= MAX_TASKS + batch_size - 1, f'Unexpected result: {result}'
+            assert len(set([e[1] for e in result])) >= N // (MAX_TASKS + batch_size - 1), \
+                f'Unexpected result: {result}'
+
+    # Any worker exceeds a tiny RSS limit: Each process handles a single batch
+    with Pool([CountsProcessedItems() for _ in range(N_JOBS)], max_worker_rss=1) as pool:
+        result = list(pool(range(N)))
+    assert [e[0] for e in result] == list(range(N)), f'Unexpected result: {result}'
+    assert len(set([e[1] for e in result])) == N, f'Unexpected result: {result}'
+
+
+def test_start_methods():
+    N = 30
+    N_JOBS = 3
+
+    for start_method in tqdm(['spawn', 'forkserver'], desc=f'Testing {current_function_name()}'):
+        for kwargs in [{}, {'max_tasks_per_worker': 5, 'restart_crashed_workers': True},
+                       {'transport': Transport.SHARED_MEMORY, 'eager_init': True}]:
+            with Pool(square, N_JOBS, start_method=start_method, **kwargs) as pool:
+                result = list(pool(range(N)))
+            assert result == [k * k for k in range(N)], f'Unexpected result: {result}'
+
+    with Pool(square, N_JOBS, preload_modules=['json']) as pool:
+        assert pool.mp_context.get_start_method() == 'forkserver'
+        result = list(pool(range(N)))
+    assert result == [k * k for k in range(N)], f'Unexpected result: {result}'
+
+
+def sleepy_worker_id(a):
+    sleep(0.02)
+    return a, (os.getpid(), threading.get_ident())
+
+
+def test_autoscaling():
+    N = 100
+    N_JOBS = 4
+
+    for use_threads in tqdm([False, True], desc=f'Testing {current_function_name()}'):
+        with Pool(sleepy_worker_id, N_JOBS, use_threads=use_threads, persistent=True, bounded=False,
+                  min_workers=1, scale_up_delay=0.05, scale_down_delay=0.2) as pool:
+            assert pool.active_workers() == 1
+            result = list(pool(range(N)))
+            assert [e[0] for e in result] == list(range(N)), f'Unexpected result: {result}'
+            # The pool grows under pressure
+            assert len(set([e[1] for e in result])) > 1, f'Unexpected result: {result}'
+
+            # Idle workers are retired one by one
+            deadline = time.time() + 10
+            while pool.active_workers() > 1 and time.time() < deadline:
+                sleep(0.05)
+            assert pool.active_workers() == 1, f'Unexpected number of workers: {pool.active_workers()}'
+            sleep(0.5)
+            assert pool.active_workers() == 1, 'The pool shrank below min_workers'
+
+            # The pool still works after it shrank
+            result = list(pool(range(N)))
+            assert [e[0] for e in result] == list(range(N)), f'Unexpected result: {result}'
+
+        for p in pool.workers:
+            assert p is None or not p.is_alive(), 'A worker is still alive'
+
+
+def test_priority_dispatcher():
+    dispatcher = PriorityDispatcher(aging_time=None)
+    dispatcher.add_stream('bulk', weight=1)
+    dispatcher.add_stream('interactive', weight=3)
+    for k in range(40):
+        dispatcher.push('bulk', ('bulk', k), [k])
+        dispatcher.push('interactive', ('interactive', k), [k])
+    order = [dispatcher.pop()[0] for _ in range(40)]
+    # Streams share workers in proportion to their weights and each stream is dispatched in order
+    assert 28 <= len([e for e in order if e[0] == 'interactive']) <= 32, f'Unexpected order: {order}'
+    for stream_id in ['bulk', 'interactive']:
+        ids = [e[1] for e in order if e[0] == stream_id]
+        assert ids == sorted(ids), f'Unexpected order: {order}'
+
+    # A higher priority wins unless a batch of a lower priority has been waiting for too long
+    dispatcher = PriorityDispatcher(aging_time=0.1)
+    dispatcher.add_stream('low', priority=0)
+    dispatcher.add_stream('high', priority=1)
+    dispatcher.push('low', ('low', 0), [0])
+    dispatcher.push('high', ('high', 0), [0])
+    assert dispatcher.pop()[0] == ('high', 0)
+    sleep(0.25)
+    dispatcher.push('high', ('high', 1), [1])
+    assert dispatcher.pop()[0] == ('low', 0)
+    assert dispatcher.pop()[0] == ('high', 1)
+    assert dispatcher.pop() is None and len(dispatcher) == 0
+
+
+def test_priority_scheduler():
+    N_BULK = 200
+    N_INTERACTIVE = 10
+    N_JOBS = 2
+
+    for use_threads in tqdm([False, True], desc=f'Testing {current_function_name()}'):
+        with Pool(sleepy_worker_id, N_JOBS, use_threads=use_threads, persistent=True, bounded=False,
+                  scheduler=Scheduler.PRIORITY) as pool:
+            bulk_result = []
+            bulk_thread = threading.Thread(target=lambda: bulk_result.extend(pool(range(N_BULK))))
+            bulk_thread.start()
+            sleep(0.2)
+
+            result = list(pool(range(N_INTERACTIVE), priority=1))
+            # Interactive items do not wait till the backlog of bulk items is processed
+            assert bulk_thread.is_alive(), 'Bulk processing finished too early'
+            assert [e[0] for e in result] == list(range(N_INTERACTIVE)), f'Unexpected result: {result}'
+
+            bulk_thread.join()
+            assert [e[0] for e in bulk_result] == list(range(N_BULK)), f'Unexpected result: {bulk_result}'
+
+
+HEAVY_ITEM_PERIOD = 50
+
+
+def is_heavy_item(a):
+    return a % HEAVY_ITEM_PERIOD == HEAVY_ITEM_PERIOD - 1
+
+
+def item_cost(a):
+    return 100.0 if is_heavy_item(a) else 1.0
+
+
+def skewed_cost_worker(a):
+    start_time = time.time()
+    sleep(0.1 if is_heavy_item(a) else 0.002)
+    return a, start_time
+
+
+def test_cost_aware_scheduling():
+    N = 200
+    N_JOBS = 2
+
+    for use_threads in tqdm([False, True], desc=f'Testing {current_function_name()}'):
+        for is_unordered in [False, True]:
+            for bounded in [False, True]:
+                for scheduler in [Scheduler.SHARED_QUEUE, Scheduler.LEAST_LOADED]:
+                    with Pool(square, N_JOBS, use_threads=use_threads, is_unordered=is_unordered, bounded=bounded,
+                              chunk_size=20, batch_size=4, scheduler=scheduler, cost_fn=item_cost,
+                              heavy_first=is_unordered) as pool:
+                        result = list(pool(range(N)))
+                    if is_unordered:
+                        result = sorted(result)
+                    assert result == [x * x for x in range(N)], \
+                        f'Unexpected result (unordered: {is_unordered} bounded: {bounded}): {result}'
+
+        # Heavy items of the (single) chunk are processed before light ones
+        heavy_qty = N // HEAVY_ITEM_PERIOD
+        with Pool(skewed_cost_worker, heavy_qty, use_threads=use_threads, is_unordered=True, bounded=False,
+                  cost_fn=item_cost, heavy_first=True) as pool:
+            result = sorted(pool(range(N)), key=lambda e: e[1])
+        assert len(result) == N
+        assert all([is_heavy_item(a) for a, _ in result[0:heavy_qty]]), f'Unexpected order: {result}'
+
+
+STRAGGLER_ITEM = 20
+STRAGGLER_DELAY = 3.0
+
+
+def straggles_once(a, marker_path):
+    # The straggler item is slow only the first time it is processed
+    if a == STRAGGLER_ITEM and not os.path.exists(marker_path):
+        open(marker_path, 'w').close()
+        sleep(STRAGGLER_DELAY)
+    else:
+        sleep(0.01)
+    return a * a
+
+
+def test_speculative_execution():
+    N = 40
+    N_JOBS = 4
+
+    for use_threads in tqdm([False, True], desc=f'Testing {current_function_name()}'):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            marker_path = os.path.join(tmp_dir, 'marker')
+            with Pool(straggles_once, N_JOBS, use_threads=use_threads, argument_type=ArgumentPassing.AS_ARGS,
+                      persistent=True, speculative_execution=True, collect_metrics=True) as pool:
+                start_time = time.perf_counter()
+                result = list(pool([(a, marker_path) for a in range(N)]))
+                elapsed_time = time.perf_counter() - start_time
+                assert result == [a * a for a in range(N)], f'Unexpected result: {result}'
+                # The duplicate of the straggler item is processed quickly
+                assert elapsed_time < STRAGGLER_DELAY / 2, f'Speculative execution did not help: {elapsed_time}'
+
+                # The result of the straggler is received (and discarded) by a subsequent call
+                sleep(STRAGGLER_DELAY)
+                assert list(pool([(a, marker_path) for a in range(N)])) == [a * a for a in range(N)]
+                snapshot = pool.metrics().snapshot()
+                assert snapshot['duplicated_batches'] >= 1 and snapshot['wasted_items'] >= 1 and \
+                       snapshot['wasted_time'] >= STRAGGLER_DELAY, f'Unexpected snapshot: {snapshot}'
+                assert snapshot['in_flight_items'] == 0 and snapshot['yielded_items'] == 2 * N, \
+                    f'Unexpected snapshot: {snapshot}'
+
+
+VECTORIZED_FAILING_ITEM = 7
+VECTORIZED_RAISING_ITEM = 13
+
+
+def vectorized_square(arg_batch):
+    assert type(arg_batch) == list
+    if VECTORIZED_RAISING_ITEM in arg_batch:
+        raise ValueError('The whole batch fails')
+    # A per-item exception
+    return [ValueError(a) if a == VECTORIZED_FAILING_ITEM else (a * a, len(arg_batch)) for a in arg_batch]
+
+
+def slow_input(qty, delay):
+    for a in range(qty):
+        sleep(delay)
+        yield a
+
+
+def test_vectorized_worker():
+    N = 50
+    BATCH_SIZE = 4
+
+    def check_results(result, n):
+        batch_sizes = []
+        for a, res in enumerate(result):
+            if a == VECTORIZED_FAILING_ITEM or a == VECTORIZED_RAISING_ITEM:
+                assert type(res) == ValueError, f'Unexpected result for {a}: {res}'
+            elif type(res) == ValueError:
+                # Other items of the batch that failed as a whole
+                assert str(res) == 'The whole batch fails', f'Unexpected result for {a}: {res}'
+                assert abs(a - VECTORIZED_RAISING_ITEM) < BATCH_SIZE, f'Unexpected result for {a}: {res}'
+            else:
+                assert res[0] == a * a, f'Unexpected result for {a}: {res}'
+                batch_sizes.append(res[1])
+        assert len(result) == n
+        return batch_sizes
+
+    for use_threads in tqdm([False, True], desc=f'Testing {current_function_name()}'):
+        for n_jobs in [1, 3]:
+            for task_timeout in [None, 60]:
+                with Pool(vectorized_square, n_jobs, use_threads=use_threads, task_timeout=task_timeout,
+                          argument_type=ArgumentPassing.AS_BATCH, batch_size=BATCH_SIZE,
+                          exception_behavior=ExceptionBehaviour.IGNORE) as pool:
+                    batch_sizes = check_results(list(pool(range(N))), N)
+                assert max(batch_sizes) == BATCH_SIZE, f'Unexpected batch sizes: {batch_sizes}'
+
+            # A partially filled batch is sent to a worker if the input is slow
+            with Pool(vectorized_square, n_jobs, use_threads=use_threads, argument_type=ArgumentPassing.AS_BATCH,
+                      batch_size=100, batch_max_wait=0.001, exception_behavior=ExceptionBehaviour.IGNORE) as pool:
+                batch_sizes = check_results(list(pool(slow_input(N, 0.005))), N)
+            assert max(batch_sizes) <= 2, f'Unexpected batch sizes: {batch_sizes}'
+
+
+@delayed_init
+class VectorizedModel:
+    def __init__(self, scale):
+        self.scale = scale
+
+    def __call__(self, arg_batch):
+        sleep(0.01)
+        return [ValueError(a) if a == VECTORIZED_FAILING_ITEM else (a * self.scale, len(arg_batch))
+                for a in arg_batch]
+
+
+def test_submit():
+    N_THREADS = 4
+    N_PER_THREAD = 25
+    MAX_BATCH_SIZE = 8
+    N_JOBS = 2
+
+    for use_threads in tqdm([False, True], desc=f'Testing {current_function_name()}'):
+        for n_jobs in [1, N_JOBS]:
+            with Pool([VectorizedModel(2) for _ in range(n_jobs)], use_threads=use_threads, persistent=True,
+                      argument_type=ArgumentPassing.AS_BATCH, batch_size=MAX_BATCH_SIZE,
+                      batch_max_wait=0.005) as pool:
+                futures = [[] for _ in range(N_THREADS)]
+
+                def submit_items(thread_id):
+                    for k in range(N_PER_THREAD):
+                        futures[thread_id].append(pool.submit(thread_id * N_PER_THREAD + k))
+
+                threads = [threading.Thread(target=submit_items, args=(thread_id,))
+                           for thread_id in range(N_THREADS)]
+                for thread in threads:
+                    thread.start()
+                if n_jobs > 1:
+                    # Regular calls can be mixed with submissions
+                    input_arr = list(range(VECTORIZED_FAILING_ITEM + 1, VECTORIZED_FAILING_ITEM + 1 + N_PER_THREAD))
+                    assert [e[0] for e in pool(input_arr)] == [2 * a for a in input_arr]
+                for thread in threads:
+                    thread.join()
+
+                batch_sizes = []
+                for thread_id in range(N_THREADS):
+                    for k, future in enumerate(futures[thread_id]):
+                        a = thread_id * N_PER_THREAD + k
+                        if a == VECTORIZED_FAILING_ITEM:
+                            assert type(future.exception()) == ValueError
+                        else:
+                            result, batch_size = future.result()
+                            assert result == 2 * a, f'Unexpected result for {a}: {result}'
+                            batch_sizes.append(batch_size)
+                assert max(batch_sizes) <= MAX_BATCH_SIZE, f'Unexpected batch sizes: {batch_sizes}'
+                # Concurrent submissions are gathered into micro-batches
+                assert max(batch_sizes) > 1, f'Unexpected batch sizes: {batch_sizes}'
+
+                # Items submitted right before the pool is closed are still processed
+                last_future = pool.submit(1)
+            assert last_future.result()[0] == 2
+
+
+def dict_worker(a):
+    if a['id'] == 7:
+        raise ValueError('Failing item')
+    return {'id': a['id'], 'total': sum(a['values'])}
+
+
+def make_adder(a):
+    return lambda b: a + b
+
+
+def test_serializers():
+    input_arr = [{'id': k, 'values': list(range(k))} for k in range(40)]
+    expected = [{'id': a['id'], 'total': sum(a['values'])} for a in input_arr]
+
+    serializers = [Serialization.DILL, Serialization.PICKLE, (json.dumps, json.loads)]
+    try:
+        import msgpack
+        serializers.append(Serialization.MSGPACK)
+    except ImportError:
+        pass
+
+    for use_threads in tqdm([False, True], desc=f'Testing {current_function_name()}'):
+        for serializer in serializers:
+            for transport in [Transport.QUEUE, Transport.SHARED_MEMORY]:
+                with Pool(dict_worker, 3, use_threads=use_threads, batch_size=4, serializer=serializer,
+                          transport=transport, exception_behavior=ExceptionBehaviour.IGNORE) as pool:
+                    result = list(pool(input_arr))
+                assert type(result[7]) == ValueError, f'Unexpected result: {result[7]}'
+                assert result[:7] + result[8:] == expected[:7] + expected[8:], \
+                    f'Unexpected results for the serializer {serializer}'
+
+            # Batches with lambdas are pickled using dill
+            with Pool(make_adder, 2, use_threads=use_threads, serializer=serializer) as pool:
+                assert [fn(1) for fn in pool(range(10))] == [a + 1 for a in range(10)]
+
+
+def test_serializers_shm_transport():
+    N_JOBS = 3
+    BUF_SIZE = 1024
+
+    input_arr = [bytes([k]) * BUF_SIZE + b'end' for k in range(12)]
+    serializers = [Serialization.DILL, Serialization.PICKLE, (json.dumps, json.loads)]
+    try:
+        import msgpack
+        serializers.append(Serialization.MSGPACK)
+    except ImportError:
+        pass
+
+    for serializer in tqdm(serializers, desc=f'Testing {current_function_name()}'):
+        # Large arguments and results are replaced with shared-memory descriptors, which must survive serialization
+        with Pool(reverse_buffer, N_JOBS, serializer=serializer, transport=Transport.SHARED_MEMORY,
+                  shm_min_size=BUF_SIZE, batch_size=2) as pool:
+            result = list(pool(input_arr))
+        assert result == [(e[::-1], len(e)) for e in input_arr], f'Unexpected results for the serializer {serializer}'
+
+
+def identity(a):
+    return a
+
+
+def test_thread_queues():
+    input_arr = [{'id': k} for k in range(20)]
+    for scheduler in tqdm([Scheduler.SHARED_QUEUE, Scheduler.ROUND_ROBIN], desc=f'Testing {current_function_name()}'):
+        with Pool(identity, 3, use_threads=True, scheduler=scheduler, batch_size=2) as pool:
+            result = list(pool(input_arr))
+        # Threads receive and return objects by reference
+        assert all(res is a for res, a in zip(result, input_arr)), 'Objects were copied'
+
+    # Processes get copies of objects
+    with Pool(identity, 3) as pool:
+        result = list(pool(input_arr))
+    assert result == input_arr and all(res is not a for res, a in zip(result, input_arr))
+
+
+@delayed_init
+class InstanceId:
+    def __call__(self, a):
+        sleep(0.01)
+        return id(self)
+
+
+def test_free_threading():
+    N_JOBS = 3
+    with Pool(square, N_JOBS, use_threads='auto') as pool:
+        assert list(pool(range(10))) == [a * a for a in range(10)]
+        assert pool.use_threads == mtasklite.pool.is_free_threaded()
+
+    # Simulate a free-threaded interpreter
+    is_free_threaded = mtasklite.pool.is_free_threaded
+    mtasklite.pool.is_free_threaded = lambda: True
+    try:
+        for use_threads in tqdm([True, 'auto'], desc=f'Testing {current_function_name()}'):
+            with Pool(InstanceId(), N_JOBS, use_threads=use_threads) as pool:
+                assert pool.use_threads and pool.scheduler == Scheduler.ROUND_ROBIN
+                instance_ids = list(pool(range(10 * N_JOBS)))
+            # Each thread has its own worker object
+            assert len(set(instance_ids)) == N_JOBS, f'Unexpected number of worker objects: {len(set(instance_ids))}'
+    finally:
+        mtasklite.pool.is_free_threaded = is_free_threaded
+
+
+def download_and_parse(a):
+    # I/O followed by a CPU-bound computation
+    sleep(0.02)
+    if a == 7:
+        raise DummyException()
+    return sum(k * a for k in range(1000))
+
+
+def test_threads_per_worker():
+    N_JOBS = 2
+    THREADS_PER_WORKER = 8
+    input_arr = list(range(100))
+    expected = [sum(k * a for k in range(1000)) for a in input_arr]
+
+    for batch_size in tqdm([1, 4], desc=f'Testing {current_function_name()}'):
+        start_time = time.perf_counter()
+        with Pool(download_and_parse, N_JOBS, threads_per_worker=THREADS_PER_WORKER, batch_size=batch_size,
+                  exception_behavior=ExceptionBehaviour.IGNORE) as pool:
+            result = list(pool(input_arr))
+        elapsed_time = time.perf_counter() - start_time
+        # The order of results and exceptions are the same as in the pool without threads
+        assert type(result[7]) == DummyException
+        assert result[:7] + result[8:] == expected[:7] + expected[8:]
+        # Sleeping items overlap: Two processes without threads would take at least 1 second
+        assert elapsed_time < 0.5 * len(input_arr) * 0.02 / N_JOBS, f'The pool is too slow: {elapsed_time}'
+
+        with Pool(download_and_parse, N_JOBS, threads_per_worker=THREADS_PER_WORKER, batch_size=batch_size,
+                  exception_behavior=ExceptionBehaviour.IMMEDIATE) as pool:
+            try:
+                list(pool(input_arr))
+            except DummyException:
+                pass
+            else:
+                assert False, 'An exception was not thrown!'
+
+
+def add_one(a):
+    return a + 1
+
+
+def fail_on_seven(a):
+    if a == 7:
+        raise DummyException()
+    return a * 2
+
+
+def test_pipeline():
+    input_arr = list(range(200))
+    expected = [(a + 1) * 2 + 1 for a in input_arr]
+
+    for is_unordered in tqdm([False, True], desc=f'Testing {current_function_name()}'):
+        for use_threads in [False, True]:
+            stages = [Stage(add_one, 2, batch_size=4),
+                      Stage(fail_on_seven, 2, use_threads=use_threads, buffer_size=1),
+                      Stage(add_one, 1, use_threads=not use_threads, batch_size=3)]
+            with Pipeline(stages, exception_behavior=ExceptionBehaviour.IGNORE, is_unordered=is_unordered,
+                          max_in_flight=16) as pipeline:
+                result = list(pipeline(input_arr))
+                stats = pipeline.stats()
+            # The item 6 becomes 7 in the first stage and fails in the second one
+            assert sum([type(res) == DummyException for res in result]) == 1
+            if is_unordered:
+                result = sorted([res for res in result if not is_exception(res)])
+            else:
+                assert type(result[6]) == DummyException
+                result = result[:6] + result[7:]
+            assert result == expected[:6] + expected[7:]
+            # The failed item is not processed by the last stage
+            assert [stage_stats['processed_items'] for stage_stats in stats] == [200, 200, 199], stats
+
+    # Many processes per stage: Results of all workers arrive before their stage finishes (repeated to catch races)
+    for run_id in range(20):
+        with Pipeline([Stage(add_one, 4), Stage(add_one, 4)], is_unordered=run_id % 2 == 0) as pipeline:
+            result = list(pipeline(input_arr))
+        assert sorted(result) == [a + 2 for a in input_arr], f'Unexpected results in the run {run_id}'
+
+    # Exceptions are raised immediately and the pipeline can be reused
+    with Pipeline([Stage(add_one, 2), Stage(fail_on_seven, 2)]) as pipeline:
+        try:
+            list(pipeline(input_arr))
+        except DummyException:
+            pass
+        else:
+            assert False, 'An exception was not thrown!'
+        assert list(pipeline(range(5))) == [2, 4, 6, 8, 10]
+        # Not consuming the whole (huge) input is fine thanks to backpressure
+        for res in pipeline(range(10 ** 9)):
+            assert res == 2
+            break
+
+
+def sleep_and_get_pid(a):
+    sleep(0.01)
+    return os.getpid()
+
+
+def test_batches_within_chunk():
+    N_JOBS = 4
+    BATCH_SIZE = 4
+    for use_threads in tqdm([False, True], desc=f'Testing {current_function_name()}'):
+        worker = sleep_and_get_pid if not use_threads else lambda a: sleep(0.01) or threading.get_ident()
+        with Pool(worker, N_JOBS, batch_size=BATCH_SIZE, use_threads=use_threads) as pool:
+            # The default chunk has a full batch for each worker
+            assert pool.chunk_size == N_JOBS * BATCH_SIZE
+            worker_ids = list(pool(range(10 * N_JOBS * BATCH_SIZE)))
+        # Several workers process batches of the same (bounded and ordered) chunk
+        for chunk_start in range(0, len(worker_ids), N_JOBS * BATCH_SIZE):
+            chunk_worker_ids = set(worker_ids[chunk_start:chunk_start + N_JOBS * BATCH_SIZE])
+            assert len(chunk_worker_ids) > 1, f'A single worker processed the chunk starting at {chunk_start}'
+
+
+def test_idle_work_stealing_cpu():
+    N_JOBS = 32
+    IDLE_TIME = 2
+    with Pool(square, N_JOBS, use_threads=True, scheduler=Scheduler.ROUND_ROBIN, persistent=True) as pool:
+        assert list(pool(range(100))) == [a * a for a in range(100)]
+        # Threads are used to measure the CPU time of all idle workers in this process
+        start_cpu_time = time.process_time()
+        sleep(IDLE_TIME)
+        cpu_time = time.process_time() - start_cpu_time
+        # Checking all queues of other workers every few milliseconds took about 0.2 seconds per second
+        assert cpu_time < 0.05 * IDLE_TIME, f'Idle workers use too much CPU: {cpu_time}'
+        # Idle workers still pick up new work
+        assert list(pool(range(10))) == [a * a for a in range(10)]
+
+
+def test_adaptive_batch_size():
+    N_ITEMS = 20000
+    for bounded in tqdm([True, False], desc=f'Testing {current_function_name()}'):
+        with Pool(square, 4, batch_size='auto', bounded=bounded, collect_metrics=True) as pool:
+            assert list(pool(range(N_ITEMS))) == [a * a for a in range(N_ITEMS)]
+            snapshot = pool.metrics().snapshot()
+        # Cheap items are packed into batches once processing times are known
+        mean_batch_size = snapshot['submitted_items'] / snapshot['submitted_batches']
+        assert mean_batch_size > 4, f'Adaptive batches do not grow (bounded: {bounded}): {mean_batch_size}'
+
+
 def test_misc_1():
     try:
         test_queue_cleanup_after_exception_1()
@@ -251,3 +1235,164 @@ def test_misc_2():
         return False
 
     return True
+
+
+def test_misc_3():
+    try:
+        test_shm_transport()
+    except Exception as e:
+        print('Unexpected exception in test_shm_transport:', type(e), e)
+        return False
+
+    try:
+        test_amap()
+    except Exception as e:
+        print('Unexpected exception in test_amap:', type(e), e)
+        return False
+
+    try:
+        test_persistent_pool()
+    except Exception as e:
+        print('Unexpected exception in test_persistent_pool:', type(e), e)
+        return False
+
+    try:
+        test_eager_init()
+    except Exception as e:
+        print('Unexpected exception in test_eager_init:', type(e), e)
+        return False
+
+    try:
+        test_metrics()
+    except Exception as e:
+        print('Unexpected exception in test_metrics:', type(e), e)
+        return False
+
+    try:
+        test_reorder_buffer()
+    except Exception as e:
+        print('Unexpected exception in test_reorder_buffer:', type(e), e)
+        return False
+
+    try:
+        test_spill()
+    except Exception as e:
+        print('Unexpected exception in test_spill:', type(e), e)
+        return False
+
+    try:
+        test_task_timeout()
+    except Exception as e:
+        print('Unexpected exception in test_task_timeout:', type(e), e)
+        return False
+
+    try:
+        test_crash_recovery()
+    except Exception as e:
+        print('Unexpected exception in test_crash_recovery:', type(e), e)
+        return False
+
+    try:
+        test_worker_recycling()
+    except Exception as e:
+        print('Unexpected exception in test_worker_recycling:', type(e), e)
+        return False
+
+    try:
+        test_start_methods()
+    except Exception as e:
+        print('Unexpected exception in test_start_methods:', type(e), e)
+        return False
+
+    try:
+        test_autoscaling()
+    except Exception as e:
+        print('Unexpected exception in test_autoscaling:', type(e), e)
+        return False
+
+    try:
+        test_priority_dispatcher()
+        test_priority_scheduler()
+    except Exception as e:
+        print('Unexpected exception in test_priority_scheduler:', type(e), e)
+        return False
+
+    try:
+        test_cost_aware_scheduling()
+    except Exception as e:
+        print('Unexpected exception in test_cost_aware_scheduling:', type(e), e)
+        return False
+
+    try:
+        test_speculative_execution()
+    except Exception as e:
+        print('Unexpected exception in test_speculative_execution:', type(e), e)
+        return False
+
+    try:
+        test_vectorized_worker()
+    except Exception as e:
+        print('Unexpected exception in test_vectorized_worker:', type(e), e)
+        return False
+
+    try:
+        test_submit()
+    except Exception as e:
+        print('Unexpected exception in test_submit:', type(e), e)
+        return False
+
+    try:
+        test_serializers()
+    except Exception as e:
+        print('Unexpected exception in test_serializers:', type(e), e)
+        return False
+
+    try:
+        test_serializers_shm_transport()
+    except Exception as e:
+        print('Unexpected exception in test_serializers_shm_transport:', type(e), e)
+        return False
+
+    try:
+        test_thread_queues()
+    except Exception as e:
+        print('Unexpected exception in test_thread_queues:', type(e), e)
+        return False
+
+    try:
+        test_free_threading()
+    except Exception as e:
+        print('Unexpected exception in test_free_threading:', type(e), e)
+        return False
+
+    try:
+        test_threads_per_worker()
+    except Exception as e:
+        print('Unexpected exception in test_threads_per_worker:', type(e), e)
+        return False
+
+    try:
+        test_pipeline()
+    except Exception as e:
+        print('Unexpected exception in test_pipeline:', type(e), e)
+        return False
+
+    try:
+        test_batches_within_chunk()
+    except Exception as e:
+        print('Unexpected exception in test_batches_within_chunk:', type(e), e)
+        return False
+
+    try:
+        test_idle_work_stealing_cpu()
+    except Exception as e:
+        print('Unexpected exception in test_idle_work_stealing_cpu:', type(e), e)
+        return False
+
+    try:
+        test_adaptive_batch_size()
+    except Exception as e:
+        print('Unexpected exception in test_adaptive_batch_size:', type(e), e)
+        return False
+
+    return True
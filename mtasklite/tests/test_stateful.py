@@ -1,6 +1,6 @@
 from mtasklite import Pool, delayed_init
 
-from mtasklite.constants import ArgumentPassing
+from mtasklite.constants import ArgumentPassing, Scheduler
 from mtasklite.utils import current_function_name
 
 from tqdm import tqdm
@@ -20,7 +20,10 @@ def run_generic_stateful_test(n_elem, n_jobs,
              use_unsized_iterable: bool,
              iterable_arg_passing: ArgumentPassing,
              chunk_size: int = 1, chunk_prefill_ratio: int = 2,
-             is_bounded: bool = True):
+             is_bounded: bool = True,
+             batch_size=1,
+             scheduler: Scheduler = Scheduler.SHARED_QUEUE,
+             work_stealing: bool = True):
 
     input_range = range(0, n_elem)
     if iterable_arg_passing == ArgumentPassing.AS_SINGLE_ARG:
@@ -51,7 +54,10 @@ def run_generic_stateful_test(n_elem, n_jobs,
         use_threads=use_threads,
         argument_type=iterable_arg_passing,
         is_unordered=is_unordered,
-        bounded=is_bounded
+        bounded=is_bounded,
+        batch_size=batch_size,
+        scheduler=scheduler,
+        work_stealing=work_stealing
     ) as pool:
         # Each input element is repeated n_jobs times in the input, but the
         # worker will ignore items assigned to a different worker_id and will return None
@@ -110,4 +116,47 @@ def test_stateful_1(max_elem):
         return True
 
 
+def test_stateful_2(max_elem):
+    """
+        Testing schedulers with per-worker input queues.
+    """
+    kwarg_arr = []
 
+    for use_threads in [False, True]:
+        for is_unordered in [False, True]:
+            for scheduler in [Scheduler.ROUND_ROBIN, Scheduler.LEAST_LOADED]:
+                for work_stealing in [False, True]:
+                    for batch_size in [1, 3]:
+                        # Importantly we also need to test empty inputs
+                        for n_elem in range(0, max_elem):
+                            for n_jobs in [1, 3]:
+                                kwarg_arr.append(dict(n_elem=n_elem, n_jobs=n_jobs,
+                                                      use_threads=use_threads,
+                                                      iterable_arg_passing=ArgumentPassing.AS_SINGLE_ARG,
+                                                      is_unordered=is_unordered,
+                                                      use_unsized_iterable=False,
+                                                      is_bounded=False,
+                                                      batch_size=batch_size,
+                                                      scheduler=scheduler,
+                                                      work_stealing=work_stealing))
+                                for chunk_size in [1, 4]:
+                                    kwarg_arr.append(dict(n_elem=n_elem, n_jobs=n_jobs,
+                                                          use_threads=use_threads,
+                                                          iterable_arg_passing=ArgumentPassing.AS_SINGLE_ARG,
+                                                          is_unordered=is_unordered,
+                                                          use_unsized_iterable=True,
+                                                          chunk_size=chunk_size, chunk_prefill_ratio=2,
+                                                          batch_size=batch_size,
+                                                          scheduler=scheduler,
+                                                          work_stealing=work_stealing))
+
+    for kwargs in tqdm(kwarg_arr, f'Testing {current_function_name()}'):
+        try:
+            run_generic_stateful_test(**kwargs)
+        except Exception as e:
+            print('Unexpected exception:', type(e), e)
+            print('Test function arguments:')
+            print(kwargs)
+            return False
+
+    return True
@@ -17,7 +17,8 @@ def run_generic_stateless_test(n_elem, n_jobs,
              use_unsized_iterable: bool,
              iterable_arg_passing: ArgumentPassing,
              chunk_size: int=1, chunk_prefill_ratio: int=2,
-             is_bounded: bool=True):
+             is_bounded: bool=True,
+             batch_size=1):
 
     input_range = range(0, n_elem)
     if iterable_arg_passing == ArgumentPassing.AS_SINGLE_ARG:
@@ -52,6 +53,7 @@ def run_generic_stateless_test(n_elem, n_jobs,
                         argument_type=iterable_arg_passing,
                         is_unordered=is_unordered,
                         bounded=is_bounded,
+                        batch_size=batch_size,
                         disable=True)) # disable TQDM here
     else:
         with Pool(
@@ -60,7 +62,8 @@ def run_generic_stateless_test(n_elem, n_jobs,
             use_threads=use_threads,
             argument_type=iterable_arg_passing,
             is_unordered=is_unordered,
-            bounded=is_bounded
+            bounded=is_bounded,
+            batch_size=batch_size
         ) as pool:
             result = list(pool(input_iterable))
 
@@ -118,4 +121,46 @@ def test_stateless_1(max_elem):
         return True
 
 
+def test_stateless_2(max_elem):
+    """
+        Testing the batched transport: Items are sent to workers in batches of consecutive items.
+    """
+    kwarg_arr = []
 
+    for use_threads in [False, True]:
+        for is_unordered in [False, True]:
+            for use_unsized_iterable in [False, True]:
+                for batch_size in [2, 5, 'auto']:
+                    # Importantly we also need to test empty inputs
+                    for n_elem in range(0, max_elem):
+                        for n_jobs in [1, 3]:
+                            if not use_unsized_iterable:
+                                kwarg_arr.append(dict(n_elem=n_elem, n_jobs=n_jobs,
+                                                      use_pqdm_interface=False,
+                                                      use_threads=use_threads,
+                                                      is_unordered=is_unordered,
+                                                      use_unsized_iterable=use_unsized_iterable,
+                                                      iterable_arg_passing=ArgumentPassing.AS_SINGLE_ARG,
+                                                      is_bounded=False,
+                                                      batch_size=batch_size))
+
+                            for chunk_size in [1, 4]:
+                                kwarg_arr.append(dict(n_elem=n_elem, n_jobs=n_jobs,
+                                                      use_pqdm_interface=False,
+                                                      use_threads=use_threads,
+                                                      is_unordered=is_unordered,
+                                                      use_unsized_iterable=use_unsized_iterable,
+                                                      iterable_arg_passing=ArgumentPassing.AS_SINGLE_ARG,
+                                                      chunk_size=chunk_size, chunk_prefill_ratio=2,
+                                                      batch_size=batch_size))
+
+    for kwargs in tqdm(kwarg_arr, f'Testing {current_function_name()}'):
+        try:
+            run_generic_stateless_test(**kwargs)
+        except Exception as e:
+            print('Unexpected exception:', type(e), e)
+            print('Test function arguments:')
+            print(kwargs)
+            return False
+
+    return True
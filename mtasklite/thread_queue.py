@@ -0,0 +1,23 @@
+"""
+    A queue for pools of threads: Threads share the address space, so objects are passed by reference
+    rather than pickled and sent through an OS pipe (by a feeder thread) as multiprocess queues do.
+"""
+import queue
+
+
+class ThreadQueue(queue.SimpleQueue):
+    """
+        An in-process queue that implements a subset of the multiprocess.Queue API used by the pool.
+    """
+    def cancel_join_thread(self):
+        # There is no feeder thread to join
+        pass
+
+
+class BoundedThreadQueue(queue.Queue):
+    """
+        A bounded in-process queue (see ThreadQueue), which makes producers wait when it is full.
+    """
+    def cancel_join_thread(self):
+        # There is no feeder thread to join
+        pass
@@ -1,7 +1,9 @@
 import copy
 import inspect
+import os
 import platform
 import multiprocess
+import sys
 from typing import Dict, Any, Tuple
 
 KwArgs = Dict[str, Any]
@@ -11,10 +13,50 @@ def is_sized_iterator(input_iterable):
     return hasattr(input_iterable, '__len__')
 
 
+def is_async_iterable(input_iterable):
+    return hasattr(input_iterable, '__aiter__')
+
+
 def is_exception(result):
     return isinstance(result, Exception)
 
 
+def estimate_size(obj):
+    """
+        A rough estimate of the memory (in bytes) used by an object: Buffers (including NumPy arrays) are
+        accounted for using their sizes, containers are traversed recursively.
+    """
+    nbytes = getattr(obj, 'nbytes', None)
+    if type(nbytes) == int:
+        return nbytes
+    obj_type = type(obj)
+    if obj_type is list or obj_type is tuple:
+        return sys.getsizeof(obj) + sum([estimate_size(e) for e in obj])
+    if obj_type is dict:
+        return sys.getsizeof(obj) + sum([estimate_size(k) + estimate_size(v) for k, v in obj.items()])
+
+    return sys.getsizeof(obj)
+
+
+def get_rss():
+    """
+        Return the resident set size (in bytes) of the current process. If the current RSS is not available
+        (it is read from procfs), the peak RSS is returned. If neither is available, the function returns None.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # The peak RSS is in bytes on macOS and in kilobytes on other systems
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
 def current_function_name():
     return inspect.stack()[1].function  # [1] refers to the caller's frame
 
@@ -41,3 +83,12 @@ def divide_kwargs(kwargs: KwArgs, first_type) -> Tuple[KwArgs, KwArgs]:
     assert kwargs.keys() == first_type_args.keys() | second_type_kwargs.keys()
 
     return first_type_args, second_type_kwargs
+
+
+def is_free_threaded():
+    """
+        Check if threads can run Python code in parallel, i.e., the interpreter is a free-threaded build
+        of CPython (3.13 or later) and the GIL is disabled.
+    """
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return is_gil_enabled is not None and not is_gil_enabled()